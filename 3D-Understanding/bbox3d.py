@@ -0,0 +1,223 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""Vectorized parsing and projection of `<3dbbox>` predictions.
+
+Boxes follow the format requested by the camera-parameter prompt:
+    <3dbbox>x_center y_center z_center x_size y_size z_size pitch yaw roll</3dbbox>
+with angles normalized to (-1, 1). All boxes of a response (or of many frames)
+are rotated and projected through the intrinsic matrix in single NumPy
+operations, replacing the per-corner `rotate_xyz` loop of `convert_3dbbox`.
+
+Example:
+    python bbox3d.py --n-frames 1000 --boxes-per-frame 10
+"""
+import re
+import math
+import time
+import random
+import argparse
+
+import cv2
+import numpy as np
+
+BBOX3D_PATTERN = re.compile(r"<3dbbox>([\d\.\s\-]+)</3dbbox>")
+# corner order matches `convert_3dbbox` in the 3D Understanding notebook
+CORNER_SIGNS = np.array([
+    [1, 1, 1],
+    [1, 1, -1],
+    [1, -1, 1],
+    [1, -1, -1],
+    [-1, 1, 1],
+    [-1, 1, -1],
+    [-1, -1, 1],
+    [-1, -1, -1],
+], dtype=np.float64)
+EDGES = np.array([
+    [0, 1], [2, 3], [4, 5], [6, 7],
+    [0, 2], [1, 3], [4, 6], [5, 7],
+    [0, 4], [1, 5], [2, 6], [3, 7],
+])
+
+
+def parse_3dbboxes(message: str) -> np.ndarray:
+    """Returns (N, 9) boxes with angles converted to degrees; malformed tags are skipped."""
+    answers = []
+    for match in BBOX3D_PATTERN.findall(message):
+        _answer = match.split()
+        if len(_answer) != 9:
+            continue
+        answers.append(_answer)
+    boxes = np.asarray(answers, dtype=np.float64).reshape(-1, 9)
+    # convert nomalized degree to (-180, 180)
+    boxes[:, 6:] *= 180
+    return boxes
+
+
+def intrinsic_matrix(cam_params: dict) -> np.ndarray:
+    return np.array([
+        [cam_params['fx'], 0, cam_params['cx']],
+        [0, cam_params['fy'], cam_params['cy']],
+        [0, 0, 1],
+    ], dtype=np.float64)
+
+
+def rotation_matrices(pitch: np.ndarray, yaw: np.ndarray,
+                      roll: np.ndarray) -> np.ndarray:
+    """Builds (N, 3, 3) matrices applying pitch (X), then yaw (Y), then roll (Z), in radians."""
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    cr, sr = np.cos(roll), np.sin(roll)
+    # R = Rz(roll) @ Ry(yaw) @ Rx(pitch), expanded
+    return np.stack([
+        np.stack([cr * cy, cr * sy * sp - sr * cp, cr * sy * cp + sr * sp], -1),
+        np.stack([sr * cy, sr * sy * sp + cr * cp, sr * sy * cp - cr * sp], -1),
+        np.stack([-sy, cy * sp, cy * cp], -1),
+    ], -2)
+
+
+def box_corners(boxes: np.ndarray) -> np.ndarray:
+    """Returns (N, 8, 3) corners in camera coordinates for (N, 9) boxes in degrees."""
+    centers, sizes = boxes[:, :3], boxes[:, 3:6]
+    angles = np.deg2rad(boxes[:, 6:9])
+    rotations = rotation_matrices(angles[:, 0], angles[:, 1], angles[:, 2])
+    local_corners = CORNER_SIGNS[None] * (sizes[:, None] / 2)
+    return np.einsum('nij,nkj->nki', rotations, local_corners) + centers[:, None]
+
+
+def project_points(points: np.ndarray, K: np.ndarray,
+                   near: float = 1e-6) -> tuple[np.ndarray, np.ndarray]:
+    """Projects (..., 3) camera points through (3, 3) or broadcastable (..., 3, 3) K.
+
+    Returns:
+        np.ndarray: (..., 2) pixel coordinates, NaN for points with Z <= near
+        np.ndarray: (...,) mask of points in front of the camera
+    """
+    visible = points[..., 2] > near
+    depth = np.where(visible, points[..., 2], 1.0)
+    projected = np.einsum('...ij,...j->...i', K, points)[..., :2] / depth[..., None]
+    projected[~visible] = np.nan
+    return projected, visible
+
+
+def project_3dbboxes(boxes: np.ndarray,
+                     K: np.ndarray,
+                     near: float = 0.1) -> tuple[np.ndarray, np.ndarray]:
+    """Projects the 12 edges of every box, clipped against the plane Z = near.
+
+    Edges with one corner behind the camera are cut where they cross the near
+    plane instead of being dropped, so partially visible boxes are still drawn
+    correctly.
+
+    Args:
+        boxes: (N, 9) boxes with angles in degrees.
+        K: (3, 3) intrinsic matrix shared by all boxes, or (N, 3, 3).
+        near: depth of the clipping plane in meters.
+
+    Returns:
+        np.ndarray: (N, 12, 2, 2) edge endpoints in pixels
+        np.ndarray: (N, 12) mask of edges with a visible part
+    """
+    corners = box_corners(boxes)
+    start, end = corners[:, EDGES[:, 0]], corners[:, EDGES[:, 1]]
+    z0, z1 = start[..., 2], end[..., 2]
+    visible = (z0 > near) | (z1 > near)
+    # parameter where the edge crosses the near plane
+    dz = np.where(z1 == z0, 1.0, z1 - z0)
+    t = np.clip((near - z0) / dz, 0.0, 1.0)[..., None]
+    crossing = start + t * (end - start)
+    start = np.where((z0 > near)[..., None], start, crossing)
+    end = np.where((z1 > near)[..., None], end, crossing)
+    if K.ndim == 3:
+        K = K[:, None, None]
+    edges, _ = project_points(np.stack([start, end], axis=-2), K, near=0.0)
+    edges[~visible] = np.nan
+    return edges, visible
+
+
+def draw_3dbboxes(image_path, cam_params, message):
+    boxes = parse_3dbboxes(message)
+    annotated_image = cv2.imread(image_path)
+    edges, visible = project_3dbboxes(boxes, intrinsic_matrix(cam_params))
+    for box_edges, box_visible in zip(edges, visible):
+        color = [random.randint(0, 255) for _ in range(3)]
+        for (pt1, pt2), is_visible in zip(box_edges, box_visible):
+            if is_visible:
+                cv2.line(annotated_image, tuple(int(_pt) for _pt in pt1),
+                         tuple(int(_pt) for _pt in pt2), color, 2)
+    return annotated_image
+
+
+def _convert_3dbbox_reference(point, cam_params):
+    """Scalar projection from the 3D Understanding notebook, kept for benchmarking."""
+    x, y, z, x_size, y_size, z_size, pitch, yaw, roll = point
+    hx, hy, hz = x_size / 2, y_size / 2, z_size / 2
+
+    def rotate_xyz(_point, _pitch, _yaw, _roll):
+        x0, y0, z0 = _point
+        x1 = x0
+        y1 = y0 * math.cos(_pitch) - z0 * math.sin(_pitch)
+        z1 = y0 * math.sin(_pitch) + z0 * math.cos(_pitch)
+        x2 = x1 * math.cos(_yaw) + z1 * math.sin(_yaw)
+        y2 = y1
+        z2 = -x1 * math.sin(_yaw) + z1 * math.cos(_yaw)
+        x3 = x2 * math.cos(_roll) - y2 * math.sin(_roll)
+        y3 = x2 * math.sin(_roll) + y2 * math.cos(_roll)
+        return [x3, y3, z2]
+
+    img_corners = []
+    for sx, sy, sz in CORNER_SIGNS.tolist():
+        rotated = rotate_xyz([sx * hx, sy * hy, sz * hz], np.deg2rad(pitch),
+                             np.deg2rad(yaw), np.deg2rad(roll))
+        X, Y, Z = rotated[0] + x, rotated[1] + y, rotated[2] + z
+        if Z > 0:
+            img_corners.append([
+                cam_params['fx'] * (X / Z) + cam_params['cx'],
+                cam_params['fy'] * (Y / Z) + cam_params['cy']
+            ])
+    return img_corners
+
+
+def benchmark(n_frames: int, boxes_per_frame: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    cam_params = {'fx': 867.88, 'fy': 868.17, 'cx': 784.59, 'cy': 437.86}
+    messages = []
+    for _ in range(n_frames):
+        boxes = np.concatenate([
+            rng.uniform([-5, -1, 2], [5, 1, 40], (boxes_per_frame, 3)),
+            rng.uniform(0.5, 5, (boxes_per_frame, 3)),
+            rng.uniform(-1, 1, (boxes_per_frame, 3)),
+        ], axis=1)
+        messages.append(''.join(
+            '<3dbbox>' + ' '.join(f'{v:.2f}' for v in box) + '</3dbbox>'
+            for box in boxes))
+
+    start = time.perf_counter()
+    reference = []
+    for message in messages:
+        for box in parse_3dbboxes(message).tolist():
+            reference.append(_convert_3dbbox_reference(box, cam_params))
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    boxes = np.concatenate([parse_3dbboxes(message) for message in messages])
+    corners, visible = project_points(box_corners(boxes),
+                                      intrinsic_matrix(cam_params))
+    vectorized_time = time.perf_counter() - start
+
+    expected = np.array([c for box in reference for c in box])
+    assert np.allclose(corners[visible], expected)
+    n_boxes = len(boxes)
+    print(f"{n_boxes} boxes over {n_frames} frames")
+    print(f"scalar:     {scalar_time * 1000:.1f} ms "
+          f"({n_boxes / scalar_time:.0f} boxes/s)")
+    print(f"vectorized: {vectorized_time * 1000:.1f} ms "
+          f"({n_boxes / vectorized_time:.0f} boxes/s), "
+          f"{scalar_time / vectorized_time:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n-frames", type=int, default=1000)
+    parser.add_argument("--boxes-per-frame", type=int, default=10)
+    args = parser.parse_args()
+    benchmark(args.n_frames, args.boxes_per_frame)
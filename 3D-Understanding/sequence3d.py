@@ -0,0 +1,249 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""3D detection over every frame of a camera sequence.
+
+Camera intrinsics and the formatted camera-parameter prompt are computed once
+per camera, image sizes are read from file headers, and frames are sent to the
+model concurrently. Results are returned in time order with projected boxes.
+
+Example:
+    detector = SequenceDetector()
+    detector.register_camera('CAM_BACK', width=1600, height=900,
+                             fx=867.876183, fy=868.173621,
+                             cx=784.587868, cy=437.857378)
+    results = detector.detect(frames, 'CAM_BACK',
+                              "Detect each vehicle in this image and display "
+                              "the results in the form of 3D bounding boxes.")
+"""
+import os
+import json
+import base64
+import requests
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from bbox3d import parse_3dbboxes, intrinsic_matrix, project_3dbboxes
+
+seed_vl_version = "doubao-1-5-thinking-vision-pro-250428"
+api_url = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"
+
+CAMERA_PROMPT = "Here are the detailed camera parameters for the image. Camera intrinsic parameters: Focal length f_x={fx}, f_y={fy}. Principal point coordinate locates near the center of the image, c_x={cx} and c_y={cy}, when image width {w} and height {h}. We do not consider distortion parameters here. Therefore, the intrinsic matrix K = [[{fx}, 0, {cx}], [0, {fy}, {cy}], [0, 0, 1]]. Camera coordinate: X-axis points rightward, Y-axis points downward, and Z-axis points forward. The origin point is the camera location. We take the camera coordinate system as the world coordinate system, namely the camera extrinsic matrix is [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0]]. Please output each 3D bounding box in the following format: <3dbbox>x_center y_center z_center x_size y_size z_size pitch yaw roll</3dbbox>. Note: (1) x_center, y_center, z_center: the center of the object in the camera coordinate, in meters. (2) x_size, y_size, z_size: The dimensions of the object along the XYZ axes, in meters, when the rotation angles are zero. (3) pitch, yaw, roll: Euler angles representing rotations around the X, Y, and Z axes, respectively. Each angle is normalized to the range of (-1, 1) and is multiplied by 180 to convert it into degrees."
+
+
+def encode_image(image_path):
+    with open(image_path, "rb") as image_file:
+        image = base64.b64encode(image_file.read()).decode('utf-8')
+    return image
+
+
+def inference_image(text_content, image_path, enable_thniking_mode='disabled'):
+    headers = {
+        'Authorization': f'Bearer {os.environ.get("OPENAI_API_KEY")}',
+        'Content-Type': 'application/json'
+    }
+    base64_image = encode_image(image_path)
+    image_format = image_path.split('.')[-1]
+    assert image_format in ['jpg', 'jpeg', 'png', 'webp']
+    data = {
+        "model": seed_vl_version,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": text_content
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/{image_format};base64,{base64_image}"
+                        }
+                    }
+                ]
+            }
+        ],
+        "thinking": {"type": enable_thniking_mode}
+    }
+    response = requests.post(api_url, headers=headers, json=data)
+    response.raise_for_status()
+    return response.json()["choices"][0]
+
+
+def serialize_prefix(prompt_prefix: str) -> bytes:
+    """JSON-encodes a prompt prefix once, leaving the string open for a suffix."""
+    return json.dumps(prompt_prefix, ensure_ascii=False).encode('utf-8')[:-1]
+
+
+def build_request_body(serialized_prefix: bytes,
+                       question: str,
+                       image_path: str,
+                       enable_thniking_mode='disabled') -> bytes:
+    """Builds the `inference_image` request body around a pre-serialized prompt prefix."""
+    image_format = image_path.split('.')[-1]
+    assert image_format in ['jpg', 'jpeg', 'png', 'webp']
+    # JSON escaping is per character, so the escaped suffix can be appended as is
+    text_suffix = json.dumps(f" {question}", ensure_ascii=False).encode('utf-8')[1:]
+    image_item = json.dumps({
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:image/{image_format};base64,{encode_image(image_path)}"
+        }
+    }).encode('utf-8')
+    return b''.join([
+        b'{"model":', json.dumps(seed_vl_version).encode('utf-8'),
+        b',"messages":[{"role":"user","content":[{"type":"text","text":',
+        serialized_prefix, text_suffix, b'},', image_item, b']}],"thinking":',
+        json.dumps({"type": enable_thniking_mode}).encode('utf-8'), b'}'
+    ])
+
+
+def inference_body(body: bytes):
+    headers = {
+        'Authorization': f'Bearer {os.environ.get("OPENAI_API_KEY")}',
+        'Content-Type': 'application/json'
+    }
+    response = requests.post(api_url, headers=headers, data=body)
+    response.raise_for_status()
+    return response.json()["choices"][0]
+
+
+def read_image_size(image_path: str) -> tuple[int, int]:
+    """Returns (width, height) from the file header without decoding pixels."""
+    with Image.open(image_path) as image:
+        return image.size
+
+
+@dataclass
+class Camera:
+    cam_params: dict
+    width: int
+    height: int
+    prompt_prefix: str
+    serialized_prefix: bytes
+
+    @property
+    def K(self) -> np.ndarray:
+        return intrinsic_matrix(self.cam_params)
+
+
+@dataclass
+class FrameDetection:
+    timestamp: float
+    image_path: str
+    message: str
+    boxes: np.ndarray
+    edges: np.ndarray
+    visible: np.ndarray
+
+
+class SequenceDetector:
+    """Runs 3D detection on frame sequences with per-camera caching.
+
+    Args:
+        inference_fn: optional callable `(text_content, image_path) -> choice`
+            returning the first choice of a chat completion, like
+            `inference_image`. By default requests are built around the
+            camera's pre-serialized prompt prefix and sent with `inference_body`.
+        prompt: camera-parameter template formatted once per camera.
+        max_workers: number of frames in flight.
+    """
+
+    def __init__(self,
+                 inference_fn=None,
+                 prompt: str = CAMERA_PROMPT,
+                 max_workers: int = 8):
+        self.inference_fn = inference_fn
+        self.prompt = prompt
+        self.max_workers = max_workers
+        self.cameras = {}
+
+    def register_camera(self,
+                        name: str,
+                        image_path: str = None,
+                        width: int = None,
+                        height: int = None,
+                        fx=None,
+                        fy=None,
+                        cx=None,
+                        cy=None,
+                        fov=60) -> Camera:
+        """Caches intrinsics and the formatted prompt prefix for a camera.
+
+        The image size is taken from `width`/`height` or from the header of
+        `image_path`. Missing intrinsics are derived from `fov` as in
+        `generate_camwise_prompts`.
+        """
+        if width is None or height is None:
+            width, height = read_image_size(image_path)
+        w, h = width, height
+        # generate pseudo camera params if not provided
+        if fx is None or fy is None:
+            fx = round(w / (2 * np.tan(np.deg2rad(fov) / 2)), 2)
+            fy = round(h / (2 * np.tan(np.deg2rad(fov) / 2)), 2)
+        if cx is None or cy is None:
+            cx = round(w / 2, 2)
+            cy = round(h / 2, 2)
+        prompt_prefix = self.prompt.format(cx=cx, cy=cy, fx=fx, fy=fy, w=w, h=h)
+        camera = Camera(
+            cam_params={'cx': cx, 'cy': cy, 'fx': fx, 'fy': fy},
+            width=w,
+            height=h,
+            prompt_prefix=prompt_prefix,
+            serialized_prefix=serialize_prefix(prompt_prefix),
+        )
+        self.cameras[name] = camera
+        return camera
+
+    def get_camera(self, name: str, image_path: str) -> Camera:
+        if name not in self.cameras:
+            return self.register_camera(name, image_path=image_path)
+        return self.cameras[name]
+
+    def _detect_frame(self, camera: Camera, timestamp: float, image_path: str,
+                      question: str) -> FrameDetection:
+        if self.inference_fn is None:
+            result = inference_body(
+                build_request_body(camera.serialized_prefix, question,
+                                   image_path))
+        else:
+            result = self.inference_fn(f"{camera.prompt_prefix} {question}",
+                                       image_path)
+        message = result["message"]["content"]
+        boxes = parse_3dbboxes(message)
+        edges, visible = project_3dbboxes(boxes, camera.K)
+        return FrameDetection(timestamp, image_path, message, boxes, edges,
+                              visible)
+
+    def detect(self, frames: list, camera_name: str,
+               question: str) -> list[FrameDetection]:
+        """Detects boxes on every frame of a sequence.
+
+        Args:
+            frames: image paths, or (timestamp, image_path) pairs. Plain paths
+                are timestamped by their position in the list.
+            camera_name: key of a registered camera; unregistered cameras are
+                registered from the first frame with pseudo intrinsics.
+            question: detection question appended to the cached prompt prefix.
+
+        Returns:
+            list[FrameDetection]: one detection per frame, in time order.
+        """
+        frames = [
+            frame if isinstance(frame, (tuple, list)) else (idx, frame)
+            for idx, frame in enumerate(frames)
+        ]
+        if not frames:
+            return []
+        camera = self.get_camera(camera_name, frames[0][1])
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self._detect_frame, camera, timestamp,
+                                image_path, question)
+                for timestamp, image_path in frames
+            ]
+            detections = [future.result() for future in futures]
+        return sorted(detections, key=lambda detection: detection.timestamp)
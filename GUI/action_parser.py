@@ -243,9 +243,31 @@ def parse_action_to_structure_output(text, factor, origin_resized_height, origin
         })
     return actions
 
-def parsing_response_to_pyautogui_code(responses, image_height: int, image_width:int, input_swap:bool=True) -> str:
+# fast mode: the `dragTo` duration, still long enough for intermediate moves
+FAST_DRAG_DURATION = 0.2
+
+def fast_type_code(content, input_swap=True):
+    """Pastes text in bulk, or types it without delays if not `input_swap`;
+    line breaks and tabs are sent as key presses."""
+    # the model may escape newlines as a literal "\\n"
+    text = content.replace("\\n", "\n")
+    code = ""
+    for part in re.split(r"(\n|\t)", text):
+        if part in ("\n", "\t"):
+            key = "enter" if part == "\n" else "tab"
+            # let the pasted text land before the key acts on it
+            code += "\n_frame = wait_until_stable(_frame)"
+            code += f"\npyautogui.press({key!r})"
+        elif part and input_swap:
+            code += f"\nimport pyperclip\npyperclip.copy({part!r})\npyautogui.hotkey('ctrl', 'v')"
+        elif part:
+            code += f"\npyautogui.write({part!r})"
+    return code
+
+def parsing_response_to_pyautogui_code(responses, image_height: int, image_width:int, input_swap:bool=True, fast:bool=False) -> str:
     '''
     将M模型的输出解析为OSWorld中的action，生成pyautogui代码字符串
+    fast=True 时不再固定 sleep：每个动作后轮询截图直到画面稳定（见 screen_wait.py），文本整段粘贴输入
     参数:
         response: 包含模型输出的字典，结构类似于：
         {
@@ -261,6 +283,9 @@ def parsing_response_to_pyautogui_code(responses, image_height: int, image_width
     '''
 
     pyautogui_code = f"import pyautogui\nimport time\n"
+    if fast:
+        from screen_wait import FAST_PRELUDE
+        pyautogui_code += f"\n{FAST_PRELUDE}\n"
     if isinstance(responses, dict):
         responses = [responses]
     for response_id, response in enumerate(responses):
@@ -276,7 +301,9 @@ def parsing_response_to_pyautogui_code(responses, image_height: int, image_width
         
         if response_id == 0:
             pyautogui_code += f"'''\nObservation:\n{observation}\n\nThought:\n{thought}\n'''\n"
-        else:
+            if fast:
+                pyautogui_code += "\n_frame = grab_screen()\n"
+        elif not fast:
             pyautogui_code += f"\ntime.sleep(1)\n"
 
         action_dict = response
@@ -364,6 +391,10 @@ def parsing_response_to_pyautogui_code(responses, image_height: int, image_width
                 # Simulate pressing a single key
                 pyautogui_code += f"\npyautogui.keyUp({repr(key_to_press)})"
 
+        elif action_type == "type" and fast:
+            pyautogui_code += fast_type_code(action_inputs.get("content", ""),
+                                             input_swap)
+
         elif action_type == "type":
             # Parsing typing action using clipboard
             content = action_inputs.get("content", "")
@@ -399,7 +430,7 @@ def parsing_response_to_pyautogui_code(responses, image_height: int, image_width
                 ey = round(float((y1 + y2) / 2) * image_height, 3)
                 pyautogui_code += (
                     f"\npyautogui.moveTo({sx}, {sy})\n"
-                    f"\npyautogui.dragTo({ex}, {ey}, duration=1.0)\n"
+                    f"\npyautogui.dragTo({ex}, {ey}, duration={FAST_DRAG_DURATION if fast else 1.0})\n"
                 )
 
         elif action_type == "scroll":
@@ -457,6 +488,9 @@ def parsing_response_to_pyautogui_code(responses, image_height: int, image_width
         else:
             pyautogui_code += f"\n# Unrecognized action type: {action_type}"
 
+        if fast and pyautogui_code != "DONE":
+            pyautogui_code += "\n_frame = wait_until_stable(_frame)\n"
+
     return pyautogui_code
 
 def add_box_token(input_string):
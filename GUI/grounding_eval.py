@@ -0,0 +1,250 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""Parallel evaluation harness for GUI grounding with `GROUNDING_DOUBAO`.
+
+Request bodies are built by `MessageBuilder`, so each worker formats the
+grounding prompt of an instruction once.
+
+The dataset is a JSONL file, one sample per line:
+    {"image": "samples/image.png", "instruction": "...", "bbox": [x1, y1, x2, y2]}
+where `bbox` is the target element in original screenshot pixels.
+
+Example:
+    python grounding_eval.py --dataset data.jsonl --max-workers 16
+    python grounding_eval.py --dataset data.jsonl --mock
+"""
+import os
+import ast
+import json
+import time
+import base64
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import requests
+from PIL import Image
+
+from message_template import MessageBuilder
+from action_parser import parse_action_to_structure_output
+from screenshot import preprocess_screenshot, count_visual_tokens
+
+DEFAULT_BASE_URL = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"
+DEFAULT_MODEL_ID = "doubao-1-5-thinking-vision-pro-250428"
+
+
+def load_dataset(dataset_path: str) -> list[dict]:
+    root = os.path.dirname(os.path.abspath(dataset_path))
+    samples = []
+    with open(dataset_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            sample = json.loads(line)
+            if not os.path.isabs(sample["image"]):
+                sample["image"] = os.path.join(root, sample["image"])
+            samples.append(sample)
+    return samples
+
+
+def encode_image(image_path):
+    with open(image_path, "rb") as image_file:
+        image = base64.b64encode(image_file.read()).decode('utf-8')
+    return image
+
+
+_builders = {}
+
+
+def get_builder(model_id: str) -> MessageBuilder:
+    """The `MessageBuilder` of this process for `model_id`."""
+    if model_id not in _builders:
+        _builders[model_id] = MessageBuilder(model_id,
+                                             temperature=0.0,
+                                             max_tokens=400,
+                                             thinking={"type": "disabled"})
+    return _builders[model_id]
+
+
+def image_message(image_path: str, downscale: bool = False) -> dict:
+    if downscale:
+        image_url = preprocess_screenshot(image_path).data_url
+    else:
+        image_format = image_path.split('.')[-1]
+        assert image_format in ['jpg', 'jpeg', 'png', 'webp']
+        image_url = f"data:image/{image_format};base64,{encode_image(image_path)}"
+    return {
+        "role": "user",
+        "content": [{
+            "type": "image_url",
+            "image_url": {
+                "url": image_url
+            }
+        }]
+    }
+
+
+def build_body(instruction: str,
+               image_path: str,
+               model_id: str,
+               downscale: bool = False) -> bytes:
+    """The grounding prompt of `instruction` followed by the screenshot."""
+    return get_builder(model_id).build_body(
+        "grounding", [image_message(image_path, downscale)],
+        instruction=instruction)
+
+
+def request_completion(body: bytes, base_url: str, api_key: str,
+                       timeout: float = 60) -> str:
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    response = requests.post(base_url,
+                             headers=headers,
+                             data=body,
+                             timeout=timeout)
+    response.raise_for_status()
+    return response.json()["choices"][0]["message"]["content"]
+
+
+def parse_click(response: str, image_height: int,
+                image_width: int) -> tuple[float, float]:
+    """Parses a grounding response into a click position in screenshot pixels.
+
+    Returns None if the response holds no parsable box.
+    """
+    try:
+        actions = parse_action_to_structure_output(response, 1000,
+                                                   image_height, image_width,
+                                                   "doubao")
+        # model output, so it is parsed as a literal and never evaluated
+        x1, y1, x2, y2 = ast.literal_eval(
+            actions[0]["action_inputs"]["start_box"])
+    except (AssertionError, ValueError, TypeError, SyntaxError, KeyError,
+            IndexError):
+        return None
+    return (x1 + x2) / 2 * image_width, (y1 + y2) / 2 * image_height
+
+
+def evaluate_sample(sample: dict,
+                    base_url: str,
+                    api_key: str,
+                    model_id: str,
+                    downscale: bool = False) -> dict:
+    """Runs one sample end to end. Executed inside a pool worker."""
+    width, height = Image.open(sample["image"]).size
+    start = time.perf_counter()
+    result = {
+        "image": sample["image"],
+        "instruction": sample["instruction"],
+        "visual_tokens": count_visual_tokens(height, width),
+    }
+    try:
+        body = build_body(sample["instruction"], sample["image"], model_id,
+                          downscale)
+        response = request_completion(body, base_url, api_key)
+        result["latency"] = time.perf_counter() - start
+        result["response"] = response
+        click = parse_click(response, height, width)
+        if click is None:
+            # an unparsable answer is a miss, not an error
+            result["unparsed"] = True
+            result["hit"] = False
+            return result
+        x, y = click
+        x1, y1, x2, y2 = sample["bbox"]
+        result["point"] = [x, y]
+        result["hit"] = bool(x1 <= x <= x2 and y1 <= y <= y2)
+    except Exception as e:
+        result.setdefault("latency", time.perf_counter() - start)
+        result["error"] = repr(e)
+        result["hit"] = False
+    return result
+
+
+def summarize(results: list[dict], wall_time: float) -> dict:
+    latencies = np.array([r["latency"] for r in results if "error" not in r])
+    summary = {
+        "samples": len(results),
+        "errors": sum("error" in r for r in results),
+        "unparsed": sum(r.get("unparsed", False) for r in results),
+        "accuracy": sum(r["hit"] for r in results) / max(len(results), 1),
+        "wall_time": wall_time,
+        "throughput": len(results) / wall_time if wall_time else 0.0,
+        "visual_tokens": sum(r["visual_tokens"] for r in results),
+    }
+    if len(latencies):
+        for q in (50, 90, 99):
+            summary[f"latency_p{q}"] = float(np.percentile(latencies, q))
+    return summary
+
+
+def run_evaluation(samples: list[dict],
+                   base_url: str = DEFAULT_BASE_URL,
+                   api_key: str = None,
+                   model_id: str = DEFAULT_MODEL_ID,
+                   max_workers: int = 8,
+                   downscale: bool = False) -> tuple[list[dict], dict]:
+    """Evaluates `samples` with at most `max_workers` requests in flight."""
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(evaluate_sample, sample, base_url, api_key,
+                            model_id, downscale) for sample in samples
+        ]
+        results = [future.result() for future in futures]
+    return results, summarize(results, time.perf_counter() - start)
+
+
+def oracle_answers(samples: list[dict]) -> dict:
+    """Maps each instruction to the center of its target box in 0-1000 space."""
+    answers = {}
+    for sample in samples:
+        width, height = Image.open(sample["image"]).size
+        x1, y1, x2, y2 = sample["bbox"]
+        answers[sample["instruction"]] = (round((x1 + x2) / 2 / width * 1000),
+                                          round((y1 + y2) / 2 / height * 1000))
+    return answers
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", required=True)
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--model-id", default=DEFAULT_MODEL_ID)
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--downscale",
+                        action="store_true",
+                        help="upload screenshots resized to the smart_resize grid")
+    parser.add_argument("--mock",
+                        action="store_true",
+                        help="evaluate against the local stand-in model")
+    parser.add_argument("--mock-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    samples = load_dataset(args.dataset)
+    base_url = args.base_url
+    if args.mock:
+        from mock_server import MockGroundingModel, start_mock_server
+        model = MockGroundingModel(answers=oracle_answers(samples),
+                                   latency=args.mock_latency)
+        server, base_url = start_mock_server(model)
+    results, summary = run_evaluation(samples,
+                                      base_url=base_url,
+                                      api_key=os.environ.get("API_KEY"),
+                                      model_id=args.model_id,
+                                      max_workers=args.max_workers,
+                                      downscale=args.downscale)
+    if args.mock:
+        server.shutdown()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""Compiled message templates for multi-step GUI requests.
+
+The system prompt of a GUI task only depends on the template, the
+instruction and the language, yet it used to be formatted and serialized again
+on every step. `MessageBuilder` formats and JSON-encodes that static prefix
+once and, per step, only serializes the dynamic screenshot/history messages.
+
+Example:
+    builder = MessageBuilder(model_id="doubao-1-5-thinking-vision-pro-250428")
+    body = builder.build_body("computer_use", dynamic_messages,
+                              instruction=instruction, language="English")
+    requests.post(base_url, headers=headers, data=body)
+"""
+import json
+import time
+from collections import OrderedDict
+
+import requests
+
+from prompt import COMPUTER_USE_DOUBAO, MOBILE_USE_DOUBAO, GROUNDING_DOUBAO
+
+
+class MessageTemplate:
+    """A prompt template rendered into the static prefix of a conversation."""
+
+    def __init__(self, template: str, role: str = "user"):
+        self.template = template
+        self.role = role
+
+    def render(self, **kwargs) -> list[dict]:
+        return [{"role": self.role, "content": self.template.format(**kwargs)}]
+
+
+TEMPLATES = {
+    "computer_use": MessageTemplate(COMPUTER_USE_DOUBAO),
+    "mobile_use": MessageTemplate(MOBILE_USE_DOUBAO),
+    "grounding": MessageTemplate(GROUNDING_DOUBAO),
+}
+
+
+class ContextCacheHook:
+    """Extension point for server-side context caching.
+
+    `prefix_fields` is called once per compiled prefix. Returning None sends
+    the prefix inline with every request; returning a dict drops the prefix
+    messages from the body and adds the returned fields instead (for example a
+    context id). `url` optionally overrides the endpoint for such requests,
+    and `ttl` is how many seconds the server keeps a cached prefix.
+    """
+    url = None
+    ttl = None
+
+    def prefix_fields(self, model_id: str,
+                      prefix_messages: list[dict]) -> dict:
+        return None
+
+
+class ArkContextCache(ContextCacheHook):
+    """Caches the prefix with the Volcano Engine Ark context API."""
+
+    def __init__(self,
+                 api_key: str,
+                 base_url: str = "https://ark.cn-beijing.volces.com/api/v3",
+                 ttl: int = 3600):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.ttl = ttl
+        self.url = f"{base_url}/context/chat/completions"
+
+    def prefix_fields(self, model_id: str,
+                      prefix_messages: list[dict]) -> dict:
+        response = requests.post(f"{self.base_url}/context/create",
+                                 headers={
+                                     "Authorization": f"Bearer {self.api_key}",
+                                     "Content-Type": "application/json"
+                                 },
+                                 json={
+                                     "model": model_id,
+                                     "messages": prefix_messages,
+                                     "mode": "common_prefix",
+                                     "ttl": self.ttl,
+                                 },
+                                 timeout=30)
+        response.raise_for_status()
+        return {"context_id": response.json()["id"]}
+
+
+def _encode(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+class MessageBuilder:
+    """Builds request bodies from a cached static prefix and per-step messages.
+
+    Args:
+        model_id: model sent with every request.
+        templates: template name to `MessageTemplate`.
+        context_cache: optional `ContextCacheHook`.
+        max_prefixes: compiled prefixes kept, least recently used dropped.
+        **request_params: extra static body fields such as `temperature`,
+            `max_tokens` or `stream`.
+    """
+
+    def __init__(self,
+                 model_id: str,
+                 templates: dict = TEMPLATES,
+                 context_cache: ContextCacheHook = None,
+                 max_prefixes: int = 256,
+                 **request_params):
+        self.model_id = model_id
+        self.templates = templates
+        self.context_cache = context_cache
+        self.max_prefixes = max_prefixes
+        self._head = _encode({"model": model_id, **request_params})[:-1]
+        # key -> (fields, prefix, expiry time or None)
+        self._prefixes = OrderedDict()
+
+    def _compile(self, template_name: str, kwargs: dict) -> tuple[bytes, bytes]:
+        prefix_messages = self.templates[template_name].render(**kwargs)
+        fields = None
+        if self.context_cache is not None:
+            fields = self.context_cache.prefix_fields(self.model_id,
+                                                      prefix_messages)
+        if fields:
+            # the server holds the prefix; only its reference is sent
+            return b"".join(b"," + _encode(key) + b":" + _encode(value)
+                            for key, value in fields.items()), b""
+        return b"", b",".join(_encode(message) for message in prefix_messages)
+
+    def prefix(self, template_name: str, **kwargs) -> tuple[bytes, bytes]:
+        """Returns (extra body fields, serialized prefix messages), compiled once per key.
+
+        A prefix cached server-side is compiled again before the context
+        cache's `ttl` runs out.
+        """
+        key = (template_name, tuple(sorted(kwargs.items())))
+        entry = self._prefixes.get(key)
+        now = time.monotonic()
+        if entry is None or (entry[2] is not None and now >= entry[2]):
+            fields, prefix = self._compile(template_name, kwargs)
+            expires = None
+            if fields and self.context_cache.ttl is not None:
+                # renewed early so no request is sent just as it expires
+                expires = now + self.context_cache.ttl * 0.9
+            entry = self._prefixes[key] = (fields, prefix, expires)
+        self._prefixes.move_to_end(key)
+        while len(self._prefixes) > self.max_prefixes:
+            self._prefixes.popitem(last=False)
+        return entry[0], entry[1]
+
+    def build_body(self, template_name: str, dynamic_messages: list[dict],
+                   **kwargs) -> bytes:
+        """Serializes the cached prefix followed by `dynamic_messages` into a request body."""
+        fields, prefix = self.prefix(template_name, **kwargs)
+        messages = [prefix] if prefix else []
+        messages.extend(_encode(message) for message in dynamic_messages)
+        return b"".join([
+            self._head, fields, b',"messages":[', b",".join(messages), b"]}"
+        ])
+
+    @property
+    def url(self):
+        """Endpoint override from the context cache hook, if any."""
+        return self.context_cache.url if self.context_cache is not None else None
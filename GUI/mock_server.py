@@ -0,0 +1,92 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def extract_instruction(messages: list[dict]) -> str:
+    """Returns the text following `## User Instruction` in the first prompt that has one."""
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            content = "\n".join(
+                item.get("text", "") for item in content
+                if item.get("type") == "text")
+        if "## User Instruction" in content:
+            return content.split("## User Instruction")[-1].strip()
+    return ""
+
+
+class MockGroundingModel:
+    """Deterministic local stand-in for the grounding endpoint.
+
+    Instructions found in `answers` are answered with the given point (in the
+    model's 0-1000 relative space), every other instruction with a point
+    derived from its hash, so repeated runs always produce the same output.
+    """
+
+    def __init__(self, answers: dict = None, latency: float = 0.0):
+        self.answers = answers or {}
+        self.latency = latency
+
+    def __call__(self, messages: list[dict]) -> str:
+        instruction = extract_instruction(messages)
+        if instruction in self.answers:
+            x, y = self.answers[instruction]
+        else:
+            digest = hashlib.md5(instruction.encode("utf-8")).digest()
+            x = int.from_bytes(digest[:2], "little") % 1000
+            y = int.from_bytes(digest[2:4], "little") % 1000
+        if self.latency:
+            time.sleep(self.latency)
+        return f"Action: click(point='<point>{int(x)} {int(y)}</point>')"
+
+
+def make_handler(model):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length))
+            content = model(payload.get("messages", []))
+            if payload.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                chunk = {"choices": [{"delta": {"content": content}}]}
+                self.wfile.write(b"data: " + json.dumps(chunk).encode() +
+                                 b"\n\n")
+                self.wfile.write(b"data: [DONE]\n\n")
+            else:
+                body = json.dumps({
+                    "choices": [{
+                        "message": {
+                            "role": "assistant",
+                            "content": content
+                        }
+                    }]
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+    return Handler
+
+
+def start_mock_server(model, host: str = "127.0.0.1", port: int = 0):
+    """Serves `model` on a background thread and returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(model))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/api/v3/chat/completions"
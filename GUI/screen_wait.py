@@ -0,0 +1,255 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""Adaptive waits for generated pyautogui scripts.
+
+Instead of sleeping a fixed time after every action, the fast scripts of
+`parsing_response_to_pyautogui_code` poll a downscaled screenshot until the
+screen has stopped changing. `grab_screen`, `frame_difference` and
+`wait_until_stable` are copied into those scripts, so they import what they
+need themselves and use nothing else from this module.
+
+`FakeScreen` runs generated scripts against an in-memory screen on a virtual
+clock, with UI transitions of random latency after every input event.
+
+Example:
+    python screen_wait.py
+runs a 20-step task with fixed sleeps and with adaptive waits and reports
+the time per step and the actions sent while the UI was still changing.
+"""
+import random
+import inspect
+import builtins
+
+from PIL import Image, ImageDraw
+
+
+def grab_screen(scale=4):
+    """A grayscale screenshot downscaled by `scale`, cheap to compare."""
+    import pyautogui
+    return pyautogui.screenshot().convert("L").reduce(scale)
+
+
+def frame_difference(a, b, threshold=16):
+    """Fraction of pixels whose gray level differs by more than `threshold`."""
+    from PIL import ImageChops
+    diff = ImageChops.difference(a, b)
+    changed = diff.point(lambda v: 255
+                         if v > threshold else 0).histogram()[255]
+    return changed / (a.width * a.height)
+
+
+def wait_until_stable(before=None,
+                      timeout=5.0,
+                      interval=0.05,
+                      settle=0.25,
+                      change_window=0.3,
+                      tolerance=0.002):
+    """Polls the screen until it has been still for `settle` seconds.
+
+    The screen must first differ from `before`, the frame of the previous
+    wait; an action that changes nothing, such as a hover, is done once
+    `change_window` passed without a change. Differences below `tolerance`,
+    e.g. a blinking caret, are ignored. Gives up after `timeout` seconds.
+
+    Returns the last frame, the `before` of the next wait.
+    """
+    import time
+    start = time.monotonic()
+    frame = grab_screen()
+    changed = before is None or frame_difference(frame, before) > tolerance
+    still_since = start
+    while time.monotonic() - start < timeout:
+        time.sleep(interval)
+        current = grab_screen()
+        now = time.monotonic()
+        if frame_difference(current, frame) > tolerance:
+            changed, still_since = True, now
+        frame = current
+        if now - still_since >= settle and (changed
+                                            or now - start >= change_window):
+            break
+    return frame
+
+
+FAST_PRELUDE = "\n\n".join(
+    inspect.getsource(function)
+    for function in (grab_screen, frame_difference, wait_until_stable))
+
+
+class VirtualClock:
+    """Stands in for the `time` module of a script run by `run_script`."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    time = perf_counter = monotonic
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+
+# event: (delay range, duration range) of the UI transition it starts, or
+# None if it changes nothing on screen
+DEFAULT_LATENCIES = {
+    "click": ((0.0, 0.15), (0.1, 1.8)),
+    "hover": None,
+    "paste": ((0.0, 0.05), (0.02, 0.1)),
+    "write": ((0.0, 0.05), (0.02, 0.1)),
+    "key": ((0.0, 0.1), (0.1, 0.8)),
+    "scroll": ((0.0, 0.05), (0.2, 0.4)),
+    "drag": ((0.0, 0.05), (0.05, 0.2)),
+}
+
+
+class FakeScreen:
+    """In-memory screen with the pyautogui and pyperclip calls of scripts.
+
+    Every input event starts a UI transition: after a random delay a bar
+    slides across the screen for a random duration, then the screen shows a
+    new settled state. A caret blinks twice a second throughout. Events sent
+    while a transition is still running are counted as early.
+    """
+
+    def __init__(self,
+                 latencies: dict = None,
+                 seed: int = 0,
+                 size: tuple = (1280, 720),
+                 capture_seconds: float = 0.02):
+        self.latencies = latencies or DEFAULT_LATENCIES
+        self.rng = random.Random(seed)
+        self.size = size
+        self.capture_seconds = capture_seconds
+        self.clock = VirtualClock()
+        self.transitions = []
+        self.events = []
+        self.clipboard = ""
+
+    @property
+    def busy_until(self) -> float:
+        return max((end for _, end in self.transitions), default=0.0)
+
+    def _event(self, kind: str):
+        now = self.clock.now
+        self.events.append((now, kind, now < self.busy_until))
+        latency = self.latencies[kind]
+        if latency is None:
+            return
+        (min_delay, max_delay), (min_duration, max_duration) = latency
+        start = now + self.rng.uniform(min_delay, max_delay)
+        self.transitions.append(
+            (start, start + self.rng.uniform(min_duration, max_duration)))
+
+    def screenshot(self) -> Image.Image:
+        now = self.clock.now
+        self.clock.sleep(self.capture_seconds)
+        settled = sum(end <= now for _, end in self.transitions)
+        image = Image.new("RGB", self.size, "white")
+        draw = ImageDraw.Draw(image)
+        width, height = self.size
+        shade = 20 + settled * 37 % 200
+        draw.rectangle((width // 8, height // 8, width // 2, height // 2),
+                       fill=(shade, shade, shade))
+        for start, end in self.transitions:
+            if start <= now < end:
+                x = int((now - start) * width) % width
+                draw.rectangle((x, height // 2, x + width // 10, height),
+                               fill="gray")
+        if int(now * 2) % 2:
+            draw.rectangle((width - 40, 20, width - 38, 36), fill="black")
+        return image
+
+    # pyautogui
+    def click(self, *args, **kwargs):
+        self._event("click")
+
+    doubleClick = click
+
+    def moveTo(self, *args, **kwargs):
+        self._event("hover")
+
+    def dragTo(self, *args, duration=0.0, **kwargs):
+        self.clock.sleep(duration)
+        self._event("drag")
+
+    def hotkey(self, *keys, **kwargs):
+        self._event("paste" if keys == ("ctrl", "v") else "key")
+
+    def press(self, *args, **kwargs):
+        self._event("key")
+
+    keyDown = keyUp = press
+
+    def write(self, text, interval=0.0, **kwargs):
+        self.clock.sleep(len(text) * interval)
+        self._event("write")
+
+    def scroll(self, *args, **kwargs):
+        self._event("scroll")
+
+    # pyperclip
+    def copy(self, text):
+        self.clipboard = text
+
+
+def run_script(code: str, screen: FakeScreen):
+    """Executes a generated script against `screen` and its virtual clock."""
+    fakes = {"pyautogui": screen, "pyperclip": screen, "time": screen.clock}
+
+    def import_fake(name, *args, **kwargs):
+        if name in fakes:
+            return fakes[name]
+        return builtins.__import__(name, *args, **kwargs)
+
+    exec(code, {"__builtins__": {**vars(builtins), "__import__": import_fake}})
+
+
+def sample_task(n_steps: int = 20) -> list[dict]:
+    """Parsed actions of a form-filling task, as `parse_action_to_structure_output` returns them."""
+    center = "[0.5, 0.5, 0.5, 0.5]"
+    actions = [
+        ("click", dict(start_box="[0.1, 0.05, 0.1, 0.05]")),
+        ("type", dict(content="quarterly report\\n")),
+        ("hover", dict(start_box="[0.4, 0.3, 0.4, 0.3]")),
+        ("left_double", dict(start_box=center)),
+        ("hotkey", dict(hotkey="ctrl a")),
+        ("type", dict(content="收入 2025 Q3")),
+        ("scroll", dict(start_box=center, direction="down")),
+        ("drag", dict(start_box="[0.2, 0.2, 0.2, 0.2]", end_box=center)),
+        ("press", dict(key="enter")),
+        ("right_single", dict(start_box="[0.7, 0.8, 0.7, 0.8]")),
+    ]
+    return [{
+        "action_type": action_type,
+        "action_inputs": action_inputs,
+        "thought": "",
+    } for action_type, action_inputs in (actions * n_steps)[:n_steps]]
+
+
+def benchmark(n_steps: int = 20, seed: int = 0):
+    from action_parser import parsing_response_to_pyautogui_code
+
+    responses = sample_task(n_steps)
+    baseline = None
+    for mode, fast in (("fixed sleeps", False), ("adaptive waits", True)):
+        code = parsing_response_to_pyautogui_code(responses,
+                                                  1080,
+                                                  1920,
+                                                  fast=fast)
+        screen = FakeScreen(seed=seed)
+        run_script(code, screen)
+        elapsed = screen.clock.now
+        # the agent's next screenshot is only meaningful once the UI settled
+        settled = max(elapsed, screen.busy_until)
+        early = sum(busy for _, _, busy in screen.events)
+        baseline = baseline or settled
+        saved = f" ({1 - settled / baseline:.0%} less)" if fast else ""
+        print(f"{mode:>14}: {settled:.1f} s for {n_steps} steps, "
+              f"{settled / n_steps:.2f} s/step{saved}, {early} of "
+              f"{len(screen.events)} actions sent while the UI was changing")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,188 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""Client-side screenshot preprocessing for GUI requests.
+
+Screenshots are resized to the `smart_resize` grid the model works in and
+re-encoded to a compact format before upload. The applied transform is
+recorded so that parsed actions can be mapped back to original screen pixels.
+
+Example:
+    python screenshot.py samples/*.png
+"""
+import io
+import os
+import ast
+import sys
+import time
+import base64
+from dataclasses import dataclass
+
+from PIL import Image
+
+from action_parser import smart_resize, IMAGE_FACTOR, MIN_PIXELS, MAX_PIXELS
+
+
+def count_visual_tokens(height: int,
+                        width: int,
+                        min_pixels: int = MIN_PIXELS,
+                        max_pixels: int = MAX_PIXELS) -> int:
+    """Visual tokens of a screenshot on the model's 28x28 patch grid."""
+    resized_height, resized_width = smart_resize(height,
+                                                 width,
+                                                 factor=IMAGE_FACTOR,
+                                                 min_pixels=min_pixels,
+                                                 max_pixels=max_pixels)
+    return (resized_height // IMAGE_FACTOR) * (resized_width // IMAGE_FACTOR)
+
+
+@dataclass(frozen=True)
+class ScreenshotTransform:
+    """Geometry of an original screenshot and of the image actually uploaded."""
+    original_height: int
+    original_width: int
+    resized_height: int
+    resized_width: int
+
+    @property
+    def visual_tokens(self) -> int:
+        # an upload off the 28x28 grid is put on it server-side
+        return count_visual_tokens(self.resized_height, self.resized_width)
+
+    @property
+    def scale_x(self) -> float:
+        return self.original_width / self.resized_width
+
+    @property
+    def scale_y(self) -> float:
+        return self.original_height / self.resized_height
+
+    def to_original(self, x: float, y: float) -> tuple[float, float]:
+        """Maps a point in uploaded-image pixels to original screen pixels."""
+        return x * self.scale_x, y * self.scale_y
+
+    def relative_to_original(self, x: float,
+                             y: float) -> tuple[float, float]:
+        """Maps a point in [0, 1] relative coordinates to original screen pixels.
+
+        The resize stretches the whole screenshot without cropping, so relative
+        coordinates address the same location in both images.
+        """
+        return x * self.original_width, y * self.original_height
+
+    def map_action(self, action: dict) -> dict:
+        """Adds `start_point`/`end_point` in original pixels to a parsed action.
+
+        `action` is one entry of `parse_action_to_structure_output(..., 1000, ...)`
+        whose boxes are relative `[x1, y1, x2, y2]` strings.
+        """
+        action_inputs = dict(action.get("action_inputs", {}))
+        for box_name, point_name in (("start_box", "start_point"),
+                                     ("end_box", "end_point")):
+            if box_name not in action_inputs:
+                continue
+            # model output, so it is parsed as a literal and never evaluated
+            x1, y1, x2, y2 = ast.literal_eval(action_inputs[box_name])
+            action_inputs[point_name] = list(
+                self.relative_to_original((x1 + x2) / 2, (y1 + y2) / 2))
+        return {**action, "action_inputs": action_inputs}
+
+
+@dataclass
+class PreprocessedScreenshot:
+    data: bytes
+    image_format: str
+    transform: ScreenshotTransform
+    original_bytes: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def base64(self) -> str:
+        return base64.b64encode(self.data).decode('utf-8')
+
+    @property
+    def data_url(self) -> str:
+        return f"data:image/{self.image_format};base64,{self.base64}"
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+
+def preprocess_screenshot(image,
+                          min_pixels: int = MIN_PIXELS,
+                          max_pixels: int = MAX_PIXELS,
+                          image_format: str = "jpeg",
+                          quality: int = 90,
+                          max_visual_tokens: int = None) -> PreprocessedScreenshot:
+    """Resizes a screenshot to its `smart_resize` target and encodes it.
+
+    Args:
+        image: a file path or a PIL image.
+        min_pixels, max_pixels: pixel budget passed to `smart_resize`.
+        image_format: output format, `jpeg`, `webp` or `png`.
+        quality: encoder quality for lossy formats.
+        max_visual_tokens: if set, raise `ValueError` before encoding when the
+            screenshot would need more visual tokens.
+    """
+    start = time.perf_counter()
+    original_bytes = 0
+    if isinstance(image, str):
+        original_bytes = os.path.getsize(image)
+        image = Image.open(image)
+    image = image.convert("RGB")
+    width, height = image.size
+    resized_height, resized_width = smart_resize(height,
+                                                 width,
+                                                 factor=IMAGE_FACTOR,
+                                                 min_pixels=min_pixels,
+                                                 max_pixels=max_pixels)
+    # never upscaled: rounding to the grid would enlarge a 1920x1080 capture
+    # to 1932x1092, which the server does itself with the same rule
+    resized_height = min(resized_height, height)
+    resized_width = min(resized_width, width)
+    transform = ScreenshotTransform(height, width, resized_height,
+                                    resized_width)
+    if max_visual_tokens is not None and transform.visual_tokens > max_visual_tokens:
+        raise ValueError(
+            f"screenshot needs {transform.visual_tokens} visual tokens, limit is {max_visual_tokens}"
+        )
+    if (resized_height, resized_width) != (height, width):
+        image = image.resize((resized_width, resized_height),
+                             Image.Resampling.BICUBIC)
+    buffer = io.BytesIO()
+    if image_format == "png":
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        image.save(buffer, format=image_format.upper(), quality=quality)
+    return PreprocessedScreenshot(
+        data=buffer.getvalue(),
+        image_format=image_format,
+        transform=transform,
+        original_bytes=original_bytes,
+        elapsed=time.perf_counter() - start,
+    )
+
+
+def main(image_paths: list[str]):
+    total_original, total_encoded, total_elapsed = 0, 0, 0.0
+    for image_path in image_paths:
+        screenshot = preprocess_screenshot(image_path)
+        transform = screenshot.transform
+        total_original += screenshot.original_bytes
+        total_encoded += len(screenshot.data)
+        total_elapsed += screenshot.elapsed
+        print(f"{image_path}: {transform.original_width}x{transform.original_height}"
+              f" -> {transform.resized_width}x{transform.resized_height}, "
+              f"{screenshot.original_bytes / 1024:.1f} KB -> "
+              f"{len(screenshot.data) / 1024:.1f} KB, "
+              f"{transform.visual_tokens} tokens, "
+              f"{screenshot.elapsed * 1000:.1f} ms")
+    if image_paths:
+        print(f"total: {total_original / 1024:.1f} KB -> "
+              f"{total_encoded / 1024:.1f} KB "
+              f"({1 - total_encoded / total_original:.1%} saved), "
+              f"{total_elapsed / len(image_paths) * 1000:.1f} ms/step")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,227 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+import time
+import itertools
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass, field, replace
+
+from infer import SeedVLInfer
+from metrics import METRICS
+from token_accounting import TokenReport
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of being queued."""
+
+
+@dataclass
+class RequestCost:
+    visual_tokens: int = 0
+    text_tokens: int = 0
+    n_frames: int = 0
+    thinking: bool = False
+    max_video_length: int = None
+    # what the estimate was computed from, passed on to `SeedVLInfer` so the
+    # request is not accounted again
+    report: TokenReport = field(default=None, repr=False, compare=False)
+
+    @property
+    def tokens(self) -> int:
+        return self.visual_tokens + self.text_tokens
+
+    @property
+    def weight(self) -> float:
+        # deep thinking generates several times more output per request
+        return self.tokens * (4 if self.thinking else 1)
+
+    @property
+    def downgradable(self) -> bool:
+        return self.thinking or self.n_frames > 0
+
+
+def estimate_cost(infer: SeedVLInfer,
+                  inputs: dict,
+                  thinking: bool,
+                  max_video_length: int = None) -> RequestCost:
+    """Estimates the tokens of a request from its planned frames and sizes.
+
+    Only file headers and the video index are read; nothing is resized or
+    encoded. Raises `TokenLimitExceeded` if `infer.token_limits` are exceeded.
+    """
+    report = infer.account(inputs, max_video_length=max_video_length)
+    return RequestCost(visual_tokens=report.total,
+                       text_tokens=len(inputs.get('text', '')),
+                       n_frames=report.n_frames,
+                       thinking=thinking,
+                       max_video_length=max_video_length,
+                       report=report)
+
+
+@dataclass
+class Ticket:
+    session_id: str
+    cost: RequestCost
+    downgraded: bool = False
+    wait_time: float = 0.0
+
+
+class AdmissionController:
+    """Admission, fairness and load shedding in front of the chat handlers.
+
+    Requests wait in a priority queue ordered by estimated cost minus
+    `aging_rate` per second waited, so cheap requests run first but an
+    expensive one is not starved by a stream of cheaper ones. A session may
+    have at most `max_inflight_per_session` running requests and spend at
+    most `session_tokens_per_minute` tokens.
+    Once `downgrade_queue_depth` requests are waiting, video requests are
+    re-planned with `downgrade_video_length` and run in General mode; once
+    `shed_queue_depth` requests are waiting, new requests are rejected.
+
+    Example:
+        cost = estimate_cost(infer, inputs, thinking)
+        with admission.admit(session_id, cost, infer) as ticket:
+            ... # use ticket.cost.thinking / ticket.cost.max_video_length
+    """
+
+    def __init__(self,
+                 max_inflight: int = 32,
+                 max_inflight_per_session: int = 2,
+                 session_tokens_per_minute: int = 1_000_000,
+                 downgrade_queue_depth: int = 32,
+                 shed_queue_depth: int = 96,
+                 downgrade_video_length: int = 16384,
+                 max_wait: float = 120,
+                 aging_rate: float = 10_000):
+        self.max_inflight = max_inflight
+        self.max_inflight_per_session = max_inflight_per_session
+        self.session_tokens_per_minute = session_tokens_per_minute
+        self.downgrade_queue_depth = downgrade_queue_depth
+        self.shed_queue_depth = shed_queue_depth
+        self.downgrade_video_length = downgrade_video_length
+        self.max_wait = max_wait
+        self.aging_rate = aging_rate
+
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._inflight = 0
+        self._session_inflight = defaultdict(int)
+        self._session_usage = defaultdict(deque)
+
+    def _session_tokens(self, session_id: str, now: float) -> int:
+        usage = self._session_usage[session_id]
+        while usage and usage[0][0] < now - 60:
+            usage.popleft()
+        if not usage:
+            del self._session_usage[session_id]
+            return 0
+        return sum(tokens for _, tokens in usage)
+
+    def _next_runnable(self):
+        """Returns the first queued entry whose session has spare capacity."""
+        if self._inflight >= self.max_inflight:
+            return None
+        for entry in sorted(self._queue, key=lambda entry: entry[:2]):
+            if self._session_inflight[
+                    entry[2].session_id] < self.max_inflight_per_session:
+                return entry
+        return None
+
+    def _downgrade(self, ticket: Ticket, infer: SeedVLInfer,
+                   inputs: dict) -> Ticket:
+        if inputs is not None and ticket.cost.n_frames:
+            cost = estimate_cost(infer,
+                                 inputs,
+                                 False,
+                                 max_video_length=self.downgrade_video_length)
+        else:
+            cost = replace(ticket.cost, thinking=False)
+        METRICS.counter('admission_downgraded').inc()
+        return replace(ticket, cost=cost, downgraded=True)
+
+    def _update_gauges(self):
+        METRICS.gauge('admission_queue_depth').set(len(self._queue))
+        METRICS.gauge('admission_inflight').set(self._inflight)
+
+    def acquire(self,
+                session_id: str,
+                cost: RequestCost,
+                infer: SeedVLInfer = None,
+                inputs: dict = None) -> Ticket:
+        ticket = Ticket(session_id, cost)
+        start = time.perf_counter()
+        with self._cond:
+            overloaded = len(self._queue) >= self.downgrade_queue_depth
+        # re-planning reads the video, so it runs without the lock
+        if overloaded and cost.downgradable:
+            ticket = self._downgrade(ticket, infer, inputs)
+        with self._cond:
+            now = time.monotonic()
+            # the tokens the request will use, and that are recorded below
+            tokens = ticket.cost.tokens
+            if self._session_tokens(
+                    session_id, now) + tokens > self.session_tokens_per_minute:
+                METRICS.counter('admission_rejected_quota').inc()
+                raise AdmissionRejected(
+                    'token quota exceeded, please retry in a minute')
+            if len(self._queue) >= self.shed_queue_depth:
+                METRICS.counter('admission_shed').inc()
+                raise AdmissionRejected(
+                    'server is overloaded, please retry later')
+            # cost - aging_rate * (now - enqueued) orders entries the same
+            # way as this key, which does not change while they wait
+            priority = ticket.cost.weight + self.aging_rate * now
+            entry = (priority, next(self._sequence), ticket)
+            self._queue.append(entry)
+            self._update_gauges()
+            deadline = start + self.max_wait
+            while self._next_runnable() is not entry:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._queue.remove(entry)
+                    self._update_gauges()
+                    self._cond.notify_all()
+                    METRICS.counter('admission_timeout').inc()
+                    raise AdmissionRejected('timed out waiting in queue')
+                self._cond.wait(remaining)
+            self._queue.remove(entry)
+            self._inflight += 1
+            self._session_inflight[session_id] += 1
+            self._session_usage[session_id].append((now, tokens))
+            self._update_gauges()
+        ticket.wait_time = time.perf_counter() - start
+        METRICS.counter('admission_admitted').inc()
+        METRICS.histogram('admission_wait_seconds').observe(ticket.wait_time)
+        METRICS.histogram('admission_cost_tokens').observe(ticket.cost.tokens)
+        return ticket
+
+    def release(self, ticket: Ticket):
+        with self._cond:
+            self._inflight -= 1
+            self._session_inflight[ticket.session_id] -= 1
+            if not self._session_inflight[ticket.session_id]:
+                del self._session_inflight[ticket.session_id]
+            self._update_gauges()
+            self._cond.notify_all()
+
+    class _Admission:
+
+        def __init__(self, controller, *args):
+            self.controller = controller
+            self.args = args
+
+        def __enter__(self) -> Ticket:
+            self.ticket = self.controller.acquire(*self.args)
+            return self.ticket
+
+        def __exit__(self, *exc):
+            self.controller.release(self.ticket)
+
+    def admit(self,
+              session_id: str,
+              cost: RequestCost,
+              infer: SeedVLInfer = None,
+              inputs: dict = None):
+        """Context manager around `acquire`/`release`."""
+        return self._Admission(self, session_id, cost, infer, inputs)
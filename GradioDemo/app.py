@@ -3,8 +3,42 @@
 import os
 import gradio as gr
 from infer import SeedVLInfer, ConversationModeI18N, ConversationModeCN
+from admission import (AdmissionController, AdmissionRejected, RequestCost,
+                       estimate_cost)
+from token_accounting import TokenLimitExceeded
+from resilience import UpstreamError
+from session_store import BlobStore, SessionStore, MediaExpired
+from frame_ingest import FrameIngestor
+from long_video import LongVideoInfer
+from metrics import METRICS
 
-infer = SeedVLInfer(api_key=os.environ.get('API_KEY'))
+visual_token_budget = os.environ.get('VISUAL_TOKEN_BUDGET')
+session_ttl = float(os.environ.get('SESSION_TTL', 3600))
+blob_store_memory_bytes = int(
+    os.environ.get('BLOB_STORE_MEMORY_BYTES', 1 << 30))
+blob_store = BlobStore(max_memory_bytes=blob_store_memory_bytes,
+                       spill_dir=os.environ.get('BLOB_STORE_SPILL_DIR'))
+session_store = SessionStore(blob_store, ttl=session_ttl)
+infer = SeedVLInfer(
+    api_key=os.environ.get('API_KEY'),
+    visual_token_budget=int(visual_token_budget)
+    if visual_token_budget else None,
+    media_workers=int(os.environ.get('MEDIA_WORKERS', 0)),
+    media_queue_depth=int(os.environ.get('MEDIA_QUEUE_DEPTH', 64)),
+    prefetch_workers=int(os.environ.get('PREFETCH_WORKERS', 2)),
+    image_backend=os.environ.get('IMAGE_BACKEND', 'torchvision'),
+    session_store=session_store,
+    video_index=os.environ.get('VIDEO_INDEX') or None,
+    video_index_dir=os.environ.get('VIDEO_INDEX_DIR'))
+admission = AdmissionController()
+# a first question on a longer video is answered segment by segment
+long_video_seconds = float(os.environ.get('LONG_VIDEO_SEGMENT_SECONDS', 300))
+long_video = LongVideoInfer(
+    infer, segment_seconds=long_video_seconds,
+    admission=admission) if long_video_seconds else None
+frame_ingestor = FrameIngestor(infer, ttl=session_ttl)
+# recent frames shown in the Online tab; questions use `frame_ingestor`
+GALLERY_FRAMES = 16
 
 label_translations = {
     "gr_chatinterface_ofl": {
@@ -51,13 +85,59 @@ label_translations = {
 }
 
 
-def offline_chat(gr_inputs: dict, gr_history: list, infer_history: list,
-                 if_thinking: bool, temperature: float):
+def offline_chat(gr_inputs: dict,
+                 gr_history: list,
+                 infer_history: list,
+                 if_thinking: bool,
+                 temperature: float,
+                 request: gr.Request = None,
+                 tab: str = 'offline'):
+    session_id = request.session_hash if request is not None else None
+    ticket = None
+    try:
+        cost = estimate_cost(infer, gr_inputs, if_thinking)
+        # a long video is admitted segment by segment in `long_video`
+        segmented = long_video is not None and long_video.accepts(
+            gr_inputs, infer_history, cost.report)
+        if not segmented:
+            ticket = admission.acquire(session_id, cost, infer, gr_inputs)
+            cost = ticket.cost
+    except (AdmissionRejected, TokenLimitExceeded) as e:
+        raise gr.Error(str(e))
+    try:
+        yield from _offline_chat(gr_inputs, infer_history, cost, temperature,
+                                 session_id, f'{session_id}/{tab}', segmented)
+    except (UpstreamError, MediaExpired, AdmissionRejected,
+            TokenLimitExceeded) as e:
+        raise gr.Error(str(e))
+    finally:
+        if ticket is not None:
+            admission.release(ticket)
+
+
+def _offline_chat(gr_inputs: dict, infer_history: list, cost: RequestCost,
+                  temperature: float, session_id: str, history_id: str,
+                  segmented: bool):
+    if_thinking = cost.thinking
     mode = ConversationModeI18N.D if if_thinking else ConversationModeI18N.G
-    for response_text, infer_history in infer(inputs=gr_inputs,
-                                              history=infer_history,
-                                              mode=mode,
-                                              temperature=temperature):
+    if segmented:
+        # the history is text only, nothing is stored under `history_id`
+        stream = long_video.chat(gr_inputs,
+                                 infer_history,
+                                 mode=mode,
+                                 temperature=temperature,
+                                 session_id=session_id,
+                                 report=cost.report)
+    else:
+        stream = infer(inputs=gr_inputs,
+                       history=infer_history,
+                       mode=mode,
+                       temperature=temperature,
+                       session_id=session_id,
+                       max_video_length=cost.max_video_length,
+                       history_id=history_id,
+                       report=cost.report)
+    for response_text, infer_history in stream:
         if if_thinking:
             reasoning_text, response_text = response_text.split('</think>')
             reasoning_text = reasoning_text.lstrip('<think>')
@@ -80,18 +160,59 @@ def offline_chat(gr_inputs: dict, gr_history: list, infer_history: list,
             yield response_text, infer_history
 
 
-def online_record_chat(text: str, gr_history: list, gr_webcam_images: list,
-                       gr_counter: int, infer_history: list, if_thinking: bool,
-                       temperature: float):
-    if not gr_webcam_images:
-        gr_webcam_images = []
-    gr_webcam_images = gr_webcam_images[gr_counter:]
-    inputs = {'text': text, 'files': [webp for webp, _ in gr_webcam_images]}
-    yield f'received {len(gr_webcam_images)} new frames, processing...', gr_counter + len(
-        gr_webcam_images), infer_history
+def online_record_chat(text: str,
+                       gr_history: list,
+                       infer_history: list,
+                       if_thinking: bool,
+                       temperature: float,
+                       request: gr.Request = None):
+    frames = []
+    if request is not None:
+        frames = frame_ingestor.take(request.session_hash)
+    inputs = {'text': text, 'frames': frames}
+    yield f'received {len(frames)} new frames, processing...', infer_history
     for response_message, infer_history in offline_chat(
-            inputs, gr_history, infer_history, if_thinking, temperature):
-        yield response_message, gr.skip(), infer_history
+            inputs, gr_history, infer_history, if_thinking, temperature,
+            request, 'online'):
+        yield response_message, infer_history
+
+
+def ingest_webcam(frame, recorded_images: list, request: gr.Request):
+    """Encodes a streamed frame for the next question; updates the gallery."""
+    if frame is None:
+        return gr.skip()
+    frame_ingestor.add(request.session_hash, frame)
+    recorded_images = recorded_images or []
+    return recorded_images[-(GALLERY_FRAMES - 1):] + [frame]
+
+
+def queue_metrics() -> dict:
+    return {**METRICS.snapshot(), 'session_bytes': session_store.usage()}
+
+
+def cancel_session(request: gr.Request):
+    infer.cancel(request.session_hash)
+
+
+def clear_session(request: gr.Request):
+    cancel_session(request)
+    if infer.prefetcher is not None:
+        infer.prefetcher.discard(request.session_hash)
+    session_store.drop(f'{request.session_hash}/offline')
+    return []
+
+
+def release_session(request: gr.Request):
+    infer.cancel(request.session_hash)
+    infer.streams.discard(request.session_hash)
+    for tab in ('offline', 'online'):
+        session_store.drop(f'{request.session_hash}/{tab}')
+    frame_ingestor.discard(request.session_hash)
+
+
+def prefetch_uploads(gr_inputs: dict, request: gr.Request):
+    if infer.prefetcher is not None and gr_inputs:
+        infer.prefetcher.update(request.session_hash, gr_inputs)
 
 
 with gr.Blocks() as demo:
@@ -106,7 +227,7 @@ with gr.Blocks() as demo:
                                            scale=0)
     with gr.Tabs():
         with gr.Tab("Offline") as gr_tab_ofl:
-            gr_infer_history = gr.State([])
+            gr_infer_history = gr.State([], time_to_live=session_ttl)
             gr_thinking_hidden = gr.Checkbox(value=True, visible=False)
             gr_temperature_hidden = gr.Slider(minimum=0.0,
                                               maximum=2.0,
@@ -132,8 +253,14 @@ with gr.Blocks() as demo:
                 additional_outputs=[gr_infer_history],
             )
             gr.on(triggers=[gr_chatinterface_ofl.chatbot.clear],
-                  fn=lambda: [],
+                  fn=clear_session,
                   outputs=[gr_infer_history])
+            gr_chatinterface_ofl.textbox.stop(fn=cancel_session)
+            gr_chatinterface_ofl.textbox.change(
+                fn=prefetch_uploads,
+                inputs=[gr_chatinterface_ofl.textbox],
+                queue=False,
+                show_progress='hidden')
             with gr.Row():
                 with gr.Column(scale=1, min_width=200):
                     gr_thinking_ofl = gr.Checkbox(
@@ -214,7 +341,7 @@ with gr.Blocks() as demo:
         with gr.Tab("Online") as gr_tab_ol:
             with gr.Row():
                 with gr.Column(scale=1):
-                    gr_infer_history = gr.State([])
+                    gr_infer_history = gr.State([], time_to_live=session_ttl)
                     gr_thinking_hidden = gr.Checkbox(value=True, visible=False)
                     gr_temperature_hidden = gr.Slider(minimum=0.0,
                                                       maximum=2.0,
@@ -229,7 +356,7 @@ with gr.Blocks() as demo:
                                 ['English'],
                                 sources="webcam",
                                 height=250,
-                                type='filepath')
+                                type='numpy')
                             gr_webcam_images = gr.Gallery(
                                 label=label_translations['gr_webcam_images']
                                 ['English'],
@@ -239,7 +366,6 @@ with gr.Blocks() as demo:
                                 height=250,
                                 preview=True,
                                 interactive=False)
-                            gr_counter = gr.Number(value=0, visible=False)
                         with gr.Column(scale=3):
                             gr_chatinterface_ol = gr.ChatInterface(
                                 fn=online_record_chat,
@@ -252,23 +378,16 @@ with gr.Blocks() as demo:
                                         submit_btn=True,
                                         stop_btn=True),
                                 additional_inputs=[
-                                    gr_webcam_images, gr_counter,
                                     gr_infer_history, gr_thinking_hidden,
                                     gr_temperature_hidden
                                 ],
-                                additional_outputs=[
-                                    gr_counter, gr_infer_history
-                                ],
+                                additional_outputs=[gr_infer_history],
                             )
 
-                            def cache_webcam(recorded_image: str,
-                                             recorded_images: list):
-                                if not recorded_images:
-                                    recorded_images = []
-                                return recorded_images + [recorded_image]
+                            gr_chatinterface_ol.textbox.stop(fn=cancel_session)
 
                             gr_webcam_image.stream(
-                                fn=cache_webcam,
+                                fn=ingest_webcam,
                                 inputs=[gr_webcam_image, gr_webcam_images],
                                 outputs=[gr_webcam_images],
                                 stream_every=1,
@@ -317,6 +436,9 @@ with gr.Blocks() as demo:
             gr.update(label=label_translations['gr_webcam_images'][lang]),
         )
 
+    gr.api(queue_metrics, api_name='metrics')
+    demo.unload(release_session)
+
     gr_lang_selector.change(fn=update_lang,
                             inputs=[gr_lang_selector],
                             outputs=[
@@ -335,6 +457,10 @@ with gr.Blocks() as demo:
                                 gr_webcam_image,
                                 gr_webcam_images,
                             ])
-demo.queue(default_concurrency_limit=100, max_size=100).launch(share=True,
-                                                               max_threads=100,
-                                                               ssr_mode=False)
+# media pool workers are spawned and re-import this module, so only the main
+# process may launch the server
+if __name__ == '__main__':
+    demo.queue(default_concurrency_limit=100,
+               max_size=100).launch(share=True,
+                                    max_threads=100,
+                                    ssr_mode=False)
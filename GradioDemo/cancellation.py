@@ -0,0 +1,104 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+import socket
+import threading
+from collections import defaultdict
+
+import requests
+
+from metrics import METRICS
+
+
+def response_socket(response: requests.Response):
+    """Returns the socket a streaming response reads from, if reachable."""
+    fp = getattr(getattr(response.raw, '_fp', None), 'fp', None)
+    return getattr(getattr(fp, 'raw', None), '_sock', None)
+
+
+def close_response(response: requests.Response):
+    """Closes a streaming response and unblocks any thread reading from it.
+
+    Closing the file object alone does not wake a thread blocked in `recv`,
+    so the underlying socket is shut down first when it can be reached.
+    """
+    sock = response_socket(response)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+
+class StreamRegistry:
+    """Tracks in-flight upstream responses per session so they can be cancelled.
+
+    Every `cancel` also advances the session's generation. A request that
+    captured `generation` when its turn began is cancelled once it changed,
+    even if the cancel came while it had no response registered, e.g.
+    during a retry backoff.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._streams = defaultdict(set)
+        self._cancelled = set()
+        self._generations = {}
+
+    def register(self, session_id: str, response: requests.Response):
+        with self._lock:
+            self._streams[session_id].add(response)
+        METRICS.gauge('streams_active').inc()
+
+    def unregister(self, session_id: str, response: requests.Response) -> bool:
+        """Forgets a response; returns whether it was cancelled."""
+        with self._lock:
+            self._streams[session_id].discard(response)
+            if not self._streams[session_id]:
+                del self._streams[session_id]
+            cancelled = id(response) in self._cancelled
+            self._cancelled.discard(id(response))
+        METRICS.gauge('streams_active').dec()
+        return cancelled
+
+    def cancel(self, session_id: str) -> int:
+        """Closes every in-flight response of a session and cancels the
+        requests of its current turn; returns how many responses were closed."""
+        with self._cond:
+            responses = list(self._streams.get(session_id, ()))
+            self._cancelled.update(id(response) for response in responses)
+            self._generations[session_id] = self._generations.get(
+                session_id, 0) + 1
+            self._cond.notify_all()
+        for response in responses:
+            close_response(response)
+        return len(responses)
+
+    def generation(self, session_id: str) -> int:
+        """Captured when a turn begins; see `cancelled`."""
+        with self._lock:
+            return self._generations.get(session_id, 0)
+
+    def cancelled(self, session_id: str, generation: int) -> bool:
+        """Whether the session was cancelled since `generation`."""
+        with self._lock:
+            return self._generations.get(session_id, 0) != generation
+
+    def wait_cancelled(self, session_id: str, generation: int,
+                       timeout: float) -> bool:
+        """Sleeps up to `timeout` seconds, waking early on a cancel; returns
+        whether the session was cancelled since `generation`."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._generations.get(session_id, 0) != generation,
+                timeout)
+
+    def discard(self, session_id: str):
+        """Forgets the generation of a session that has ended."""
+        with self._lock:
+            self._generations.pop(session_id, None)
+
+    def is_cancelled(self, response: requests.Response) -> bool:
+        with self._lock:
+            return id(response) in self._cancelled
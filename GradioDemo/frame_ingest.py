@@ -0,0 +1,190 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""In-memory ingestion of streamed webcam frames.
+
+Frames arrive from the stream callback as arrays or encoded buffers, are
+resized and JPEG encoded once, and wait per session until the next question,
+which sends them as they are. Timestamps are capture times relative to the
+session's first frame.
+
+Example:
+    python frame_ingest.py --frames 60
+streams synthetic 720p frames and compares the time from question to request
+body with the `.webp` file path.
+"""
+import time
+import warnings
+import argparse
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+import torch
+import numpy as np
+from PIL import Image
+from torchvision.io import decode_image, ImageReadMode
+
+from metrics import METRICS
+
+
+@dataclass(frozen=True)
+class EncodedFrame:
+    # identifies the frame in token reports and budgets
+    name: str
+    # position in the session's stream, 0 for its first frame
+    index: int
+    # seconds since the session's first frame
+    timestamp: float
+    height: int
+    width: int
+    # base64 JPEG at `height` x `width`
+    data: str
+
+
+def to_chw(frame) -> torch.Tensor:
+    """Returns a uint8 `(C, H, W)` RGB tensor, sharing memory where possible.
+
+    Accepts `(H, W[, C])` numpy arrays as Gradio's `type='numpy'` delivers
+    them, `(C, H, W)` tensors, PIL images and encoded image buffers.
+    """
+    if isinstance(frame, Image.Image):
+        frame = np.asarray(frame.convert('RGB'))
+    if isinstance(frame, (bytes, bytearray, memoryview)):
+        with warnings.catch_warnings():
+            # decoding only reads the buffer, read-only ones are fine
+            warnings.simplefilter('ignore', UserWarning)
+            data = torch.frombuffer(frame, dtype=torch.uint8)
+        return decode_image(data, mode=ImageReadMode.RGB)
+    if isinstance(frame, np.ndarray):
+        if frame.ndim == 2:
+            frame = frame[..., None]
+        frame = torch.from_numpy(frame).permute(2, 0, 1)
+    if frame.dtype != torch.uint8:
+        raise ValueError(f'expected uint8 frames, got {frame.dtype}')
+    if frame.shape[0] == 1:
+        return frame.expand(3, -1, -1)
+    return frame[:3]
+
+
+class _Stream:
+
+    def __init__(self, max_frames: int):
+        self.start = None
+        self.next_index = 0
+        self.pending = deque(maxlen=max_frames)
+        self.last_active = time.monotonic()
+
+
+class FrameIngestor:
+    """Encodes webcam frames on arrival and queues them per session.
+
+    At most `max_frames` unsent frames are kept per session, the oldest are
+    dropped beyond that; sessions idle for `ttl` seconds are forgotten.
+    """
+
+    def __init__(self, infer, max_frames: int = 600, ttl: float = 3600):
+        self.infer = infer
+        self.max_frames = max_frames
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._streams = {}
+
+    def add(self,
+            session_id: str,
+            frame,
+            captured_at: float = None) -> EncodedFrame:
+        """Resizes and encodes one frame; `captured_at` is `time.monotonic()` based."""
+        captured_at = time.monotonic() if captured_at is None else captured_at
+        start = time.perf_counter()
+        image = self.infer.preprocess_streaming_frame(to_chw(frame))
+        data = self.infer.encode_image(image)
+        with self._lock:
+            self._expire()
+            stream = self._streams.get(session_id)
+            if stream is None:
+                stream = self._streams[session_id] = _Stream(self.max_frames)
+            if stream.start is None:
+                stream.start = captured_at
+            index = stream.next_index
+            stream.next_index += 1
+            encoded = EncodedFrame(f'{session_id}/frame{index}', index,
+                                   round(captured_at - stream.start, 1),
+                                   image.shape[-2], image.shape[-1], data)
+            if len(stream.pending) == stream.pending.maxlen:
+                METRICS.counter('frames_dropped').inc()
+            stream.pending.append(encoded)
+            stream.last_active = time.monotonic()
+        METRICS.counter('frames_ingested').inc()
+        METRICS.histogram('frame_ingest_seconds').observe(time.perf_counter() -
+                                                          start)
+        return encoded
+
+    def take(self, session_id: str) -> list[EncodedFrame]:
+        """Returns the frames not sent yet and marks them sent."""
+        with self._lock:
+            stream = self._streams.get(session_id)
+            if stream is None:
+                return []
+            frames = list(stream.pending)
+            stream.pending.clear()
+            stream.last_active = time.monotonic()
+        return frames
+
+    def discard(self, session_id: str):
+        """Forgets a session's stream; its next frame restarts at 0 seconds."""
+        with self._lock:
+            self._streams.pop(session_id, None)
+
+    def _expire(self):
+        deadline = time.monotonic() - self.ttl
+        for session_id, stream in list(self._streams.items()):
+            if stream.last_active < deadline:
+                del self._streams[session_id]
+
+
+def main(n_frames: int):
+    import os
+    import tempfile
+    from infer import SeedVLInfer
+
+    infer = SeedVLInfer(api_key=None)
+    rng = np.random.default_rng(0)
+    frames = [
+        rng.integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+        for _ in range(n_frames)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # what Gradio's `type='filepath'` webcam did: a .webp per frame,
+        # decoded and encoded when the question is asked
+        paths = []
+        for i, frame in enumerate(frames):
+            paths.append(os.path.join(tmp, f'{i}.webp'))
+            Image.fromarray(frame).save(paths[-1])
+        start = time.perf_counter()
+        infer.construct_messages({'files': paths, 'text': 'what happened?'})
+        files_latency = time.perf_counter() - start
+
+    ingestor = FrameIngestor(infer)
+    arrival = []
+    for frame in frames:
+        start = time.perf_counter()
+        ingestor.add('session', frame)
+        arrival.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    infer.construct_messages({
+        'frames': ingestor.take('session'),
+        'text': 'what happened?'
+    })
+    frames_latency = time.perf_counter() - start
+    print(f'{n_frames} frames, question to request body: '
+          f'{files_latency:.2f} s from .webp files, '
+          f'{frames_latency * 1000:.1f} ms from ingested frames '
+          f'({np.mean(arrival) * 1000:.1f} ms per frame on arrival)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=60)
+    args = parser.parse_args()
+    main(args.frames)
@@ -0,0 +1,237 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""Resize and JPEG encode backends for `SeedVLInfer`.
+
+Every backend takes and returns uint8 torch tensors, so they are drop-in
+replacements for each other.
+
+Example:
+    python image_backend.py examples/*.jpg
+benchmarks every available backend at typical source resolutions and reports
+throughput, JPEG size and PSNR/SSIM against a float64 reference resize.
+"""
+import io
+import sys
+import time
+from abc import ABC, abstractmethod
+
+import torch
+import numpy as np
+from PIL import Image
+from torchvision.io import encode_jpeg
+from torchvision.transforms.functional import resize
+from torchvision.transforms import InterpolationMode
+
+JPEG_QUALITY = 75
+
+
+class ImageBackend(ABC):
+    name = None
+
+    @abstractmethod
+    def resize(self, images: torch.Tensor, size: tuple) -> torch.Tensor:
+        """Resizes a uint8 `(N, C, H, W)` batch to `size` `(height, width)`."""
+
+    @abstractmethod
+    def encode_jpeg(self,
+                    image: torch.Tensor,
+                    quality: int = JPEG_QUALITY) -> bytes:
+        """Encodes a uint8 `(C, H, W)` image."""
+
+
+class TorchvisionBackend(ImageBackend):
+    name = 'torchvision'
+    interpolation = InterpolationMode.BICUBIC
+
+    def resize(self, images, size):
+        return resize(images,
+                      size,
+                      interpolation=self.interpolation,
+                      antialias=True)
+
+    def encode_jpeg(self, image, quality=JPEG_QUALITY):
+        return encode_jpeg(image, quality=quality).numpy().tobytes()
+
+
+class TorchvisionBilinearBackend(TorchvisionBackend):
+    """Cheaper interpolation with a vectorized uint8 kernel in torch."""
+    name = 'torchvision-bilinear'
+    interpolation = InterpolationMode.BILINEAR
+
+
+class PillowBackend(ImageBackend):
+    name = 'pillow'
+
+    @staticmethod
+    def to_pil(image: torch.Tensor) -> Image.Image:
+        array = image.permute(1, 2, 0).numpy()
+        if array.shape[-1] == 1:
+            array = array[..., 0]
+        return Image.fromarray(array)
+
+    def resize(self, images, size):
+        height, width = size
+        resized = [
+            np.asarray(
+                self.to_pil(image).resize((width, height),
+                                          Image.Resampling.BICUBIC))
+            for image in images
+        ]
+        resized = torch.from_numpy(np.stack(resized))
+        if resized.ndim == 3:
+            return resized[:, None]
+        return resized.permute(0, 3, 1, 2)
+
+    def encode_jpeg(self, image, quality=JPEG_QUALITY):
+        buffer = io.BytesIO()
+        self.to_pil(image).save(buffer, format='JPEG', quality=quality)
+        return buffer.getvalue()
+
+
+class OpenCVBackend(ImageBackend):
+    """`cv2.INTER_AREA` when downscaling, `cv2.INTER_CUBIC` when upscaling."""
+    name = 'opencv'
+
+    def __init__(self):
+        import cv2
+        self.cv2 = cv2
+
+    def resize(self, images, size):
+        height, width = size
+        if height * width < images.shape[-2] * images.shape[-1]:
+            interpolation = self.cv2.INTER_AREA
+        else:
+            interpolation = self.cv2.INTER_CUBIC
+        resized = [
+            self.cv2.resize(image.permute(1, 2, 0).numpy(), (width, height),
+                            interpolation=interpolation) for image in images
+        ]
+        resized = torch.from_numpy(np.stack(resized))
+        if resized.ndim == 3:
+            return resized[:, None]
+        return resized.permute(0, 3, 1, 2)
+
+    def encode_jpeg(self, image, quality=JPEG_QUALITY):
+        array = image.permute(1, 2, 0).numpy()
+        if array.shape[-1] == 3:
+            array = self.cv2.cvtColor(array, self.cv2.COLOR_RGB2BGR)
+        ok, encoded = self.cv2.imencode(
+            '.jpg', array, [self.cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError('cv2.imencode failed')
+        return encoded.tobytes()
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (TorchvisionBackend, TorchvisionBilinearBackend,
+                    PillowBackend, OpenCVBackend)
+}
+
+
+def get_backend(name: str) -> ImageBackend:
+    if name not in BACKENDS:
+        raise ValueError(
+            f'unknown image backend {name!r}, choose from {list(BACKENDS)}')
+    return BACKENDS[name]()
+
+
+def psnr(image: torch.Tensor, reference: torch.Tensor) -> float:
+    mse = torch.mean((image.double() - reference.double())**2).item()
+    return float('inf') if mse == 0 else 10 * np.log10(255**2 / mse)
+
+
+def ssim(image: torch.Tensor, reference: torch.Tensor) -> float:
+    """Mean SSIM of the luma channel with an 11x11 Gaussian window."""
+    luma = torch.tensor([0.299, 0.587, 0.114], dtype=torch.float64)
+    x = torch.einsum('chw,c->hw', image.double(), luma)[None, None]
+    y = torch.einsum('chw,c->hw', reference.double(), luma)[None, None]
+    gauss = torch.exp(-(torch.arange(11, dtype=torch.float64) - 5)**2 / 4.5)
+    gauss = gauss / gauss.sum()
+    window = torch.outer(gauss, gauss)[None, None]
+
+    def blur(z):
+        return torch.nn.functional.conv2d(z, window)
+
+    mu_x, mu_y = blur(x), blur(y)
+    sigma_x = blur(x * x) - mu_x**2
+    sigma_y = blur(y * y) - mu_y**2
+    sigma_xy = blur(x * y) - mu_x * mu_y
+    c1, c2 = (0.01 * 255)**2, (0.03 * 255)**2
+    numerator = (2 * mu_x * mu_y + c1) * (2 * sigma_xy + c2)
+    denominator = (mu_x**2 + mu_y**2 + c1) * (sigma_x + sigma_y + c2)
+    return (numerator / denominator).mean().item()
+
+
+RESOLUTIONS = {
+    '480p': (480, 854),
+    '720p': (720, 1280),
+    '1080p': (1080, 1920),
+    '4k': (2160, 3840),
+}
+
+
+def benchmark(image_paths: list[str], repeats: int = 5):
+    """Single-threaded resize+encode to the first video `max_pixels` choice."""
+    from infer import get_resized_hw_for_Navit
+
+    torch.set_num_threads(1)
+    backends = []
+    for name in BACKENDS:
+        try:
+            backends.append(get_backend(name))
+        except ImportError as e:
+            print(f'skipping {name}: {e}')
+    for backend in backends:
+        if backend.name == 'opencv':
+            backend.cv2.setNumThreads(1)
+    sources = [Image.open(path).convert('RGB') for path in image_paths]
+
+    print(f"{'source':>6} {'backend':>21} {'frames/s':>9} {'KB':>6} "
+          f"{'PSNR':>6} {'SSIM':>7} {'dPSNR':>6} {'dSSIM':>8}")
+    for label, (height, width) in RESOLUTIONS.items():
+        frames = [
+            torch.from_numpy(
+                np.array(
+                    source.resize((width, height),
+                                  Image.Resampling.LANCZOS))).permute(2, 0, 1)
+            for source in sources
+        ]
+        target = get_resized_hw_for_Navit(height,
+                                          width,
+                                          min_pixels=4 * 28 * 28,
+                                          max_pixels=640 * 28 * 28)
+        references = [
+            resize(frame[None].double(),
+                   target,
+                   interpolation=InterpolationMode.BICUBIC,
+                   antialias=True)[0].clamp(0, 255) for frame in frames
+        ]
+        baseline = None
+        for backend in backends:
+            start = time.perf_counter()
+            for _ in range(repeats):
+                encoded = [
+                    backend.encode_jpeg(
+                        backend.resize(frame[None], target)[0])
+                    for frame in frames
+                ]
+            fps = repeats * len(frames) / (time.perf_counter() - start)
+            decoded = [
+                torch.from_numpy(np.array(Image.open(
+                    io.BytesIO(data)))).permute(2, 0, 1) for data in encoded
+            ]
+            quality = (
+                np.mean([psnr(*pair) for pair in zip(decoded, references)]),
+                np.mean([ssim(*pair) for pair in zip(decoded, references)]),
+            )
+            baseline = baseline or quality
+            size = np.mean([len(data) for data in encoded]) / 1024
+            print(f'{label:>6} {backend.name:>21} {fps:>9.1f} {size:>6.1f} '
+                  f'{quality[0]:>6.2f} {quality[1]:>7.4f} '
+                  f'{quality[0] - baseline[0]:>+6.2f} '
+                  f'{quality[1] - baseline[1]:>+8.4f}')
+
+
+if __name__ == '__main__':
+    benchmark(sys.argv[1:])
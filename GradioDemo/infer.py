@@ -1,17 +1,25 @@
 # Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
 # SPDX-License-Identifier: Apache-2.0
-import json
 import math
 import base64
-import requests
 
 import torch
 import decord
 import numpy as np
 from PIL import Image, ImageSequence
-from torchvision.io import read_image, encode_jpeg
-from torchvision.transforms.functional import resize
-from torchvision.transforms import InterpolationMode
+from torchvision.io import read_image, decode_jpeg
+
+from payload import encode_payload
+from metrics import METRICS
+from cancellation import StreamRegistry
+from resilience import ResilientStream, RetryPolicy
+from token_accounting import TokenLimits, TokenReport, account_inputs
+from token_budget import allocate_budget
+from media_pool import MediaPool
+from prefetch import Prefetcher
+from image_backend import get_backend
+from session_store import SessionStore
+from video_index import VideoIndexStore
 
 
 class ConversationModeI18N:
@@ -88,6 +96,17 @@ class SeedVLInfer:
             'use_timestamp':
             True,
         },
+        token_limits: TokenLimits = None,
+        visual_token_budget: int = None,
+        media_workers: int = 0,
+        media_queue_depth: int = 64,
+        prefetch_workers: int = 0,
+        prefetch_max_bytes: int = 512 * 1024 * 1024,
+        image_backend: str = 'torchvision',
+        retry_policy: RetryPolicy = None,
+        session_store: SessionStore = None,
+        video_index: str = None,
+        video_index_dir: str = None,
     ):
         self.base_url = base_url
         self.api_key = api_key
@@ -104,8 +123,39 @@ class SeedVLInfer:
                 160 * 28 * 28, 128 * 28 * 28
             ])
         self.use_timestamp = video_sampling_strategy.get('use_timestamp', True)
+        # resize and JPEG encode implementation, see image_backend.py
+        self.image_backend = get_backend(image_backend)
+        self.streams = StreamRegistry()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.token_limits = token_limits or TokenLimits()
+        # total visual tokens of one turn, shared by all of its attachments
+        self.visual_token_budget = visual_token_budget
+        # decode/resize/encode in worker processes instead of the caller thread
+        self.media_pool = MediaPool(
+            dict(min_pixels=min_pixels,
+                 max_pixels=max_pixels,
+                 video_sampling_strategy=video_sampling_strategy,
+                 image_backend=image_backend,
+                 video_index='load' if video_index else None,
+                 video_index_dir=video_index_dir),
+            max_workers=media_workers,
+            max_queue_depth=media_queue_depth) if media_workers else None
+        # encodes uploads while the user is still typing
+        self.prefetcher = Prefetcher(
+            self, max_workers=prefetch_workers,
+            max_bytes=prefetch_max_bytes) if prefetch_workers else None
+        # keeps media out of the returned histories, see session_store.py
+        self.session_store = session_store
+        # per-video sidecars, see video_index.py; 'load' uses existing ones,
+        # 'build' also indexes new videos in the background. Off by default:
+        # building decodes every upload in the server process
+        self.video_indexes = None
+        if video_index:
+            self.video_indexes = VideoIndexStore(
+                video_index_dir,
+                build_workers=1 if video_index == 'build' else 0)
 
-    def preprocess_video(self, video_path: str):
+    def open_video(self, video_path: str):
         try:
             video_reader = decord.VideoReader(video_path, num_threads=2)
             fps = video_reader.get_avg_fps()
@@ -115,21 +165,41 @@ class SeedVLInfer:
                 for frame in ImageSequence.Iterator(Image.open(video_path))
             ]
             fps = 1
+        return video_reader, fps
+
+    def load_video_index(self, video_path: str):
+        """The `video_index.VideoIndex` of a video, None if it has none yet."""
+        if self.video_indexes is None:
+            return None
+        return self.video_indexes.get(video_path)
+
+    def plan_frames(self,
+                    n_total_frames: int,
+                    fps: float,
+                    start_time: float = None,
+                    end_time: float = None,
+                    max_video_length: int = None):
+        """Returns the frame indices to sample and the per-frame `max_pixels`."""
+        max_video_length = max_video_length or self.max_video_length
 
-        length = len(video_reader)
+        # restrict sampling to [start_time, end_time]; timestamps stay global
+        first_index = 0 if start_time is None else max(
+            0, math.ceil(start_time * fps))
+        last_index = n_total_frames - 1 if end_time is None else min(
+            n_total_frames - 1, math.floor(end_time * fps))
+        length = max(last_index - first_index + 1, 1)
         n_frames = min(
             max(math.ceil(length / fps * self.sampling_fps),
                 self.min_n_frames), length)
-        frame_indices = np.linspace(0, length - 1,
+        frame_indices = np.linspace(first_index, first_index + length - 1,
                                     n_frames).round().astype(int).tolist()
         max_pixels = self.max_pixels
         for round_idx, max_pixels in enumerate(self.max_pixels_choices):
             is_last_round = round_idx == len(self.max_pixels_choices) - 1
-            if len(frame_indices
-                   ) * max_pixels / 28 / 28 > self.max_video_length:
+            if len(frame_indices) * max_pixels / 28 / 28 > max_video_length:
                 if is_last_round:
-                    max_frame_num = int(self.max_video_length / max_pixels *
-                                        28 * 28)
+                    max_frame_num = int(max_video_length / max_pixels * 28 *
+                                        28)
                     select_ids = np.linspace(
                         0,
                         len(frame_indices) - 1,
@@ -141,6 +211,29 @@ class SeedVLInfer:
                     continue
             else:
                 break
+        return frame_indices, max_pixels
+
+    def preprocess_video(self,
+                         video_path: str,
+                         start_time: float = None,
+                         end_time: float = None,
+                         max_video_length: int = None):
+        index = self.load_video_index(video_path)
+        if index is not None:
+            # planned without opening the video, which is then only opened
+            # to decode the planned frames
+            n_total_frames, fps = len(index), index.fps
+        else:
+            video_reader, fps = self.open_video(video_path)
+            n_total_frames = len(video_reader)
+        frame_indices, max_pixels = self.plan_frames(
+            n_total_frames,
+            fps,
+            start_time=start_time,
+            end_time=end_time,
+            max_video_length=max_video_length)
+        if index is not None:
+            video_reader, _ = self.open_video(video_path)
 
         if hasattr(video_reader, "get_batch"):
             video_clip = torch.from_numpy(
@@ -158,76 +251,184 @@ class SeedVLInfer:
             min_pixels=self.min_pixels,
             max_pixels=max_pixels,
         )
-        resized_video_clip = resize(video_clip,
-                                    (resized_height, resized_width),
-                                    interpolation=InterpolationMode.BICUBIC,
-                                    antialias=True)
+        resized_video_clip = self.image_backend.resize(
+            video_clip, (resized_height, resized_width))
         if self.use_timestamp:
+            # `index.fps` is the same average fps, so a video gets the same
+            # timestamps whether or not its index exists yet
             resized_video_clip = [
                 (round(i / fps, 1), f)
                 for i, f in zip(frame_indices, resized_video_clip)
             ]
         return resized_video_clip
 
-    def preprocess_streaming_frame(self, frame: torch.Tensor):
-        height, width = frame.shape[-2:]
+    def preprocess_image(self, image: torch.Tensor, max_pixels: int):
+        height, width = image.shape[-2:]
         resized_height, resized_width = get_resized_hw_for_Navit(
             height,
             width,
             min_pixels=self.min_pixels,
-            max_pixels=self.max_pixels_choices[0],
+            max_pixels=max_pixels,
         )
-        resized_frame = resize(frame[None], (resized_height, resized_width),
-                               interpolation=InterpolationMode.BICUBIC,
-                               antialias=True)[0]
-        return resized_frame
+        resized_image = self.image_backend.resize(
+            image[None], (resized_height, resized_width))[0]
+        return resized_image
+
+    def preprocess_streaming_frame(self,
+                                   frame: torch.Tensor,
+                                   max_pixels: int = None):
+        if max_pixels is None:
+            max_pixels = self.max_pixels_choices[0]
+        return self.preprocess_image(frame, max_pixels=max_pixels)
 
     def encode_image(self, image: torch.Tensor) -> str:
-        encoded = encode_jpeg(image)
-        return base64.b64encode(encoded.numpy()).decode('utf-8')
+        encoded = self.image_backend.encode_jpeg(image)
+        return base64.b64encode(encoded).decode('utf-8')
 
-    def construct_messages(self,
-                           inputs: dict,
-                           streaming_timestamp: int = None) -> list[dict]:
+    def encode_ingested_frame(self, frame, max_pixels: int = None) -> str:
+        """Returns the data of a `frame_ingest.EncodedFrame`, re-encoded
+        smaller only if a budget's `max_pixels` requires it."""
+        if max_pixels is None or frame.height * frame.width <= max_pixels:
+            return frame.data
+        encoded = torch.frombuffer(bytearray(base64.b64decode(frame.data)),
+                                   dtype=torch.uint8)
+        image = self.preprocess_image(decode_jpeg(encoded), max_pixels)
+        return self.encode_image(image)
+
+    def encode_video(self, video) -> list[tuple]:
+        if not self.use_timestamp:
+            video = [(None, frame) for frame in video]
+        return [(timestamp, self.encode_image(frame))
+                for timestamp, frame in video]
+
+    def encode_attachment(self,
+                          path: str,
+                          streaming: bool = False,
+                          max_video_length: int = None,
+                          max_pixels: int = None,
+                          start_time: float = None,
+                          end_time: float = None) -> list[tuple]:
+        """Decodes, resizes and encodes one attachment.
+
+        Returns `(timestamp, base64 jpeg)` per frame; the timestamp is None for
+        images and for videos when `use_timestamp` is off.
+        """
+        if path.endswith('.mp4'):
+            video = self.preprocess_video(video_path=path,
+                                          start_time=start_time,
+                                          end_time=end_time,
+                                          max_video_length=max_video_length)
+            return self.encode_video(video)
+        image = read_image(path)
+        if streaming:
+            image = self.preprocess_streaming_frame(frame=image,
+                                                    max_pixels=max_pixels)
+        elif max_pixels is not None:
+            image = self.preprocess_image(image, max_pixels=max_pixels)
+        return [(None, self.encode_image(image))]
+
+    def encode_attachments(self,
+                           jobs: list[tuple],
+                           session_id: str = None) -> list[list[tuple]]:
+        """Runs `encode_attachment` for every job, in `media_pool` if configured.
+
+        Jobs that `prefetcher` already encoded for `session_id` are reused.
+        """
+        results = [None] * len(jobs)
+        if self.prefetcher is not None and session_id is not None:
+            results = [self.prefetcher.take(session_id, job) for job in jobs]
+        missing = [i for i, frames in enumerate(results) if frames is None]
+        missing_jobs = [jobs[i] for i in missing]
+        if self.media_pool is None:
+            encoded = [self.encode_attachment(*job) for job in missing_jobs]
+        else:
+            encoded = self.media_pool.map(missing_jobs)
+        for i, frames in zip(missing, encoded):
+            results[i] = frames
+        return results
+
+    def frames_content(self, frames: list[tuple]) -> list[dict]:
         content = []
+        for timestamp, encoded in frames:
+            if timestamp is not None:
+                content.append({
+                    "type": "text",
+                    "text": f'[{timestamp} second]',
+                })
+            content.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{encoded}",
+                    "detail": "high"
+                },
+            })
+        return content
+
+    def construct_video_content(self, video) -> list[dict]:
+        return self.frames_content(self.encode_video(video))
+
+    def attachment_jobs(self,
+                        inputs: dict,
+                        streaming_timestamp: int = None,
+                        max_video_length: int = None,
+                        budgets: dict = None) -> tuple[list, list]:
+        """Plans the `encode_attachment` arguments of every file in `inputs`.
+
+        Videos are sampled between the optional `start_time` and `end_time`
+        of `inputs`. Also returns the streaming timestamp in effect for each
+        file.
+        """
+        budgets = budgets or {}
+        start_time, end_time = inputs.get('start_time'), inputs.get('end_time')
+        jobs, timestamps = [], []
         for i, path in enumerate(inputs.get('files', [])):
+            budget = budgets.get(path)
             if path.endswith('.mp4'):
-                video = self.preprocess_video(video_path=path)
-                for frame in video:
-                    if self.use_timestamp:
-                        timestamp, frame = frame
-                        content.append({
-                            "type": "text",
-                            "text": f'[{timestamp} second]',
-                        })
-                    content.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url":
-                            f"data:image/jpeg;base64,{self.encode_image(frame)}",
-                            "detail": "high"
-                        },
-                    })
+                if budget is not None and budget.max_video_length is not None:
+                    video_length = budget.max_video_length
+                else:
+                    video_length = max_video_length
+                jobs.append(
+                    (path, False, video_length, None, start_time, end_time))
             else:
-                image = read_image(path)
+                max_pixels = budget.max_pixels if budget is not None else None
                 if path.endswith('.webp'):
                     streaming_timestamp = i
-                if streaming_timestamp is not None:
-                    image = self.preprocess_streaming_frame(frame=image)
-                content.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url":
-                        f"data:image/jpeg;base64,{self.encode_image(image)}",
-                        "detail": "high"
-                    },
+                streaming = streaming_timestamp is not None
+                jobs.append((path, streaming, None, max_pixels))
+            timestamps.append(streaming_timestamp)
+        return jobs, timestamps
+
+    def construct_messages(self,
+                           inputs: dict,
+                           streaming_timestamp: int = None,
+                           max_video_length: int = None,
+                           budgets: dict = None,
+                           session_id: str = None) -> list[dict]:
+        jobs, timestamps = self.attachment_jobs(inputs, streaming_timestamp,
+                                                max_video_length, budgets)
+        if timestamps:
+            streaming_timestamp = timestamps[-1]
+        content = []
+        encoded = self.encode_attachments(jobs, session_id)
+        for job, timestamp, frames in zip(jobs, timestamps, encoded):
+            content.extend(self.frames_content(frames))
+            if job[1]:
+                content.insert(0, {
+                    "type": "text",
+                    "text": f'[{timestamp} second]',
                 })
-                if streaming_timestamp is not None:
-                    content.insert(
-                        0, {
-                            "type": "text",
-                            "text": f'[{streaming_timestamp} second]',
-                        })
+        # webcam frames from `frame_ingest`, encoded when they arrived
+        frames = inputs.get('frames', [])
+        budgets = budgets or {}
+        for frame in frames:
+            budget = budgets.get(frame.name)
+            max_pixels = budget.max_pixels if budget is not None else None
+            content.extend(
+                self.frames_content([
+                    (frame.timestamp,
+                     self.encode_ingested_frame(frame, max_pixels))
+                ]))
         query = inputs.get('text', '')
         if query:
             content.append({
@@ -246,10 +447,41 @@ class SeedVLInfer:
                 })
         return messages
 
+    def account(self,
+                inputs: dict,
+                streaming_timestamp: int = None,
+                max_video_length: int = None) -> TokenReport:
+        """Counts the visual tokens of `inputs` and enforces `token_limits`.
+
+        If the turn exceeds `visual_token_budget`, the budget is split across
+        its attachments first; pass `report.budgets` on to `construct_messages`.
+        """
+        report = account_inputs(self,
+                                inputs,
+                                streaming_timestamp=streaming_timestamp,
+                                max_video_length=max_video_length)
+        if self.visual_token_budget is not None and report.total > self.visual_token_budget:
+            budgets = allocate_budget(self, report, self.visual_token_budget)
+            report = account_inputs(self,
+                                    inputs,
+                                    streaming_timestamp=streaming_timestamp,
+                                    max_video_length=max_video_length,
+                                    budgets=budgets)
+        self.token_limits.enforce(report)
+        return report
+
     def request(self,
                 messages,
                 thinking: bool = True,
-                temperature: float = 1.0):
+                temperature: float = 1.0,
+                session_id: str = None,
+                metadata: dict = None,
+                generation: int = None):
+        """Streams `(content, reasoning)` so far.
+
+        `generation`, from `streams.generation(session_id)` when the turn
+        began, makes a `cancel` since then stop the request.
+        """
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -263,46 +495,83 @@ class SeedVLInfer:
             },
             "temperature": temperature,
         }
-        for _ in range(3):
-            try:
-                requested = requests.post(self.base_url,
-                                          headers=headers,
-                                          json=payload,
-                                          stream=True)
-                break
-            except Exception as e:
-                print(e)
+        resolve = None
+        if self.session_store is not None:
+            resolve = self.session_store.resolve
+        body = encode_payload(payload, resolve)
+        if metadata is not None:
+            # sent with the request so the upstream, or a proxy in front of
+            # it, can log and check the estimate against its own count
+            headers['X-Visual-Tokens'] = str(metadata['visual_tokens'])
+            METRICS.histogram('request_visual_tokens').observe(
+                metadata['visual_tokens'])
+        METRICS.histogram('request_body_bytes').observe(len(body))
         content, reasoning_content = '', ''
-        for line in requested.iter_lines():
-            if not line:
-                continue
-            if line.startswith(b'data:'):
-                data = line[len("data: "):]
-                if data == b"[DONE]":
-                    break
-                delta = json.loads(data)['choices'][0]['delta']
+        current_attempt = 0
+        deltas = iter(
+            ResilientStream(self.base_url, headers, body, self.retry_policy,
+                            self.streams, session_id, generation))
+        try:
+            for attempt, delta in deltas:
+                if attempt != current_attempt:
+                    # a failed stream was restarted from scratch
+                    content, reasoning_content = '', ''
+                    current_attempt = attempt
                 content += delta['content']
                 reasoning_content += delta.get('reasoning_content', '')
                 yield content, reasoning_content
+        finally:
+            deltas.close()
+
+    def cancel(self, session_id: str) -> int:
+        """Stops the current turn of a session, e.g. on stop or clear."""
+        return self.streams.cancel(session_id)
 
     def __call__(self,
                  inputs: dict,
                  history: list[dict] = [],
                  mode: str = ConversationModeI18N.D,
-                 temperature: float = 1.0):
-        messages = self.construct_messages(inputs=inputs)
-        updated_history = history + messages
-        for response, reasoning in self.request(
-                messages=updated_history,
-                thinking=mode == ConversationModeI18N.D,
-                temperature=temperature):
-            if mode == ConversationModeI18N.D:
-                response = '<think>' + reasoning + '</think>' + response
-            yield response, updated_history + [{
-                'role':
-                'assistant',
-                'content': [{
-                    'type': 'text',
-                    'text': response
+                 temperature: float = 1.0,
+                 session_id: str = None,
+                 max_video_length: int = None,
+                 history_id: str = None,
+                 report: TokenReport = None):
+        """Streams `(response, history)`.
+
+        With a `session_store`, the returned history references its media;
+        `history_id`, `session_id` by default, owns those references.
+        `report` is the `account` result for these inputs and
+        `max_video_length` if the caller already has it.
+        """
+        generation = self.streams.generation(session_id)
+        if report is None:
+            # fails fast on oversized requests, before decoding or uploading
+            report = self.account(inputs, max_video_length=max_video_length)
+        messages = self.construct_messages(inputs=inputs,
+                                           max_video_length=max_video_length,
+                                           budgets=report.budgets,
+                                           session_id=session_id)
+        stored_history = updated_history = history + messages
+        if self.session_store is not None:
+            stored_history = history + self.session_store.dehydrate(
+                history_id or session_id, messages)
+        stream = self.request(messages=updated_history,
+                              thinking=mode == ConversationModeI18N.D,
+                              temperature=temperature,
+                              session_id=session_id,
+                              metadata=report.as_metadata(),
+                              generation=generation)
+        try:
+            for response, reasoning in stream:
+                if mode == ConversationModeI18N.D:
+                    response = '<think>' + reasoning + '</think>' + response
+                yield response, stored_history + [{
+                    'role':
+                    'assistant',
+                    'content': [{
+                        'type': 'text',
+                        'text': response
+                    }]
                 }]
-            }]
+        finally:
+            stream.close()
@@ -0,0 +1,289 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+import re
+import math
+from contextlib import nullcontext
+from dataclasses import dataclass
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from infer import SeedVLInfer, ConversationModeI18N
+from admission import AdmissionController, RequestCost, Ticket, estimate_cost
+from token_accounting import TokenReport
+
+SPAN_PATTERN = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(?:s|sec|second|seconds|秒)?\s*(?:-|–|~|to|至|到)\s*(\d+(?:\.\d+)?)\s*(?:s|sec|second|seconds|秒)"
+)
+
+REDUCE_PROMPT = """A video of {duration:.1f} seconds was split into overlapping segments, and the question below was answered for each segment separately. All timestamps are in seconds on the timeline of the whole video.
+
+## Question
+{question}
+
+## Segment answers
+{segment_answers}
+
+## Time spans found in the segment answers
+{spans}
+
+## Task
+Merge the segment answers into a single answer to the question for the whole video. Segments overlap, so an event reported by two neighbouring segments is the same event: report it once, spanning from its earliest start to its latest end. The time spans above are those of all segment answers with overlapping ones already joined; use them for the boundaries of such events. Keep timestamps on the global timeline and answer in the language of the question."""
+
+
+@dataclass
+class VideoSegment:
+    start_time: float
+    end_time: float
+    answer: str = ''
+    reasoning: str = ''
+
+    @property
+    def spans(self) -> list[tuple[float, float]]:
+        return extract_spans(self.answer)
+
+
+def plan_segments(duration: float, segment_seconds: float,
+                  overlap_seconds: float) -> list[VideoSegment]:
+    """Splits [0, duration] into segments of `segment_seconds` overlapping by `overlap_seconds`."""
+    if overlap_seconds >= segment_seconds:
+        raise ValueError(
+            f"overlap_seconds must be smaller than segment_seconds, got {overlap_seconds} >= {segment_seconds}"
+        )
+    step = segment_seconds - overlap_seconds
+    n_segments = max(1, math.ceil((duration - overlap_seconds) / step))
+    return [
+        VideoSegment(start_time=i * step,
+                     end_time=min(i * step + segment_seconds, duration))
+        for i in range(n_segments)
+    ]
+
+
+def extract_spans(text: str) -> list[tuple[float, float]]:
+    """Finds `start - end second` style spans in a response and unions overlapping ones."""
+    return merge_spans((float(start), float(end))
+                       for start, end in SPAN_PATTERN.findall(text)
+                       if float(start) <= float(end))
+
+
+def merge_spans(spans) -> list[tuple[float, float]]:
+    """Sorts spans and unions the overlapping ones."""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class LongVideoInfer:
+    """Map-reduce inference for videos longer than one request's token budget.
+
+    Every segment is sent as a separate request, at most `max_workers` at a
+    time. A final text-only request merges the segment answers on the global
+    timeline, so latency grows with `len(segments) / max_workers` rather than
+    with video length.
+
+    Segments go through the same path as any other request: `token_limits`
+    and `visual_token_budget` apply to each of them, frames are encoded by
+    `encode_attachments`, and with an `admission` controller every segment
+    and the reduce request are admitted on their own estimated cost, so a
+    downgrade re-plans the segment with the smaller `max_video_length`.
+    """
+
+    def __init__(self,
+                 infer: SeedVLInfer,
+                 segment_seconds: float = 300,
+                 overlap_seconds: float = 10,
+                 max_workers: int = 8,
+                 segment_max_video_length: int = None,
+                 admission: AdmissionController = None):
+        self.infer = infer
+        self.segment_seconds = segment_seconds
+        self.overlap_seconds = overlap_seconds
+        self.max_workers = max_workers
+        self.segment_max_video_length = segment_max_video_length or infer.max_video_length
+        self.admission = admission
+
+    def admit(self, session_id: str, cost: RequestCost, inputs: dict):
+        if self.admission is None:
+            return nullcontext(Ticket(session_id, cost))
+        return self.admission.admit(session_id, cost, self.infer, inputs)
+
+    def complete(self,
+                 inputs: dict,
+                 thinking: bool,
+                 temperature: float,
+                 session_id: str = None,
+                 generation: int = None,
+                 max_video_length: int = None) -> tuple[str, str]:
+        """Returns the response and reasoning of one admitted request."""
+        cost = estimate_cost(self.infer, inputs, thinking, max_video_length)
+        content, reasoning = '', ''
+        with self.admit(session_id, cost, inputs) as ticket:
+            cost = ticket.cost
+            if self.infer.streams.cancelled(session_id, generation):
+                return content, reasoning
+            messages = self.infer.construct_messages(
+                inputs,
+                max_video_length=cost.max_video_length,
+                budgets=cost.report.budgets)
+            for content, reasoning in self.infer.request(
+                    messages=messages,
+                    thinking=cost.thinking,
+                    temperature=temperature,
+                    session_id=session_id,
+                    metadata=cost.report.as_metadata(),
+                    generation=generation):
+                pass
+        return content, reasoning
+
+    def map_segment(self,
+                    video_path: str,
+                    segment: VideoSegment,
+                    question: str,
+                    thinking: bool,
+                    temperature: float,
+                    session_id: str = None,
+                    generation: int = None) -> VideoSegment:
+        # segments still queued in the executor are skipped after a cancel
+        if self.infer.streams.cancelled(session_id, generation):
+            return segment
+        inputs = {
+            'files': [video_path],
+            'text': question,
+            'start_time': segment.start_time,
+            'end_time': segment.end_time,
+        }
+        segment.answer, segment.reasoning = self.complete(
+            inputs, thinking, temperature, session_id, generation,
+            self.segment_max_video_length)
+        return segment
+
+    def reduce_inputs(self, question: str, duration: float,
+                      segments: list[VideoSegment]) -> dict:
+        segment_answers = '\n\n'.join(
+            f'[{segment.start_time:.1f} second - {segment.end_time:.1f} second]\n{segment.answer}'
+            for segment in segments)
+        # timestamps are global already; spans that neighbouring segments
+        # both report are joined here rather than left to the model
+        spans = merge_spans(span for segment in segments
+                            for span in segment.spans)
+        spans = '\n'.join(f'- {start:g} - {end:g} second'
+                          for start, end in spans) or 'None'
+        return {
+            'text':
+            REDUCE_PROMPT.format(duration=duration,
+                                 question=question,
+                                 segment_answers=segment_answers,
+                                 spans=spans)
+        }
+
+    def duration(self, video_path: str, report: TokenReport = None) -> float:
+        """Taken from `report` or the video index if either has it."""
+        if report is not None:
+            for attachment in report.attachments:
+                if attachment.path == video_path:
+                    return attachment.duration
+        index = self.infer.load_video_index(video_path)
+        if index is not None:
+            return len(index) / index.fps
+        video_reader, fps = self.infer.open_video(video_path)
+        return len(video_reader) / fps
+
+    def accepts(self,
+                inputs: dict,
+                history: list[dict],
+                report: TokenReport = None) -> bool:
+        """Whether `inputs` start a chat on one video too long for a single
+        request; `report` is their `account` result if the caller has it."""
+        files = inputs.get('files', [])
+        return not history and len(files) == 1 and files[0].endswith(
+            '.mp4') and self.duration(files[0], report) > self.segment_seconds
+
+    def chat(self,
+             inputs: dict,
+             history: list[dict],
+             mode: str = ConversationModeI18N.G,
+             temperature: float = 1.0,
+             session_id: str = None,
+             report: TokenReport = None):
+        """Streams `(response, history)` like `SeedVLInfer.__call__`.
+
+        The history keeps the question and the merged answer as text, so
+        follow-up questions are answered from them and no media is stored.
+        """
+        question = inputs.get('text', '')
+        video_path = inputs['files'][0]
+        duration = self.duration(video_path, report)
+        for response, segments in self(video_path, question, mode, temperature,
+                                       session_id, duration):
+            text = f'[a {duration:.0f} second video]\n{question}'
+            user = {
+                'role': 'user',
+                'content': [{
+                    'type': 'text',
+                    'text': text
+                }]
+            }
+            assistant = {
+                'role': 'assistant',
+                'content': [{
+                    'type': 'text',
+                    'text': response
+                }]
+            }
+            yield response, history + [user, assistant]
+
+    def __call__(self,
+                 video_path: str,
+                 question: str,
+                 mode: str = ConversationModeI18N.G,
+                 temperature: float = 1.0,
+                 session_id: str = None,
+                 duration: float = None):
+        """Yields (response, segments); the response streams from the reduce
+        request. Nothing is yielded once the session is cancelled."""
+        generation = self.infer.streams.generation(session_id)
+        if duration is None:
+            duration = self.duration(video_path)
+        segments = plan_segments(duration, self.segment_seconds,
+                                 self.overlap_seconds)
+        thinking = mode == ConversationModeI18N.D
+        max_workers = self.max_workers
+        if self.admission is not None:
+            # more would only wait in the admission queue, and time out there
+            max_workers = min(max_workers,
+                              self.admission.max_inflight_per_session)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            map_segment = partial(self.map_segment,
+                                  video_path,
+                                  question=question,
+                                  thinking=thinking,
+                                  temperature=temperature,
+                                  session_id=session_id,
+                                  generation=generation)
+            segments = list(executor.map(map_segment, segments))
+        if self.infer.streams.cancelled(session_id, generation):
+            return
+        if len(segments) == 1:
+            # formatted like the reduce response below
+            response = segments[0].answer
+            if thinking:
+                response = f'<think>{segments[0].reasoning}</think>{response}'
+            yield response, segments
+            return
+        inputs = self.reduce_inputs(question, duration, segments)
+        cost = estimate_cost(self.infer, inputs, thinking)
+        with self.admit(session_id, cost, inputs) as ticket:
+            for response, reasoning in self.infer.request(
+                    messages=self.infer.construct_messages(inputs),
+                    thinking=ticket.cost.thinking,
+                    temperature=temperature,
+                    session_id=session_id,
+                    generation=generation):
+                # a downgraded reduce request has no reasoning, but keeps
+                # the format of the requested mode
+                if thinking:
+                    response = '<think>' + reasoning + '</think>' + response
+                yield response, segments
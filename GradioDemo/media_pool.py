@@ -0,0 +1,213 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""Process pool for media preprocessing.
+
+Decoding, resizing and JPEG/base64 encoding run in worker processes so the
+Gradio threads that stream tokens are not starved of the GIL. Encoded frames
+come back through shared memory instead of being pickled through the pool's
+result pipe.
+
+Example:
+    python media_pool.py --video /path/to/video.mp4 --workers 2
+runs a load test: token streams from a local mock server are timed while
+video uploads are preprocessed, in-thread and then in the pool.
+"""
+import time
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+
+from metrics import METRICS
+
+_worker_infer = None
+
+
+def _init_worker(config: dict):
+    global _worker_infer
+    import torch
+    from infer import SeedVLInfer
+
+    # workers already run in parallel; intra-op threads would oversubscribe
+    torch.set_num_threads(1)
+    _worker_infer = SeedVLInfer(api_key=None, **config)
+
+
+def _encode_attachment(job: tuple) -> tuple[str, list[tuple]]:
+    """Encodes one attachment and writes the base64 frames to shared memory.
+
+    Returns the segment name and `(timestamp, length)` per frame. The parent
+    process unlinks the segment after reading it.
+    """
+    frames = [(timestamp, encoded.encode('ascii'))
+              for timestamp, encoded in _worker_infer.encode_attachment(*job)]
+    shm = SharedMemory(create=True,
+                       size=max(sum(len(data) for _, data in frames), 1))
+    offset = 0
+    for _, data in frames:
+        shm.buf[offset:offset + len(data)] = data
+        offset += len(data)
+    shm.close()
+    return shm.name, [(timestamp, len(data)) for timestamp, data in frames]
+
+
+def _read_frames(name: str, layout: list[tuple]) -> list[tuple]:
+    shm = SharedMemory(name=name)
+    try:
+        frames, offset = [], 0
+        for timestamp, length in layout:
+            frames.append(
+                (timestamp,
+                 bytes(shm.buf[offset:offset + length]).decode('ascii')))
+            offset += length
+        return frames
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class MediaPool:
+    """Runs `SeedVLInfer.encode_attachment` jobs in worker processes.
+
+    Workers are spawned, not forked, because the server is multi-threaded by
+    the time the first upload arrives. At most `max_queue_depth` jobs may be
+    pending; further submissions block until one finishes.
+    """
+
+    def __init__(self,
+                 config: dict,
+                 max_workers: int = 4,
+                 max_queue_depth: int = 64):
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(config, ))
+        self._slots = threading.BoundedSemaphore(max_queue_depth)
+
+    def _release(self, future):
+        self._slots.release()
+        METRICS.gauge('media_pool_pending').dec()
+
+    def submit(self, job: tuple):
+        self._slots.acquire()
+        METRICS.gauge('media_pool_pending').inc()
+        future = self._executor.submit(_encode_attachment, job)
+        future.add_done_callback(self._release)
+        return future
+
+    def map(self, jobs: list[tuple]) -> list[list[tuple]]:
+        """Encodes all attachments concurrently; results keep the job order."""
+        start = time.perf_counter()
+        futures = [self.submit(job) for job in jobs]
+        wait(futures)
+        # every finished job's segment is read, and so unlinked, even if
+        # another job failed
+        results, error = [], None
+        for future in futures:
+            try:
+                results.append(_read_frames(*future.result()))
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
+        METRICS.histogram('media_preprocess_seconds').observe(
+            time.perf_counter() - start)
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(cancel_futures=True)
+
+
+def load_test(video_path: str,
+              workers: int,
+              n_streams: int = 4,
+              n_uploaders: int = 2,
+              n_tokens: int = 500,
+              token_interval: float = 0.01):
+    import numpy as np
+    from infer import SeedVLInfer
+    from mock_server import MockChatServer
+
+    sent = {}
+
+    class TimedServer(MockChatServer):
+
+        def stream(self, handler, payload):
+            self.begin_stream(handler)
+            times = sent[payload['messages'][0]['content']] = []
+            for i in range(self.n_tokens):
+                times.append(time.perf_counter())
+                self.write_token(handler, i)
+                time.sleep(self.token_interval)
+            self.end_stream(handler)
+
+    server = TimedServer(n_tokens=n_tokens,
+                         token_interval=token_interval).start()
+    infer = SeedVLInfer(api_key='mock',
+                        base_url=server.base_url,
+                        media_workers=workers)
+    inputs = {'files': [video_path]}
+    # start the workers before timing anything
+    infer.construct_messages(inputs)
+
+    delays, uploads = [], []
+    streaming = threading.Event()
+    streaming.set()
+
+    def stream(name: str):
+        messages = [{'role': 'user', 'content': name}]
+        for content, _ in infer.request(messages):
+            # time from the server writing a token to the client seeing it
+            index = int(content.split()[-1][len('token'):])
+            delays.append(time.perf_counter() - sent[name][index])
+
+    def upload():
+        while streaming.is_set():
+            start = time.perf_counter()
+            infer.construct_messages(inputs)
+            uploads.append(time.perf_counter() - start)
+
+    streams = [
+        threading.Thread(target=stream, args=(f'stream{i}', ))
+        for i in range(n_streams)
+    ]
+    uploaders = [threading.Thread(target=upload) for _ in range(n_uploaders)]
+    for thread in uploaders + streams:
+        thread.start()
+    for thread in streams:
+        thread.join()
+    streaming.clear()
+    for thread in uploaders:
+        thread.join()
+    server.stop()
+    if infer.media_pool is not None:
+        infer.media_pool.shutdown()
+
+    delays = np.array(delays) * 1000
+    if not n_uploaders:
+        mode = 'no uploads'
+    else:
+        mode = f'{workers} workers' if workers else 'in-thread'
+    print(f'{mode}: token delay p50 {np.percentile(delays, 50):.1f} ms, '
+          f'p99 {np.percentile(delays, 99):.1f} ms, '
+          f'max {delays.max():.1f} ms; {len(uploads)} uploads' +
+          (f', {np.mean(uploads):.2f} s each' if uploads else ''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--video', required=True)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--streams', type=int, default=4)
+    parser.add_argument('--uploaders', type=int, default=2)
+    args = parser.parse_args()
+    load_test(args.video, 0, n_streams=args.streams, n_uploaders=0)
+    for workers in (0, args.workers):
+        load_test(args.video,
+                  workers,
+                  n_streams=args.streams,
+                  n_uploaders=args.uploaders)
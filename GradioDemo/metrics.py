@@ -0,0 +1,94 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class Counter:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self._lock:
+            self.value -= amount
+
+
+class Histogram:
+    """Keeps the most recent `window` observations for percentile queries."""
+
+    def __init__(self, window: int = 10000):
+        self._lock = threading.Lock()
+        self._values = deque(maxlen=window)
+        self.count = 0
+
+    def observe(self, value: float):
+        with self._lock:
+            self._values.append(value)
+            self.count += 1
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            values = list(self._values)
+        return float(np.percentile(values, q)) if values else 0.0
+
+    @property
+    def value(self) -> dict:
+        return {
+            "count": self.count,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    """Process-wide named metrics, created on first use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get(self, name: str, metric_type):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_type()
+            return self._metrics[name]
+
+    def counter(self, name: str) -> Counter:
+        return self._get(name, Counter)
+
+    def gauge(self, name: str) -> Gauge:
+        return self._get(name, Gauge)
+
+    def histogram(self, name: str) -> Histogram:
+        return self._get(name, Histogram)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {name: metric.value for name, metric in sorted(metrics.items())}
+
+
+METRICS = MetricsRegistry()
@@ -0,0 +1,318 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""Local stand-in for the streaming chat completions endpoint.
+
+Example:
+    python mock_server.py
+runs the cancellation checks: a stream is started, cancelled from another
+thread, and the time until the server sees the disconnect is reported; a
+request waiting to retry is cancelled and must not reconnect.
+It then runs the resilience checks against `FaultInjectingServer`: error
+statuses, stalls before and during the stream, dropped connections and a
+hedged slow first token.
+"""
+import json
+import time
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockChatServer:
+    """Streams `n_tokens` deltas, one every `token_interval` seconds.
+
+    `active_streams` counts responses still being written and
+    `disconnects` records when the server noticed a client going away.
+    """
+
+    def __init__(self,
+                 n_tokens: int = 100,
+                 token_interval: float = 0.05,
+                 host: str = '127.0.0.1',
+                 port: int = 0):
+        self.n_tokens = n_tokens
+        self.token_interval = token_interval
+        self.active_streams = 0
+        self.disconnects = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        host, port = self.server.server_address[:2]
+        self.base_url = f'http://{host}:{port}/api/v3/chat/completions'
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def begin_stream(handler):
+        # chunked like the real endpoint, so clients see every event as soon
+        # as it is written
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+
+    @staticmethod
+    def write_event(handler, data: bytes):
+        event = b'data: ' + data + b'\n\n'
+        handler.wfile.write(b'%x\r\n%s\r\n' % (len(event), event))
+        handler.wfile.flush()
+
+    def write_token(self, handler, i: int):
+        chunk = {'choices': [{'delta': {'content': f'token{i} '}}]}
+        self.write_event(handler, json.dumps(chunk).encode())
+
+    def end_stream(self, handler):
+        self.write_event(handler, b'[DONE]')
+        handler.wfile.write(b'0\r\n\r\n')
+
+    def stream(self, handler, payload: dict):
+        self.begin_stream(handler)
+        for i in range(self.n_tokens):
+            self.write_token(handler, i)
+            time.sleep(self.token_interval)
+        self.end_stream(handler)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length))
+                with server._lock:
+                    server.active_streams += 1
+                try:
+                    server.stream(self, payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    with server._lock:
+                        server.disconnects.append(time.perf_counter())
+                finally:
+                    with server._lock:
+                        server.active_streams -= 1
+
+        return Handler
+
+
+class FaultInjectingServer(MockChatServer):
+    """Applies one queued fault per request, then behaves like the mock.
+
+    Faults are `(kind, arg)` tuples:
+        ('status', code): reply with an error status and no stream
+        ('stall_first', seconds): send headers, then wait before any token
+        ('stall_mid', (n_tokens, seconds)): wait after `n_tokens` tokens
+        ('drop_mid', n_tokens): close the connection after `n_tokens` tokens
+    `None` serves the request normally.
+    """
+
+    def __init__(self, faults=(), **kwargs):
+        super().__init__(**kwargs)
+        self.faults = deque(faults)
+        self.n_requests = 0
+
+    def stream(self, handler, payload: dict):
+        with self._lock:
+            self.n_requests += 1
+            fault = self.faults.popleft() if self.faults else None
+        if fault is None:
+            return super().stream(handler, payload)
+        kind, arg = fault
+        if kind == 'status':
+            body = json.dumps({'error': {'message': 'injected'}}).encode()
+            handler.send_response(arg)
+            handler.send_header('Content-Type', 'application/json')
+            handler.send_header('Content-Length', str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+            return
+        self.begin_stream(handler)
+        if kind == 'stall_first':
+            time.sleep(arg)
+        n_tokens = arg[0] if kind == 'stall_mid' else arg
+        for i in range(self.n_tokens):
+            if kind in ('stall_mid', 'drop_mid') and i == n_tokens:
+                if kind == 'drop_mid':
+                    # no terminating chunk: the client sees a truncated body
+                    handler.close_connection = True
+                    return
+                time.sleep(arg[1])
+            self.write_token(handler, i)
+            time.sleep(self.token_interval)
+        self.end_stream(handler)
+
+
+def check_resilience():
+    """Runs each fault scenario and fails unless its outcome, request count,
+    duration and counters are the expected ones."""
+    from infer import SeedVLInfer
+    from metrics import METRICS
+    from resilience import RetryPolicy, UpstreamError
+
+    server = FaultInjectingServer(n_tokens=20, token_interval=0.005).start()
+    policy = RetryPolicy(backoff_base=0.05,
+                         connect_timeout=1,
+                         first_token_timeout=0.5,
+                         idle_timeout=0.3,
+                         deadline=10)
+    hedged = RetryPolicy(backoff_base=0.05,
+                         first_token_timeout=2,
+                         hedge_after=0.2)
+    counters = ('request_retries', 'request_timeouts', 'request_hedged',
+                'request_hedge_wins', 'request_failures')
+    # name, policy, faults, expected outcome ('ok' or the start of the error
+    # message), requests sent, upper bound on seconds, counter increments
+    scenarios = [
+        ('503 twice, then ok', policy, [('status', 503)] * 2, 'ok', 3, 1.0, {
+            'request_retries': 2
+        }),
+        ('400, not retried', policy, [('status', 400)],
+         'upstream returned 400', 1, 0.5, {
+             'request_failures': 1
+         }),
+        ('503 on every attempt', policy, [('status', 503)] * 3,
+         'giving up after 3 attempts', 3, 1.0, {
+             'request_retries': 2,
+             'request_failures': 1
+         }),
+        ('stall before first token', policy, [('stall_first', 2)], 'ok', 2,
+         1.5, {
+             'request_retries': 1,
+             'request_timeouts': 1
+         }),
+        ('stall mid-stream', policy, [('stall_mid', (5, 2))], 'ok', 2, 1.5, {
+            'request_retries': 1
+        }),
+        ('connection dropped mid-stream', policy, [('drop_mid', 5)], 'ok', 2,
+         1.0, {
+             'request_retries': 1
+         }),
+        ('slow first token, hedged', hedged, [('stall_first', 1)], 'ok', 2,
+         0.9, {
+             'request_hedged': 1,
+             'request_hedge_wins': 1
+         }),
+    ]
+    tokens = [f'token{i}' for i in range(server.n_tokens)]
+    for (name, retry_policy, faults, expected, n_requests, max_seconds,
+         increments) in scenarios:
+        server.faults = deque(faults)
+        server.n_requests = 0
+        infer = SeedVLInfer(api_key='mock',
+                            base_url=server.base_url,
+                            retry_policy=retry_policy)
+        messages = [{'role': 'user', 'content': 'hi'}]
+        before = {name: METRICS.counter(name).value for name in counters}
+        start = time.perf_counter()
+        content = ''
+        try:
+            for content, _ in infer.request(messages):
+                pass
+            outcome = 'ok'
+            description = f'ok, {len(content.split())} tokens'
+        except UpstreamError as e:
+            outcome = description = str(e)
+        elapsed = time.perf_counter() - start
+        print(f'{name:>30}: {description[:60]} after {server.n_requests} '
+              f'requests, {elapsed:.2f} s')
+        assert outcome.startswith(expected), f'{name}: {outcome}'
+        if outcome == 'ok':
+            # a restarted stream replaces, never extends, the partial text
+            assert content.split() == tokens, f'{name}: {content!r}'
+        assert server.n_requests == n_requests, (
+            f'{name}: {server.n_requests} requests, expected {n_requests}')
+        assert elapsed < max_seconds, f'{name}: took {elapsed:.2f} s'
+        for counter in counters:
+            delta = METRICS.counter(counter).value - before[counter]
+            expected_delta = increments.get(counter, 0)
+            assert delta == expected_delta, f'{name}: {counter} grew by {delta}'
+    for metric in ('request_first_token_seconds', 'request_seconds'):
+        value = METRICS.histogram(metric).value
+        print(f"{metric}: p50 {value['p50']:.3f} s, p99 {value['p99']:.3f} s")
+    server.stop()
+
+
+def check_cancellation(max_disconnect_seconds: float = 0.25):
+    """Cancels a stream mid-way; fails unless the upstream connection is
+    closed within `max_disconnect_seconds` and counted once as cancelled."""
+    from infer import SeedVLInfer
+    from metrics import METRICS
+
+    server = MockChatServer(n_tokens=1000, token_interval=0.01).start()
+    infer = SeedVLInfer(api_key='mock', base_url=server.base_url)
+    cancelled_before = METRICS.counter('requests_cancelled').value
+
+    def consume():
+        messages = [{'role': 'user', 'content': 'hi'}]
+        for _ in infer.request(messages, session_id='session'):
+            pass
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    time.sleep(0.5)
+    cancelled_at = time.perf_counter()
+    infer.cancel('session')
+    consumer.join(timeout=5)
+    deadline = time.time() + 5
+    while server.active_streams and time.time() < deadline:
+        time.sleep(0.01)
+    server.stop()
+    cancelled = METRICS.counter('requests_cancelled').value - cancelled_before
+    print(f'consumer finished: {not consumer.is_alive()}')
+    print(f'upstream streams still open: {server.active_streams}')
+    print(f'requests_cancelled: {cancelled}')
+    assert not consumer.is_alive(), 'the consumer is still reading'
+    assert server.active_streams == 0, 'the upstream stream is still open'
+    assert server.disconnects, 'the server never saw the client disconnect'
+    latency = server.disconnects[0] - cancelled_at
+    print(f'server saw disconnect after {latency * 1000:.1f} ms')
+    assert latency < max_disconnect_seconds, (
+        f'disconnect took {latency:.3f} s, limit {max_disconnect_seconds} s')
+    assert cancelled == 1, f'requests_cancelled grew by {cancelled}, expected 1'
+    check_cancelled_backoff(max_disconnect_seconds)
+
+
+def check_cancelled_backoff(max_seconds: float):
+    """Cancels a request while it waits to retry a 503; fails unless it
+    ends within `max_seconds` without sending the retry."""
+    from infer import SeedVLInfer
+    from metrics import METRICS
+    from resilience import RetryPolicy
+
+    server = FaultInjectingServer(faults=[('status', 503)]).start()
+    policy = RetryPolicy()
+    policy.backoff = lambda retry: 5.0
+    infer = SeedVLInfer(api_key='mock',
+                        base_url=server.base_url,
+                        retry_policy=policy)
+    cancelled_before = METRICS.counter('requests_cancelled').value
+    messages = [{'role': 'user', 'content': 'hi'}]
+    consumer = threading.Thread(
+        target=lambda: list(infer.request(messages, session_id='session')))
+    consumer.start()
+    time.sleep(0.5)
+    cancelled_at = time.perf_counter()
+    infer.cancel('session')
+    consumer.join(timeout=5)
+    latency = time.perf_counter() - cancelled_at
+    server.stop()
+    cancelled = METRICS.counter('requests_cancelled').value - cancelled_before
+    print(f'cancelled during backoff: ended after {latency * 1000:.1f} ms, '
+          f'{server.n_requests} requests')
+    assert not consumer.is_alive(), 'the consumer is still waiting'
+    assert latency < max_seconds, f'cancel took {latency:.3f} s'
+    assert server.n_requests == 1, 'the request was retried after the cancel'
+    assert cancelled == 1, f'requests_cancelled grew by {cancelled}, expected 1'
+
+
+if __name__ == '__main__':
+    check_cancellation()
+    check_resilience()
@@ -0,0 +1,134 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+import io
+import json
+import time
+import base64
+import tracemalloc
+
+# base64 data URLs never need JSON escaping, so they are copied verbatim
+DATA_URL_PREFIX = 'data:'
+MIN_VERBATIM_LENGTH = 1024
+# stands in for a data URL held in a `session_store.BlobStore`
+REFERENCE_PREFIX = 'blob:'
+
+_encoder = json.JSONEncoder(ensure_ascii=False, allow_nan=False)
+
+
+class _Reference(str):
+    """A `REFERENCE_PREFIX` string found where media goes."""
+
+
+def _is_verbatim(value: str) -> bool:
+    return len(value) >= MIN_VERBATIM_LENGTH and value.startswith(
+        DATA_URL_PREFIX) and value.isascii(
+        ) and '"' not in value and '\\' not in value
+
+
+def is_reference(value) -> bool:
+    return isinstance(value, str) and value.startswith(REFERENCE_PREFIX)
+
+
+def iter_payload_chunks(value, resolve=None):
+    """Yields the UTF-8 JSON encoding of `value` piece by piece.
+
+    Small values go through the stdlib encoder; large data URLs are emitted
+    as-is, so each encoded frame is copied into the body exactly once.
+    `REFERENCE_PREFIX` URLs of `image_url` parts are replaced by the data URL
+    bytes that `resolve` returns for them; other strings, such as user text,
+    are never resolved.
+    """
+    if isinstance(value, dict):
+        yield b'{'
+        for i, (key, item) in enumerate(value.items()):
+            if i:
+                yield b','
+            yield _encoder.encode(str(key)).encode('utf-8')
+            yield b':'
+            if key == 'image_url' and resolve is not None and isinstance(
+                    item, dict) and is_reference(item.get('url')):
+                item = {**item, 'url': _Reference(item['url'])}
+            yield from iter_payload_chunks(item, resolve)
+        yield b'}'
+    elif isinstance(value, (list, tuple)):
+        yield b'['
+        for i, item in enumerate(value):
+            if i:
+                yield b','
+            yield from iter_payload_chunks(item, resolve)
+        yield b']'
+    elif isinstance(value, _Reference):
+        yield b'"'
+        yield resolve(value)
+        yield b'"'
+    elif isinstance(value, str) and _is_verbatim(value):
+        yield b'"'
+        yield value.encode('ascii')
+        yield b'"'
+    else:
+        yield _encoder.encode(value).encode('utf-8')
+
+
+def encode_payload(payload: dict, resolve=None) -> bytes:
+    """Serializes a request payload into a single bytes body."""
+    buffer = io.BytesIO()
+    for chunk in iter_payload_chunks(payload, resolve):
+        buffer.write(chunk)
+    return buffer.getvalue()
+
+
+def _measure(fn, payload):
+    tracemalloc.start()
+    start = time.perf_counter()
+    body = fn(payload)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return body, elapsed, peak
+
+
+def benchmark(n_frames: int = 512, frame_bytes: int = 64 * 1024):
+    frame = base64.b64encode(bytes(range(256)) *
+                             (frame_bytes // 256)).decode('utf-8')
+    content = []
+    for i in range(n_frames):
+        content.append({"type": "text", "text": f'[{i} second]'})
+        # distinct strings, as real frames would be
+        content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/jpeg;base64,{frame[:-4]}{i:04d}",
+                "detail": "high"
+            },
+        })
+    payload = {
+        "model": "doubao-1-5-thinking-vision-pro-250428",
+        "messages": [{
+            "role": "user",
+            "content": content
+        }],
+        "stream": True,
+        "thinking": {
+            "type": "enabled"
+        },
+        "temperature": 1.0,
+    }
+    # what `requests.post(json=payload)` does internally
+    stdlib_body, stdlib_time, stdlib_peak = _measure(
+        lambda p: json.dumps(p, allow_nan=False).encode('utf-8'), payload)
+    body, elapsed, peak = _measure(encode_payload, payload)
+    assert json.loads(body) == json.loads(stdlib_body)
+    _, stream_time, stream_peak = _measure(
+        lambda p: sum(len(chunk) for chunk in iter_payload_chunks(p)), payload)
+    size = len(body) / 2**20
+    print(f"{n_frames} frames, {size:.1f} MB body")
+    print(f"json.dumps + encode: {stdlib_time * 1000:.1f} ms, "
+          f"peak {stdlib_peak / 2**20:.1f} MB")
+    print(f"encode_payload:      {elapsed * 1000:.1f} ms, "
+          f"peak {peak / 2**20:.1f} MB")
+    print(f"iter_payload_chunks: {stream_time * 1000:.1f} ms, "
+          f"peak {stream_peak / 2**20:.1f} MB")
+
+
+if __name__ == '__main__':
+    benchmark()
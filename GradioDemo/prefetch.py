@@ -0,0 +1,225 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""Speculative encoding of uploads while the user is still typing.
+
+Example:
+    python prefetch.py --video /path/to/video.mp4 --typing 3
+uploads a video, waits `--typing` seconds and submits, reporting the
+preprocessing latency hidden by the prefetch.
+"""
+import time
+import argparse
+import threading
+from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrics import METRICS
+from token_accounting import TokenLimitExceeded
+
+
+@dataclass
+class _Entry:
+    future: Future
+    started: float
+    finished: float = None
+    nbytes: int = 0
+
+
+class Prefetcher:
+    """Encodes the attachments of draft messages ahead of submission.
+
+    Entries are keyed by the session and the exact `encode_attachment` job
+    its submission will plan, so a hit is byte-identical to encoding on
+    submit and a session only takes its own uploads. A job whose file is
+    removed from the draft is cancelled if it has not started, and its
+    result is dropped if it has. Drafts are planned, which may decode a
+    frame, on the executor rather than in the caller. At most
+    `max_pending` jobs run speculatively; finished results beyond
+    `max_bytes` are evicted oldest first and unused entries expire after
+    `ttl` seconds.
+    """
+
+    def __init__(self,
+                 infer,
+                 max_workers: int = 2,
+                 max_pending: int = 8,
+                 max_bytes: int = 512 * 1024 * 1024,
+                 ttl: float = 600):
+        self.infer = infer
+        self.max_pending = max_pending
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='prefetch')
+        # re-entrant: cancelling a future runs `_done` in the same thread
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._drafts = {}
+        self._bytes = 0
+
+    def update(self, session_id: str, inputs: dict):
+        """Starts encoding the files of a session's draft message.
+
+        An empty draft cancels nothing: it is what the textbox shows right
+        after a submission, while the submitted files are still to be taken.
+        """
+        files = tuple(inputs.get('files', []))
+        with self._lock:
+            if not files:
+                self._drafts.pop(session_id, None)
+                return
+            if self._drafts.get(session_id) == files:
+                return
+            self._drafts[session_id] = files
+        self._executor.submit(self._plan, session_id, files)
+
+    def _plan(self, session_id: str, files: tuple):
+        try:
+            report = self.infer.account({'files': list(files)})
+        except (TokenLimitExceeded, ValueError):
+            # the submission will be rejected the same way
+            jobs = []
+        else:
+            jobs, _ = self.infer.attachment_jobs({'files': list(files)},
+                                                 budgets=report.budgets)
+        keys = [(session_id, job) for job in jobs]
+        with self._lock:
+            if self._drafts.get(session_id) != files:
+                # edited again while this draft was planned
+                return
+            self._expire()
+            for key in list(self._entries):
+                if key[0] == session_id and key not in keys:
+                    self._drop(key)
+            for key in keys:
+                if key in self._entries:
+                    continue
+                pending = sum(not entry.future.done()
+                              for entry in self._entries.values())
+                if pending >= self.max_pending:
+                    METRICS.counter('prefetch_skipped').inc()
+                    continue
+                entry = _Entry(self._executor.submit(self._encode, key[1]),
+                               time.perf_counter())
+                self._entries[key] = entry
+                entry.future.add_done_callback(
+                    lambda future, key=key: self._done(key, future))
+                METRICS.counter('prefetch_started').inc()
+
+    def _encode(self, job: tuple) -> list[tuple]:
+        if self.infer.media_pool is not None:
+            return self.infer.media_pool.map([job])[0]
+        return self.infer.encode_attachment(*job)
+
+    def _done(self, key: tuple, future: Future):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.future is not future:
+                # taken, or dropped while running
+                return
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                del self._entries[key]
+                return
+            entry.finished = time.perf_counter()
+            entry.nbytes = sum(len(encoded) for _, encoded in future.result())
+            self._bytes += entry.nbytes
+            self._evict()
+            METRICS.gauge('prefetch_bytes').set(self._bytes)
+
+    def _drop(self, key: tuple):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.nbytes
+        METRICS.gauge('prefetch_bytes').set(self._bytes)
+        if entry.future.cancel():
+            METRICS.counter('prefetch_cancelled').inc()
+        elif not entry.future.done():
+            # still running; `_done` discards the result
+            METRICS.counter('prefetch_abandoned').inc()
+        else:
+            METRICS.counter('prefetch_wasted').inc()
+
+    def _evict(self):
+        finished = sorted((entry.finished, key)
+                          for key, entry in self._entries.items()
+                          if entry.finished is not None)
+        for _, key in finished:
+            if self._bytes <= self.max_bytes:
+                break
+            self._drop(key)
+            METRICS.counter('prefetch_evicted').inc()
+
+    def _expire(self):
+        deadline = time.perf_counter() - self.ttl
+        for key, entry in list(self._entries.items()):
+            if entry.started < deadline:
+                self._drop(key)
+                METRICS.counter('prefetch_expired').inc()
+
+    def take(self, session_id: str, job: tuple) -> list[tuple]:
+        """Returns the frames `session_id` prefetched for `job`, or None on a
+        miss.
+
+        Waits for a prefetch that is still running; the time it already ran is
+        recorded as hidden latency in `prefetch_hidden_seconds`.
+        """
+        submitted = time.perf_counter()
+        with self._lock:
+            entry = self._entries.pop((session_id, job), None)
+            if entry is not None:
+                self._bytes -= entry.nbytes
+                METRICS.gauge('prefetch_bytes').set(self._bytes)
+        if entry is None:
+            METRICS.counter('prefetch_misses').inc()
+            return None
+        try:
+            frames = entry.future.result()
+        except Exception:
+            METRICS.counter('prefetch_misses').inc()
+            return None
+        finished = entry.finished or time.perf_counter()
+        METRICS.counter('prefetch_hits').inc()
+        hidden = min(submitted, finished) - entry.started
+        METRICS.histogram('prefetch_hidden_seconds').observe(max(0.0, hidden))
+        METRICS.histogram('prefetch_wait_seconds').observe(
+            max(0.0, finished - submitted))
+        return frames
+
+    def discard(self, session_id: str):
+        """Forgets a session's draft, e.g. when its chat is cleared."""
+        with self._lock:
+            self._drafts.pop(session_id, None)
+            for key in list(self._entries):
+                if key[0] == session_id:
+                    self._drop(key)
+
+
+def main(video_path: str, typing: float):
+    from infer import SeedVLInfer
+
+    inputs = {'files': [video_path], 'text': 'describe the video'}
+    for prefetch_workers in (0, 1):
+        infer = SeedVLInfer(api_key=None, prefetch_workers=prefetch_workers)
+        if infer.prefetcher is not None:
+            infer.prefetcher.update('session', inputs)
+        time.sleep(typing)
+        start = time.perf_counter()
+        report = infer.account(inputs)
+        infer.construct_messages(inputs,
+                                 budgets=report.budgets,
+                                 session_id='session')
+        mode = 'prefetch' if prefetch_workers else 'no prefetch'
+        print(f'{mode}: {time.perf_counter() - start:.2f} s from submit '
+              f'to request body')
+    hidden = METRICS.histogram('prefetch_hidden_seconds').value
+    print(f"hits {METRICS.counter('prefetch_hits').value}, "
+          f"hidden p50 {hidden['p50']:.2f} s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--video', required=True)
+    parser.add_argument('--typing', type=float, default=3.0)
+    args = parser.parse_args()
+    main(args.video, args.typing)
@@ -0,0 +1,298 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+import json
+import time
+import uuid
+import queue
+import random
+import threading
+from dataclasses import dataclass
+
+import requests
+
+from metrics import METRICS
+from cancellation import StreamRegistry, close_response, response_socket
+
+DONE = object()
+
+
+class UpstreamError(Exception):
+    """Raised when the upstream fails in a way retries did not fix."""
+
+
+class RetryableError(UpstreamError):
+    """A retryable status, a missed first token or a truncated stream."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(UpstreamError):
+    """Raised when a request runs past `RetryPolicy.deadline`."""
+
+
+RETRYABLE_EXCEPTIONS = (RetryableError, requests.ConnectionError,
+                        requests.Timeout,
+                        requests.exceptions.ChunkedEncodingError)
+
+
+@dataclass
+class RetryPolicy:
+    """Timeouts and retry settings of one streaming request, in seconds.
+
+    `first_token_timeout` bounds the wait for the first delta and
+    `idle_timeout` the gap between later ones; `deadline` bounds the whole
+    request including retries. If no delta arrived after `hedge_after`, a
+    second identical request is sent and the first to produce a delta wins.
+
+    With `retry_mid_stream`, a stream that breaks after deltas were yielded
+    is retried by replaying the whole request. The new attempt is sampled
+    again from the start, so `SeedVLInfer.request` discards the partial
+    text and the UI shows the new response from its beginning; disable it
+    to fail with the partial output shown instead.
+    """
+    max_attempts: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    retry_statuses: tuple = (408, 429, 500, 502, 503, 504)
+    connect_timeout: float = 10.0
+    first_token_timeout: float = 120.0
+    idle_timeout: float = 60.0
+    deadline: float = 900.0
+    hedge_after: float = None
+    retry_mid_stream: bool = True
+
+    def backoff(self, retry: int) -> float:
+        """Full-jitter exponential backoff before the `retry`-th retry."""
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2**(retry - 1)))
+
+
+def parse_event(line: bytes):
+    """Returns the delta of an SSE line, `DONE` at the end, or None."""
+    if not line.startswith(b'data:'):
+        return None
+    data = line[len("data: "):]
+    if data == b"[DONE]":
+        return DONE
+    return json.loads(data)['choices'][0]['delta']
+
+
+class _Attempt:
+    """Responses opened by one attempt, including its hedge."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.responses = []
+        self.settled = False
+        self.yielded = False
+
+
+class ResilientStream:
+    """Streams completion deltas with deadlines, retries and hedging.
+
+    Iterating yields `(attempt, delta)`. A stream that fails after deltas
+    were yielded is restarted from scratch, so when `attempt` changes the
+    consumer must drop what it accumulated. Responses are registered in
+    `streams` so that `StreamRegistry.cancel` stops every attempt; a
+    cancelled stream ends quietly. The cancel is also seen between attempts
+    if it lands after `generation`, the session's generation when the turn
+    began. Without a `session_id` the stream gets a unique one and can only
+    be stopped by closing the iterator.
+    """
+
+    def __init__(self,
+                 url: str,
+                 headers: dict,
+                 body: bytes,
+                 policy: RetryPolicy,
+                 streams: StreamRegistry,
+                 session_id: str = None,
+                 generation: int = None):
+        self.url = url
+        self.headers = headers
+        self.body = body
+        self.policy = policy
+        self.streams = streams
+        # anonymous streams must not share a key, or one cancel stops all
+        self.session_id = session_id or f'anonymous-{uuid.uuid4().hex}'
+        if generation is None:
+            generation = streams.generation(self.session_id)
+        self.generation = generation
+        self.cancelled = False
+
+    def _session_cancelled(self) -> bool:
+        return self.streams.cancelled(self.session_id, self.generation)
+
+    def _open(self, state: _Attempt):
+        """Sends the request and reads up to its first delta."""
+        response = requests.post(self.url,
+                                 headers=self.headers,
+                                 data=self.body,
+                                 stream=True,
+                                 timeout=(self.policy.connect_timeout,
+                                          self.policy.first_token_timeout))
+        with state.lock:
+            settled = state.settled
+            if not settled:
+                state.responses.append(response)
+                self.streams.register(self.session_id, response)
+        if settled:
+            response.close()
+            raise RetryableError('attempt already settled')
+        if self._session_cancelled():
+            # the cancel came before this response was registered
+            close_response(response)
+            raise UpstreamError('cancelled')
+        if response.status_code != 200:
+            message = f'upstream returned {response.status_code}: {response.text[:200]}'
+            if response.status_code not in self.policy.retry_statuses:
+                raise UpstreamError(message)
+            retry_after = response.headers.get('Retry-After', '')
+            raise RetryableError(
+                message,
+                float(retry_after) if retry_after.isdigit() else None)
+        lines = response.iter_lines()
+        for line in lines:
+            delta = parse_event(line)
+            if delta is not None:
+                return response, lines, delta
+        raise RetryableError('stream ended before the first token')
+
+    def _first_delta(self, state: _Attempt, deadline: float):
+        """Runs `_open`, hedged after `hedge_after`; returns the winner."""
+        results = queue.Queue()
+
+        def run(index: int):
+            try:
+                results.put((index, True, self._open(state)))
+            except Exception as e:
+                results.put((index, False, e))
+
+        def launch(index: int):
+            threading.Thread(target=run, args=(index, ), daemon=True).start()
+
+        started = time.perf_counter()
+        first_token_deadline = min(deadline,
+                                   started + self.policy.first_token_timeout)
+        hedge_at = None
+        if self.policy.hedge_after is not None:
+            hedge_at = started + self.policy.hedge_after
+        launch(0)
+        launched, failures = 1, 0
+        while True:
+            wake = first_token_deadline
+            if hedge_at is not None:
+                wake = min(wake, hedge_at)
+            try:
+                index, ok, value = results.get(
+                    timeout=max(0.0, wake - time.perf_counter()))
+            except queue.Empty:
+                now = time.perf_counter()
+                if hedge_at is not None and now < first_token_deadline:
+                    hedge_at = None
+                    launch(launched)
+                    launched += 1
+                    METRICS.counter('request_hedged').inc()
+                    continue
+                METRICS.counter('request_timeouts').inc()
+                raise RetryableError(
+                    f'no first token after {now - started:.1f} s')
+            if ok:
+                with state.lock:
+                    state.settled = True
+                if index > 0:
+                    METRICS.counter('request_hedge_wins').inc()
+                self._close(state, keep=value[0])
+                return value
+            failures += 1
+            if failures == launched:
+                raise value
+
+    def _close(self, state: _Attempt, keep=None) -> bool:
+        """Closes the responses of an attempt; returns whether one was cancelled."""
+        with state.lock:
+            state.settled = True
+            responses = [r for r in state.responses if r is not keep]
+            state.responses = [keep] if keep is not None else []
+        cancelled = False
+        for response in responses:
+            close_response(response)
+            cancelled = self.streams.unregister(self.session_id,
+                                                response) or cancelled
+        return cancelled
+
+    def _deltas(self, state: _Attempt, deadline: float):
+        response, lines, delta = self._first_delta(state, deadline)
+        sock = response_socket(response)
+        if sock is not None:
+            sock.settimeout(self.policy.idle_timeout)
+        while delta is not DONE:
+            state.yielded = True
+            yield delta
+            if time.perf_counter() > deadline:
+                METRICS.counter('request_timeouts').inc()
+                raise DeadlineExceeded(
+                    f'request ran past its {self.policy.deadline} s deadline')
+            delta = None
+            for line in lines:
+                delta = parse_event(line)
+                if delta is not None:
+                    break
+            if delta is None:
+                raise RetryableError('stream ended without [DONE]')
+
+    def __iter__(self):
+        start = time.perf_counter()
+        deadline = start + self.policy.deadline
+        first_delta = True
+        error = None
+        for attempt in range(self.policy.max_attempts):
+            if self._session_cancelled():
+                METRICS.counter('requests_cancelled').inc()
+                return
+            state = _Attempt()
+            try:
+                for delta in self._deltas(state, deadline):
+                    if first_delta:
+                        first_delta = False
+                        elapsed = time.perf_counter() - start
+                        METRICS.histogram(
+                            'request_first_token_seconds').observe(elapsed)
+                    yield attempt, delta
+                METRICS.histogram('request_seconds').observe(
+                    time.perf_counter() - start)
+                return
+            except GeneratorExit:
+                # the consumer abandoned the stream, e.g. a Gradio stop
+                self.cancelled = True
+                raise
+            except Exception as e:
+                error = e
+            finally:
+                cancelled = self._close(state) or self._session_cancelled()
+                if cancelled or self.cancelled:
+                    self.cancelled = True
+                    METRICS.counter('requests_cancelled').inc()
+            if self.cancelled:
+                return
+            retryable = isinstance(error, RETRYABLE_EXCEPTIONS)
+            if not retryable or (state.yielded
+                                 and not self.policy.retry_mid_stream):
+                METRICS.counter('request_failures').inc()
+                raise error
+            if attempt + 1 == self.policy.max_attempts:
+                break
+            delay = getattr(error, 'retry_after',
+                            None) or self.policy.backoff(attempt + 1)
+            if time.perf_counter() + delay >= deadline:
+                break
+            METRICS.counter('request_retries').inc()
+            if self.streams.wait_cancelled(self.session_id, self.generation,
+                                           delay):
+                METRICS.counter('requests_cancelled').inc()
+                return
+        METRICS.counter('request_failures').inc()
+        raise UpstreamError(
+            f'giving up after {attempt + 1} attempts: {error}') from error
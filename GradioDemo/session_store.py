@@ -0,0 +1,297 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""Memory-bounded storage for the media of conversation histories.
+
+Histories kept in `gr.State` reference their images and video frames as
+`blob:<sha256>` URLs. The encoded data URLs live once in a shared
+`BlobStore` that keeps the most recently used ones in memory and spills the
+rest to disk.
+
+Example:
+    python session_store.py
+simulates 100 sessions each sending a 32-frame video and reports memory
+with and without the store.
+"""
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+
+from metrics import METRICS
+from payload import REFERENCE_PREFIX, DATA_URL_PREFIX
+
+
+class MediaExpired(Exception):
+    """Raised when a history references media its session no longer holds."""
+
+
+class BlobStore:
+    """Content-addressed, reference-counted store of encoded media.
+
+    At most `max_memory_bytes` are held in memory; least recently used
+    blobs are written to `spill_dir` beyond that. A blob is deleted once no
+    session references it.
+    """
+
+    def __init__(self,
+                 max_memory_bytes: int = 1024 * 1024 * 1024,
+                 spill_dir: str = None):
+        self.max_memory_bytes = max_memory_bytes
+        if spill_dir is None:
+            # removed with the store, or at interpreter exit
+            self._tempdir = tempfile.TemporaryDirectory(prefix='seedvl-blobs-')
+            spill_dir = self._tempdir.name
+        self.spill_dir = spill_dir
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._on_disk = {}
+        self._refs = Counter()
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, key)
+
+    def _update_gauges(self):
+        METRICS.gauge('blob_store_memory_bytes').set(self.memory_bytes)
+        METRICS.gauge('blob_store_disk_bytes').set(self.disk_bytes)
+        METRICS.gauge('blob_store_blobs').set(len(self._refs))
+
+    @staticmethod
+    def key(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def put(self, data: bytes, key: str = None) -> str:
+        """Stores `data`, or adds a reference to it; returns its key."""
+        key = key or self.key(data)
+        with self._lock:
+            self._refs[key] += 1
+            if key not in self._memory and key not in self._on_disk:
+                self._memory[key] = data
+                self.memory_bytes += len(data)
+                self._spill()
+            self._update_gauges()
+        return key
+
+    def _spill(self):
+        while self.memory_bytes > self.max_memory_bytes and len(
+                self._memory) > 1:
+            key, data = self._memory.popitem(last=False)
+            with open(self._path(key), 'wb') as f:
+                f.write(data)
+            self.memory_bytes -= len(data)
+            self.disk_bytes += len(data)
+            self._on_disk[key] = len(data)
+            METRICS.counter('blob_store_spilled').inc()
+
+    def get(self, key: str) -> bytes:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+            if key not in self._on_disk:
+                raise KeyError(key)
+        # spilled blobs are read back without being promoted, so a long
+        # history does not evict the frames of active sessions; `release`
+        # may delete the file meanwhile
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(key) from None
+
+    def size(self, key: str) -> int:
+        with self._lock:
+            if key in self._memory:
+                return len(self._memory[key])
+            return self._on_disk.get(key, 0)
+
+    def release(self, key: str):
+        with self._lock:
+            self._refs[key] -= 1
+            if self._refs[key] > 0:
+                return
+            del self._refs[key]
+            data = self._memory.pop(key, None)
+            if data is not None:
+                self.memory_bytes -= len(data)
+            elif key in self._on_disk:
+                self.disk_bytes -= self._on_disk.pop(key)
+                os.remove(self._path(key))
+            self._update_gauges()
+
+
+class SessionStore:
+    """Tracks which blobs each session's history references.
+
+    `dehydrate` turns the data URLs of new messages into references before
+    they are kept in `gr.State`; `resolve` is passed to `encode_payload` to
+    turn them back while the request body is written. Sessions idle for
+    longer than `ttl` seconds release their blobs; use the same TTL for the
+    `gr.State` that holds the history.
+    """
+
+    def __init__(self, blobs: BlobStore = None, ttl: float = 3600):
+        self.blobs = blobs or BlobStore()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def dehydrate(self, session_id: str, messages: list[dict]) -> list[dict]:
+        """Returns copies of `messages` with data URLs replaced by references."""
+        self.expire()
+        blobs = {}
+        dehydrated = []
+        for message in messages:
+            content = message['content']
+            if isinstance(content, list):
+                content = [
+                    self._dehydrate_item(item, blobs) for item in content
+                ]
+            dehydrated.append({**message, 'content': content})
+        with self._lock:
+            keys, _ = self._sessions.get(session_id, (set(), 0))
+            new_keys = set(blobs) - keys
+        # the blobs are stored before the session references them, so a
+        # concurrent `drop` or `expire` never releases a blob not yet put
+        stored = []
+        try:
+            for key in new_keys:
+                # `put` takes the reference before it can fail spilling
+                stored.append(key)
+                self.blobs.put(blobs[key], key)
+        except BaseException:
+            for key in stored:
+                self.blobs.release(key)
+            raise
+        with self._lock:
+            keys, _ = self._sessions.get(session_id, (set(), 0))
+            # a session holds one reference per distinct blob
+            duplicates = new_keys & keys
+            keys |= new_keys
+            self._sessions[session_id] = (keys, time.monotonic())
+        for key in duplicates:
+            self.blobs.release(key)
+        self._update_gauges()
+        return dehydrated
+
+    def _dehydrate_item(self, item: dict, blobs: dict) -> dict:
+        url = item.get('image_url', {}).get('url', '')
+        if not url.startswith(DATA_URL_PREFIX):
+            return item
+        data = url.encode('ascii')
+        key = self.blobs.key(data)
+        blobs[key] = data
+        return {
+            **item, 'image_url': {
+                **item['image_url'], 'url': REFERENCE_PREFIX + key
+            }
+        }
+
+    def resolve(self, reference: str) -> bytes:
+        try:
+            return self.blobs.get(reference[len(REFERENCE_PREFIX):])
+        except KeyError:
+            raise MediaExpired(
+                'the media of this conversation has expired, please clear it'
+            ) from None
+
+    def session_bytes(self, session_id: str) -> int:
+        with self._lock:
+            keys, _ = self._sessions.get(session_id, (set(), 0))
+            keys = list(keys)
+        return sum(self.blobs.size(key) for key in keys)
+
+    def usage(self) -> dict:
+        """Bytes referenced by each session."""
+        with self._lock:
+            session_ids = list(self._sessions)
+        return {
+            session_id: self.session_bytes(session_id)
+            for session_id in session_ids
+        }
+
+    def drop(self, session_id: str):
+        """Releases a session's blobs, e.g. when its chat is cleared."""
+        with self._lock:
+            keys, _ = self._sessions.pop(session_id, (set(), 0))
+        for key in keys:
+            self.blobs.release(key)
+        self._update_gauges()
+
+    def expire(self):
+        deadline = time.monotonic() - self.ttl
+        with self._lock:
+            expired = [
+                session_id
+                for session_id, (_, last_active) in self._sessions.items()
+                if last_active < deadline
+            ]
+        for session_id in expired:
+            self.drop(session_id)
+            METRICS.counter('sessions_expired').inc()
+
+    def _update_gauges(self):
+        METRICS.gauge('sessions_active').set(len(self._sessions))
+
+
+def main(n_sessions: int = 100,
+         n_frames: int = 32,
+         frame_bytes: int = 48 * 1024):
+    import base64
+    import random
+    import tracemalloc
+    from payload import encode_payload
+
+    def history(session: int) -> list[dict]:
+        frames = random.Random(session)
+        content = []
+        for i in range(n_frames):
+            frame = frames.randbytes(frame_bytes // 4 * 3)
+            frame = base64.b64encode(frame).decode('ascii')
+            content.append({'type': 'text', 'text': f'[{i} second]'})
+            content.append({
+                'type': 'image_url',
+                'image_url': {
+                    'url': f'data:image/jpeg;base64,{frame}',
+                    'detail': 'high'
+                }
+            })
+        return [{'role': 'user', 'content': content}]
+
+    tracemalloc.start()
+    plain = [history(session) for session in range(n_sessions)]
+    plain_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    store = SessionStore(BlobStore(max_memory_bytes=64 * 1024 * 1024))
+    tracemalloc.start()
+    states = {}
+    for session in range(n_sessions):
+        states[session] = store.dehydrate(str(session), history(session))
+    store_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    session = n_sessions // 2
+    same = encode_payload({'messages': states[session]},
+                          store.resolve) == encode_payload(
+                              {'messages': plain[session]})
+    print(f'{n_sessions} sessions x {n_frames} frames: plain histories '
+          f'{plain_bytes / 2**20:.0f} MB, with the store '
+          f'{store_bytes / 2**20:.0f} MB in memory and '
+          f'{store.blobs.disk_bytes / 2**20:.0f} MB spilled; '
+          f'identical request body: {same}')
+    print(f'session {session} references '
+          f'{store.session_bytes(str(session)) / 2**20:.1f} MB')
+    for session in list(states):
+        store.drop(str(session))
+    print(f'after dropping every session: {store.blobs.memory_bytes} B in '
+          f'memory, {store.blobs.disk_bytes} B on disk, '
+          f'{len(os.listdir(store.blobs.spill_dir))} spill files')
+
+
+if __name__ == '__main__':
+    main()
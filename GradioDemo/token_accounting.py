@@ -0,0 +1,182 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+from dataclasses import dataclass, field
+
+from PIL import Image
+
+PATCH_SIZE = 28
+
+
+class TokenLimitExceeded(ValueError):
+    """Raised before any upload when a request exceeds its visual token limits."""
+
+
+def count_visual_tokens(resized_height: int, resized_width: int) -> int:
+    """Tokens of one image already resized to the 28x28 patch grid."""
+    return (resized_height // PATCH_SIZE) * (resized_width // PATCH_SIZE)
+
+
+@dataclass
+class AttachmentTokens:
+    path: str
+    kind: str
+    n_frames: int
+    resized_height: int
+    resized_width: int
+    # of the whole video, in seconds; None for images
+    duration: float = None
+
+    @property
+    def tokens_per_frame(self) -> int:
+        return count_visual_tokens(self.resized_height, self.resized_width)
+
+    @property
+    def tokens(self) -> int:
+        return self.n_frames * self.tokens_per_frame
+
+    def as_dict(self) -> dict:
+        return {**vars(self), 'tokens': self.tokens}
+
+
+@dataclass
+class TokenReport:
+    attachments: list = field(default_factory=list)
+    # per-path `AttachmentBudget`s the counts were computed under, if any
+    budgets: dict = field(default_factory=dict)
+
+    @property
+    def total(self) -> int:
+        return sum(attachment.tokens for attachment in self.attachments)
+
+    @property
+    def n_frames(self) -> int:
+        return sum(attachment.n_frames for attachment in self.attachments
+                   if attachment.kind == 'video')
+
+    def as_metadata(self) -> dict:
+        return {
+            'visual_tokens': self.total,
+            'attachments': [a.as_dict() for a in self.attachments],
+        }
+
+
+@dataclass
+class TokenLimits:
+    """Hard limits checked before a request is uploaded; None disables a limit."""
+    max_tokens_per_image: int = None
+    max_tokens_per_video: int = None
+    max_tokens_per_request: int = None
+    max_attachments: int = None
+
+    def enforce(self, report: TokenReport):
+        if self.max_attachments is not None and len(
+                report.attachments) > self.max_attachments:
+            raise TokenLimitExceeded(
+                f"{len(report.attachments)} attachments exceed the limit of {self.max_attachments}"
+            )
+        for attachment in report.attachments:
+            limit = self.max_tokens_per_video if attachment.kind == 'video' else self.max_tokens_per_image
+            if limit is not None and attachment.tokens > limit:
+                raise TokenLimitExceeded(
+                    f"{attachment.path} needs {attachment.tokens} visual tokens, limit is {limit}"
+                )
+        if self.max_tokens_per_request is not None and report.total > self.max_tokens_per_request:
+            raise TokenLimitExceeded(
+                f"request needs {report.total} visual tokens, limit is {self.max_tokens_per_request}"
+            )
+
+
+def video_frame_hw(video_reader) -> tuple[int, int]:
+    if hasattr(video_reader, 'get_batch'):
+        return video_reader[0].shape[:2]
+    width, height = video_reader[0].size
+    return height, width
+
+
+def account_inputs(infer,
+                   inputs: dict,
+                   streaming_timestamp: int = None,
+                   max_video_length: int = None,
+                   budgets: dict = None) -> TokenReport:
+    """Computes the exact visual tokens `infer.construct_messages` would send.
+
+    Mirrors the resize rules of every path: `min_pixels`/`max_pixels` for
+    images, the planned frames and `max_pixels_choices` entry for videos, and
+    `max_pixels_choices[0]` for streaming frames, unless `budgets` from
+    `allocate_budget` override them. Videos are planned between the optional
+    `start_time` and `end_time` of `inputs`. Only headers and the video index, or its
+    `video_index` sidecar, are read; ingested `frames` carry their encoded
+    size.
+    """
+    from infer import get_resized_hw_for_Navit
+
+    budgets = budgets or {}
+    report = TokenReport(budgets=budgets)
+    start_time, end_time = inputs.get('start_time'), inputs.get('end_time')
+    for i, path in enumerate(inputs.get('files', [])):
+        budget = budgets.get(path)
+        if path.endswith('.mp4'):
+            if budget is not None and budget.max_video_length is not None:
+                video_length = budget.max_video_length
+            else:
+                video_length = max_video_length
+            index = infer.load_video_index(path)
+            if index is not None:
+                n_total_frames, fps = len(index), index.fps
+                height, width = index.height, index.width
+            else:
+                video_reader, fps = infer.open_video(path)
+                n_total_frames = len(video_reader)
+                height, width = video_frame_hw(video_reader)
+            frame_indices, max_pixels = infer.plan_frames(
+                n_total_frames,
+                fps,
+                start_time=start_time,
+                end_time=end_time,
+                max_video_length=video_length)
+            kind, n_frames = 'video', len(frame_indices)
+            duration = n_total_frames / fps
+            resized_height, resized_width = get_resized_hw_for_Navit(
+                height,
+                width,
+                min_pixels=infer.min_pixels,
+                max_pixels=max_pixels)
+        else:
+            with Image.open(path) as image:
+                width, height = image.size
+            kind, n_frames, duration = 'image', 1, None
+            # sticky like `attachment_jobs`: images after a .webp frame are
+            # streaming frames too
+            if path.endswith('.webp'):
+                streaming_timestamp = i
+            if streaming_timestamp is not None:
+                kind = 'streaming_frame'
+                max_pixels = infer.max_pixels_choices[0]
+            else:
+                # still images are sent at their original size and resized
+                # server-side with the same rule
+                max_pixels = infer.max_pixels
+            if budget is not None and budget.max_pixels is not None:
+                max_pixels = budget.max_pixels
+            resized_height, resized_width = get_resized_hw_for_Navit(
+                height,
+                width,
+                min_pixels=infer.min_pixels,
+                max_pixels=max_pixels)
+        report.attachments.append(
+            AttachmentTokens(path, kind, n_frames, resized_height,
+                             resized_width, duration))
+    # `frame_ingest.EncodedFrame`s, already resized on arrival
+    for frame in inputs.get('frames', []):
+        budget = budgets.get(frame.name)
+        resized_height, resized_width = frame.height, frame.width
+        if budget is not None and budget.max_pixels is not None:
+            resized_height, resized_width = get_resized_hw_for_Navit(
+                frame.height,
+                frame.width,
+                min_pixels=infer.min_pixels,
+                max_pixels=budget.max_pixels)
+        report.attachments.append(
+            AttachmentTokens(frame.name, 'streaming_frame', 1, resized_height,
+                             resized_width))
+    return report
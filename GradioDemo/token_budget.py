@@ -0,0 +1,107 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+import math
+from dataclasses import dataclass
+
+from token_accounting import PATCH_SIZE, TokenLimitExceeded, TokenReport
+
+# a video token carries less information than an image token because
+# neighbouring frames are redundant
+DEFAULT_TYPE_WEIGHTS = {'image': 1.0, 'streaming_frame': 1.0, 'video': 0.5}
+
+
+@dataclass
+class AttachmentBudget:
+    """Visual tokens granted to one attachment and the limits that enforce it.
+
+    `max_pixels` applies to images and streaming frames, `max_video_length`
+    to videos; both are None when the attachment fits unchanged.
+    """
+    path: str
+    kind: str
+    demand: int
+    tokens: int
+    max_pixels: int = None
+    max_video_length: int = None
+
+
+def min_tokens(infer, kind: str) -> int:
+    """Smallest grant that still produces a valid request for `kind`."""
+    if kind == 'video':
+        # one frame at the smallest resolution choice
+        return infer.max_pixels_choices[-1] // PATCH_SIZE**2
+    return math.ceil(infer.min_pixels / PATCH_SIZE**2)
+
+
+def water_fill(demands: list[int], weights: list[float],
+               budget: int) -> list[int]:
+    """Splits `budget` in proportion to `weights` without exceeding `demands`.
+
+    Attachments that need less than their share keep their demand and the
+    surplus is shared again among the rest.
+    """
+    grants = [0] * len(demands)
+    active = [i for i, demand in enumerate(demands) if demand > 0]
+    while active:
+        total_weight = sum(weights[i] for i in active)
+        satisfied = [
+            i for i in active
+            if demands[i] <= budget * weights[i] / total_weight
+        ]
+        if not satisfied:
+            for i in active:
+                grants[i] = int(budget * weights[i] / total_weight)
+            break
+        for i in satisfied:
+            grants[i] = demands[i]
+            budget -= demands[i]
+            active.remove(i)
+    return grants
+
+
+def allocate_budget(infer,
+                    report: TokenReport,
+                    total_budget: int,
+                    type_weights: dict = None) -> dict[str, AttachmentBudget]:
+    """Splits one visual token budget across all attachments of a turn.
+
+    `report` is the unconstrained accounting of the turn, so each demand
+    already reflects the attachment's resolution and, for videos, its
+    duration through the number of sampled frames. Weights are the type
+    weight times the square root of the demand: larger attachments get more
+    tokens, but less than proportionally more. Every attachment first gets
+    `min_tokens`, the rest is water-filled.
+
+    Returns the budgets keyed by path; raises `TokenLimitExceeded` if even the
+    minimum grants do not fit.
+    """
+    type_weights = type_weights or DEFAULT_TYPE_WEIGHTS
+    attachments = report.attachments
+    demands = [attachment.tokens for attachment in attachments]
+    floors = [
+        min(min_tokens(infer, attachment.kind), demand)
+        for attachment, demand in zip(attachments, demands)
+    ]
+    if sum(floors) > total_budget:
+        raise TokenLimitExceeded(
+            f"{len(attachments)} attachments need at least {sum(floors)} visual tokens, budget is {total_budget}"
+        )
+    weights = [
+        type_weights.get(attachment.kind, 1.0) * math.sqrt(demand)
+        for attachment, demand in zip(attachments, demands)
+    ]
+    grants = water_fill([d - f for d, f in zip(demands, floors)], weights,
+                        total_budget - sum(floors))
+
+    budgets = {}
+    for attachment, demand, floor, grant in zip(attachments, demands, floors,
+                                                grants):
+        budget = AttachmentBudget(attachment.path, attachment.kind, demand,
+                                  floor + grant)
+        if budget.tokens < demand:
+            if attachment.kind == 'video':
+                budget.max_video_length = budget.tokens
+            else:
+                budget.max_pixels = budget.tokens * PATCH_SIZE**2
+        budgets[attachment.path] = budget
+    return budgets
@@ -0,0 +1,230 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""Persistent per-video index sidecars.
+
+One pass over a video writes a sidecar directory with its metadata and
+per-frame arrays, opened memory-mapped afterwards (see video_sidecar.py):
+
+    meta.json             fps, frame size and frame count, and the size and
+                          mtime of the video it describes
+    timestamps.npy        (n,) float64, start of every frame in seconds
+    keyframes.npy         (k,) int64, indices of the keyframes
+    thumbnails.npy        (m, h, w, 3) uint8, frames every
+                          `thumbnail_interval` seconds, 64 px on the long side
+    thumbnail_frames.npy  (m,) int64, frame indices of the thumbnails
+    change_scores.npy     (n,) float32, mean absolute difference of every
+                          thumbnail-sized gray frame to the previous one, 0-1
+
+Planning and token accounting then need neither a `decord.VideoReader` nor a
+decoded frame, and samplers can seek straight to the keyframe before each
+frame they decode. `Video/frame_extraction.py` reads the same layout.
+
+Example:
+    python video_index.py /path/to/video.mp4
+indexes a video and times planning and token accounting for a range of
+token budgets with and without the index.
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+import decord
+import numpy as np
+
+from metrics import METRICS
+from video_sidecar import (INDEX_VERSION, read_sidecar, sidecar_path,
+                           source_stat)
+
+THUMBNAIL_SIZE = 64
+
+
+@dataclass
+class VideoIndex:
+    path: str
+    fps: float
+    height: int
+    width: int
+    timestamps: np.ndarray
+    keyframes: np.ndarray
+    thumbnails: np.ndarray
+    thumbnail_frames: np.ndarray
+    change_scores: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def keyframe_before(self, frame_index: int) -> int:
+        """The last keyframe at or before `frame_index`."""
+        position = np.searchsorted(self.keyframes, frame_index, side='right')
+        return int(self.keyframes[max(position - 1, 0)])
+
+
+def load_index(video_path: str, index_dir: str = None) -> VideoIndex:
+    """Opens the sidecar of a video; None if it is missing or stale."""
+    sidecar = read_sidecar(video_path, index_dir)
+    if sidecar is None:
+        return None
+    path, meta, arrays = sidecar
+    return VideoIndex(path, meta['fps'], meta['height'], meta['width'],
+                      **arrays)
+
+
+def build_index(video_path: str,
+                index_dir: str = None,
+                thumbnail_interval: float = 0.5,
+                batch_size: int = 128) -> VideoIndex:
+    """Decodes a video once at thumbnail size and writes its sidecar.
+
+    Raises `DECORDError` for files decord cannot read, e.g. GIFs.
+    """
+    start = time.perf_counter()
+    video_reader = decord.VideoReader(video_path, num_threads=2)
+    n_frames = len(video_reader)
+    height, width = video_reader[0].shape[:2]
+    meta = {
+        'version': INDEX_VERSION,
+        **source_stat(video_path),
+        'fps': video_reader.get_avg_fps(),
+        'height': height,
+        'width': width,
+        'n_frames': n_frames,
+    }
+    timestamps = video_reader.get_frame_timestamp(range(n_frames))[:, 0]
+    keyframes = np.asarray(video_reader.get_key_indices(), dtype=np.int64)
+    del video_reader
+
+    scale = THUMBNAIL_SIZE / max(height, width)
+    small_reader = decord.VideoReader(video_path,
+                                      width=max(round(width * scale), 1),
+                                      height=max(round(height * scale), 1),
+                                      num_threads=2)
+    thumbnail_times = np.arange(0, timestamps[-1] + 1e-6, thumbnail_interval)
+    thumbnail_frames = np.unique(
+        np.searchsorted(timestamps, thumbnail_times).clip(0, n_frames - 1))
+    wanted = np.zeros(n_frames, dtype=bool)
+    wanted[thumbnail_frames] = True
+    thumbnails, change_scores = [], np.zeros(n_frames, dtype=np.float32)
+    previous = None
+    for first in range(0, n_frames, batch_size):
+        indices = range(first, min(first + batch_size, n_frames))
+        frames = small_reader.get_batch(indices).asnumpy()
+        gray = frames.mean(axis=-1, dtype=np.float32)
+        if previous is not None:
+            gray = np.concatenate([previous[None], gray])
+        diffs = np.abs(np.diff(gray, axis=0)).mean(axis=(1, 2)) / 255
+        change_scores[first + (previous is None):indices.stop] = diffs
+        previous = gray[-1]
+        thumbnails.append(frames[wanted[indices.start:indices.stop]])
+
+    path = sidecar_path(video_path, index_dir)
+    # written next to its final place and renamed, so readers never see a
+    # partial sidecar
+    tmp_path = f'{path}.tmp-{os.getpid()}-{threading.get_ident()}'
+    os.makedirs(tmp_path)
+    arrays = {
+        'timestamps': timestamps.astype(np.float64),
+        'keyframes': keyframes,
+        'thumbnails': np.concatenate(thumbnails),
+        'thumbnail_frames': thumbnail_frames.astype(np.int64),
+        'change_scores': change_scores,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f'{name}.npy'), array)
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+    METRICS.counter('video_index_builds').inc()
+    METRICS.histogram('video_index_build_seconds').observe(
+        time.perf_counter() - start)
+    return load_index(video_path, index_dir)
+
+
+class VideoIndexStore:
+    """Loads video sidecars and builds missing ones in the background.
+
+    `get` never waits for a build: the first requests on a new video run
+    without its index. With `build_workers=0` sidecars are only loaded,
+    e.g. in `media_pool` workers whose parent builds them.
+    """
+
+    def __init__(self, index_dir: str = None, build_workers: int = 1):
+        self.index_dir = index_dir
+        if index_dir is not None:
+            os.makedirs(index_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(
+            max_workers=build_workers,
+            thread_name_prefix='video-index') if build_workers else None
+        self._lock = threading.Lock()
+        self._building = set()
+        self._failed = set()
+
+    def get(self, video_path: str) -> VideoIndex:
+        index = load_index(video_path, self.index_dir)
+        if index is not None:
+            METRICS.counter('video_index_hits').inc()
+            return index
+        METRICS.counter('video_index_misses').inc()
+        if self._executor is not None:
+            with self._lock:
+                if video_path in self._building or video_path in self._failed:
+                    return None
+                self._building.add(video_path)
+            self._executor.submit(self._build, video_path)
+        return None
+
+    def _build(self, video_path: str):
+        try:
+            build_index(video_path, self.index_dir)
+        except (decord._ffi.base.DECORDError, OSError):
+            METRICS.counter('video_index_failures').inc()
+            with self._lock:
+                self._failed.add(video_path)
+        finally:
+            with self._lock:
+                self._building.discard(video_path)
+
+
+def main(video_path: str, index_dir: str = None):
+    from infer import SeedVLInfer
+
+    start = time.perf_counter()
+    index = build_index(video_path, index_dir)
+    sidecar_bytes = sum(f.stat().st_size for f in os.scandir(index.path))
+    print(f'indexed {len(index)} frames in '
+          f'{time.perf_counter() - start:.2f} s: {len(index.keyframes)} '
+          f'keyframes, {len(index.thumbnails)} thumbnails, sidecar '
+          f'{sidecar_bytes / 2**20:.1f} MB')
+
+    budgets = [None, 128000, 64000, 32000, 16000, 8000]
+    for video_index in (None, 'load'):
+        label = 'with index' if video_index else 'without index'
+        infer = SeedVLInfer(api_key=None,
+                            video_index=video_index,
+                            video_index_dir=index_dir)
+        start = time.perf_counter()
+        for budget in budgets:
+            infer.visual_token_budget = budget
+            report = infer.account({'files': [video_path], 'text': ''})
+        account_seconds = (time.perf_counter() - start) / len(budgets)
+        start = time.perf_counter()
+        # decodes the frames planned for the smallest budget
+        budget = report.budgets[video_path]
+        video = infer.preprocess_video(
+            video_path, max_video_length=budget.max_video_length)
+        print(f'{label:>13}: token accounting {account_seconds * 1000:.1f} '
+              f'ms per budget, preprocess_video {len(video)} frames '
+              f'{time.perf_counter() - start:.2f} s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('video')
+    parser.add_argument('--index-dir', default=None)
+    args = parser.parse_args()
+    main(args.video, args.index_dir)
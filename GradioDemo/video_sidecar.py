@@ -0,0 +1,52 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""Location and reading of the sidecars written by `video_index.py`.
+
+Only needs numpy, so `Video/frame_extraction.py` loads this file by path to
+read the same sidecars with the same version and staleness checks.
+"""
+import os
+import json
+import hashlib
+
+import numpy as np
+
+INDEX_VERSION = 1
+ARRAY_NAMES = ('timestamps', 'keyframes', 'thumbnails', 'thumbnail_frames',
+               'change_scores')
+
+
+def sidecar_path(video_path: str, index_dir: str = None) -> str:
+    """`<video>.index` next to the video, or a directory in `index_dir`
+    named after the video's path, size and mtime."""
+    if index_dir is None:
+        return video_path + '.index'
+    stat = os.stat(video_path)
+    key = f'{os.path.abspath(video_path)}:{stat.st_size}:{stat.st_mtime_ns}'
+    return os.path.join(index_dir,
+                        hashlib.sha256(key.encode()).hexdigest()[:32])
+
+
+def source_stat(video_path: str) -> dict:
+    stat = os.stat(video_path)
+    return {'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns}
+
+
+def read_sidecar(video_path: str, index_dir: str = None) -> tuple:
+    """Returns the sidecar's path, `meta.json` fields and memory-mapped arrays
+    by name; None if it is missing, stale or of another version."""
+    path = sidecar_path(video_path, index_dir)
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['version'] != INDEX_VERSION or any(
+                meta[key] != value
+                for key, value in source_stat(video_path).items()):
+            return None
+        arrays = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+            for name in ARRAY_NAMES
+        }
+    except (OSError, ValueError, KeyError):
+        return None
+    return path, meta, arrays
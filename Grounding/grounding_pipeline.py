@@ -0,0 +1,162 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""Batch post-processing for 2D grounding responses.
+
+The input is a JSONL file with one model response per image:
+    {"image": "samples/000000001000.jpeg", "response": "<bbox>...</bbox>"}
+Detections are streamed to a JSONL file in input order, with boxes and points
+rescaled from the model's 0-1000 space to image pixels. Overlays are optionally
+rendered in a process pool.
+
+Example:
+    python grounding_pipeline.py --input responses.jsonl --output detections.jsonl --vis-dir vis
+"""
+import os
+import re
+import json
+import time
+import argparse
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+COORDINATE_SCALE = 1000
+NUMBER = r"(\d+(?:\.\d+)?)"
+SEPARATOR = r"[\s,]+"
+# same layout as `convert_point_to_coordinates` in GUI/action_parser.py,
+# extended to decimal and comma-separated coordinates
+POINT_PATTERN = re.compile(rf"<point>\s*{NUMBER}{SEPARATOR}{NUMBER}\s*</point>")
+BBOX_PATTERN = re.compile(
+    rf"<bbox>\s*{NUMBER}{SEPARATOR}{NUMBER}{SEPARATOR}{NUMBER}{SEPARATOR}{NUMBER}\s*</bbox>"
+)
+BOX_TOKEN_PATTERN = re.compile(
+    rf"<\|box_start\|>\s*\(?{NUMBER},\s*{NUMBER}\)?(?:\s*,?\s*\(?{NUMBER},\s*{NUMBER}\)?)?\s*<\|box_end\|>"
+)
+
+
+def parse_grounding(text: str) -> tuple[np.ndarray, np.ndarray]:
+    """Extracts every box and point tag from a response.
+
+    Returns:
+        np.ndarray: (N, 4) boxes as x1, y1, x2, y2 in 0-1000 space
+        np.ndarray: (M, 2) points as x, y in 0-1000 space
+    """
+    boxes = [match.groups() for match in BBOX_PATTERN.finditer(text)]
+    points = [match.groups() for match in POINT_PATTERN.finditer(text)]
+    for match in BOX_TOKEN_PATTERN.finditer(text):
+        x1, y1, x2, y2 = match.groups()
+        if x2 is None:
+            points.append((x1, y1))
+        else:
+            boxes.append((x1, y1, x2, y2))
+    return (np.asarray(boxes, dtype=np.float64).reshape(-1, 4),
+            np.asarray(points, dtype=np.float64).reshape(-1, 2))
+
+
+def rescale(coordinates: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Maps (..., 2k) interleaved x, y coordinates from 0-1000 space to pixels."""
+    scale = np.tile(
+        np.array([width, height], dtype=np.float64) / COORDINATE_SCALE,
+        coordinates.shape[-1] // 2)
+    return coordinates * scale
+
+
+def draw_overlay(image: Image.Image, boxes: np.ndarray,
+                 points: np.ndarray) -> Image.Image:
+    image = image.convert("RGB")
+    draw = ImageDraw.Draw(image)
+    line_width = max(2, round(min(image.size) / 300))
+    radius = line_width * 3
+    for x1, y1, x2, y2 in boxes.tolist():
+        draw.rectangle((x1, y1, x2, y2), outline="red", width=line_width)
+    for x, y in points.tolist():
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius),
+                     fill="red",
+                     outline="red")
+    return image
+
+
+def process_record(record: dict, vis_dir: str = None) -> dict:
+    """Parses, rescales and optionally renders one response. Runs in a pool worker."""
+    # only the header is read here; pixels are decoded when rendering
+    image = Image.open(record["image"])
+    width, height = image.size
+    boxes, points = parse_grounding(record["response"])
+    boxes, points = rescale(boxes, width, height), rescale(points, width, height)
+    if vis_dir is not None:
+        name = os.path.splitext(os.path.basename(record["image"]))[0]
+        draw_overlay(image, boxes,
+                     points).save(os.path.join(vis_dir, f"{name}.jpg"),
+                                  quality=90)
+    return {
+        "image": record["image"],
+        "width": width,
+        "height": height,
+        "boxes": boxes.round(2).tolist(),
+        "points": points.round(2).tolist(),
+    }
+
+
+def read_records(input_path: str):
+    root = os.path.dirname(os.path.abspath(input_path))
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not os.path.isabs(record["image"]):
+                record["image"] = os.path.join(root, record["image"])
+            yield record
+
+
+def run_pipeline(input_path: str,
+                 output_path: str,
+                 vis_dir: str = None,
+                 max_workers: int = None,
+                 chunksize: int = 32) -> dict:
+    """Streams detections for every record of `input_path` to `output_path`."""
+    if vis_dir is not None:
+        os.makedirs(vis_dir, exist_ok=True)
+    start = time.perf_counter()
+    n_images, n_boxes, n_points = 0, 0, 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor, \
+            open(output_path, "w", encoding="utf-8") as f:
+        records = read_records(input_path)
+        for detection in executor.map(process_record,
+                                      records,
+                                      repeat(vis_dir),
+                                      chunksize=chunksize):
+            f.write(json.dumps(detection, ensure_ascii=False) + "\n")
+            n_images += 1
+            n_boxes += len(detection["boxes"])
+            n_points += len(detection["points"])
+    elapsed = time.perf_counter() - start
+    return {
+        "images": n_images,
+        "boxes": n_boxes,
+        "points": n_points,
+        "elapsed": elapsed,
+        "images_per_minute": n_images / elapsed * 60 if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", required=True)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--vis-dir", default=None)
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=32)
+    args = parser.parse_args()
+    summary = run_pipeline(args.input,
+                           args.output,
+                           vis_dir=args.vis_dir,
+                           max_workers=args.max_workers,
+                           chunksize=args.chunksize)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""Tiled grounding for images larger than the model's pixel budget.
+
+A single request shrinks a large page or screenshot to `max_pixels`, and small
+targets lose the detail needed to find them. Here the image is split into
+overlapping tiles that each fit `max_pixels` unscaled, all tiles are requested
+concurrently, and the `<bbox>`/`<point>` outputs are mapped back to image
+pixels and de-duplicated. A downscaled pass over the whole image runs alongside
+them for targets larger than a tile. Wall-clock latency is that of the slowest
+request instead of growing with the number of pixels.
+
+Example:
+    python tiled_grounding.py --image samples/arxiv_bp.png --prompt "Detect all formulas, output their <bbox>." --api-key $API_KEY
+    python tiled_grounding.py --mock
+The second runs a local stand-in model on a synthetic page and compares recall
+and latency of a single downscaled request, a single full-resolution request
+and the tiled mode.
+"""
+import io
+import json
+import math
+import time
+import base64
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from PIL import Image
+
+from grounding_pipeline import parse_grounding, rescale, draw_overlay
+
+DEFAULT_BASE_URL = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"
+DEFAULT_MODEL_ID = "doubao-1-5-thinking-vision-pro-250428"
+IMAGE_FACTOR = 28
+# the `max_pixels` of `SeedVLInfer` in GradioDemo/infer.py
+DEFAULT_MAX_PIXELS = 5120 * 28 * 28
+# concurrent requests per image; a poster-sized image has hundreds of tiles
+DEFAULT_MAX_WORKERS = 16
+
+
+def _tile_starts(length: int, tile: int, overlap: float) -> list[int]:
+    if tile >= length:
+        return [0]
+    stride = max(1, int(tile * (1 - overlap)))
+    n_tiles = math.ceil((length - tile) / stride) + 1
+    # spread evenly, so every overlap is at least the requested one
+    return np.linspace(0, length - tile, n_tiles).round().astype(int).tolist()
+
+
+def plan_tiles(width: int,
+               height: int,
+               max_pixels: int = DEFAULT_MAX_PIXELS,
+               overlap: float = 0.2) -> np.ndarray:
+    """Covers the image with overlapping tiles of at most `max_pixels` each.
+
+    Returns:
+        np.ndarray: (K, 4) tiles as x1, y1, x2, y2 in image pixels; a single
+            tile if the whole image already fits.
+    """
+    if width * height <= max_pixels:
+        return np.array([[0, 0, width, height]])
+    side = max(IMAGE_FACTOR,
+               math.isqrt(max_pixels) // IMAGE_FACTOR * IMAGE_FACTOR)
+    tile_width = min(side, width)
+    # a narrow image spends the rest of the budget on taller tiles
+    tile_height = min(
+        height,
+        max(IMAGE_FACTOR,
+            max_pixels // tile_width // IMAGE_FACTOR * IMAGE_FACTOR))
+    return np.array([[x, y, x + tile_width, y + tile_height]
+                     for y in _tile_starts(height, tile_height, overlap)
+                     for x in _tile_starts(width, tile_width, overlap)])
+
+
+def encode_tile(image: Image.Image, tile=None, quality: int = 95) -> str:
+    """Crops `tile` out of `image` and returns it as a JPEG data URL."""
+    if tile is not None:
+        image = image.crop(tuple(int(v) for v in tile))
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality)
+    return "data:image/jpeg;base64," + base64.b64encode(
+        buffer.getvalue()).decode("utf-8")
+
+
+def build_messages(prompt: str, image_url: str) -> list[dict]:
+    return [{
+        "role":
+        "user",
+        "content": [{
+            "type": "image_url",
+            "image_url": {
+                "url": image_url
+            }
+        }, {
+            "type": "text",
+            "text": prompt
+        }]
+    }]
+
+
+def request_completion(messages: list[dict],
+                       base_url: str,
+                       api_key: str,
+                       model_id: str,
+                       timeout: float = 120) -> str:
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": model_id,
+        "messages": messages,
+        "temperature": 0.0,
+        "thinking": {
+            "type": "disabled"
+        },
+    }
+    response = requests.post(base_url,
+                             headers=headers,
+                             json=payload,
+                             timeout=timeout)
+    response.raise_for_status()
+    return response.json()["choices"][0]["message"]["content"]
+
+
+def box_iou(boxes: np.ndarray, others: np.ndarray) -> tuple:
+    """Pairwise IoU and intersection area of (N, 4) and (M, 4) boxes."""
+    lt = np.maximum(boxes[:, None, :2], others[None, :, :2])
+    rb = np.minimum(boxes[:, None, 2:], others[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=-1)
+    area = np.prod(boxes[:, 2:] - boxes[:, :2], axis=-1)
+    other_area = np.prod(others[:, 2:] - others[:, :2], axis=-1)
+    union = area[:, None] + other_area[None, :] - inter
+    return inter / np.maximum(union, 1e-9), inter
+
+
+def merge_boxes(boxes: np.ndarray,
+                truncated: np.ndarray,
+                iou_threshold: float = 0.5,
+                containment_threshold: float = 0.8) -> np.ndarray:
+    """Greedy NMS over boxes gathered from overlapping tiles.
+
+    Complete boxes come first, larger ones before smaller. A box is
+    suppressed by a kept box it overlaps with IoU above `iou_threshold`; a
+    box cut by a tile edge is also suppressed once `containment_threshold`
+    of it lies inside a kept box, since it is a fragment of that box.
+
+    Returns:
+        np.ndarray: indices of the kept boxes.
+    """
+    if not len(boxes):
+        return np.zeros(0, dtype=int)
+    area = np.prod(boxes[:, 2:] - boxes[:, :2], axis=-1)
+    order = np.lexsort((-area, truncated))
+    iou, inter = box_iou(boxes, boxes)
+    contained = inter / np.maximum(area[:, None], 1e-9)
+    keep = []
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    for i in order:
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > iou_threshold
+        suppressed |= truncated & (contained[:, i] > containment_threshold)
+    return np.array(keep)
+
+
+def merge_points(points: np.ndarray, radius: float) -> np.ndarray:
+    """Averages points closer than `radius` pixels to the first of a group."""
+    merged, used = [], np.zeros(len(points), dtype=bool)
+    for i in range(len(points)):
+        if used[i]:
+            continue
+        group = ~used & (np.linalg.norm(points - points[i], axis=-1) <= radius)
+        used |= group
+        merged.append(points[group].mean(axis=0))
+    return np.asarray(merged, dtype=np.float64).reshape(-1, 2)
+
+
+def to_global(response: str, tile: np.ndarray, width: int, height: int,
+              edge_margin: float) -> tuple:
+    """Maps the 0-1000 outputs of one tile response to image pixels.
+
+    Returns:
+        np.ndarray: (N, 4) boxes in image pixels
+        np.ndarray: (N,) whether each box touches a tile edge that is not an
+            image edge, i.e. may be cut off
+        np.ndarray: (M, 2) points in image pixels
+    """
+    x1, y1, x2, y2 = tile.tolist()
+    boxes, points = parse_grounding(response)
+    boxes = rescale(boxes, x2 - x1, y2 - y1)
+    points = rescale(points, x2 - x1, y2 - y1)
+    inner_edges = np.array([x1 > 0, y1 > 0, x2 < width, y2 < height])
+    size = np.array([x2 - x1, y2 - y1])
+    near_edge = np.concatenate(
+        [boxes[:, :2] <= edge_margin, boxes[:, 2:] >= size - edge_margin],
+        axis=-1)
+    truncated = (near_edge & inner_edges).any(axis=-1)
+    offset = np.array([x1, y1], dtype=np.float64)
+    return boxes + np.tile(offset, 2), truncated, points + offset
+
+
+def tiled_grounding(image_path: str,
+                    prompt: str,
+                    base_url: str = DEFAULT_BASE_URL,
+                    api_key: str = None,
+                    model_id: str = DEFAULT_MODEL_ID,
+                    max_pixels: int = DEFAULT_MAX_PIXELS,
+                    overlap: float = 0.2,
+                    include_global: bool = True,
+                    iou_threshold: float = 0.5,
+                    max_workers: int = DEFAULT_MAX_WORKERS) -> dict:
+    """Grounds `prompt` in every tile of the image, up to `max_workers`
+    requests at a time.
+
+    Returns detections in the layout of `grounding_pipeline.process_record`,
+    plus per-request latencies.
+    """
+    image = Image.open(image_path)
+    image.load()
+    width, height = image.size
+    tiles = plan_tiles(width, height, max_pixels, overlap)
+    if len(tiles) == 1:
+        include_global = False
+    # (region, whether to crop it): the whole image, shrunk to `max_pixels`
+    # by the model, finds targets that no single tile contains
+    regions = [(tile, True) for tile in tiles]
+    if include_global:
+        regions.append((np.array([0, 0, width, height]), False))
+
+    def run(region: tuple) -> tuple[str, float]:
+        start = time.perf_counter()
+        tile, crop = region
+        url = encode_tile(image, tile if crop else None)
+        response = request_completion(build_messages(prompt, url), base_url,
+                                      api_key, model_id)
+        return response, time.perf_counter() - start
+
+    start = time.perf_counter()
+    n_workers = min(max_workers, len(regions))
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        results = list(pool.map(run, regions))
+    elapsed = time.perf_counter() - start
+
+    # boxes within 0.5% of a tile edge count as cut off
+    edge_margin = 0.005 * max(width, height)
+    all_boxes, all_truncated, all_points = [], [], []
+    for (tile, _), (response, _) in zip(regions, results):
+        boxes, truncated, points = to_global(response, tile, width, height,
+                                             edge_margin)
+        all_boxes.append(boxes)
+        all_truncated.append(truncated)
+        all_points.append(points)
+    boxes = np.concatenate(all_boxes)
+    keep = merge_boxes(boxes, np.concatenate(all_truncated), iou_threshold)
+    boxes = boxes[keep].reshape(-1, 4)
+    points = merge_points(np.concatenate(all_points), edge_margin * 2)
+    latencies = [latency for _, latency in results]
+    return {
+        "image": image_path,
+        "width": width,
+        "height": height,
+        "boxes": boxes.round(2).tolist(),
+        "points": points.round(2).tolist(),
+        "tiles": tiles.tolist(),
+        "latencies": [round(latency, 3) for latency in latencies],
+        "elapsed": elapsed,
+    }
+
+
+class MockDetector:
+    """Local stand-in model that finds red rectangles in the image it is sent.
+
+    Like the real model it shrinks images larger than `max_pixels` first, so
+    rectangles that end up smaller than `min_side` pixels are missed, and its
+    latency grows with the number of visual tokens.
+    """
+
+    def __init__(self,
+                 max_pixels: int = DEFAULT_MAX_PIXELS,
+                 min_side: int = 6,
+                 base_latency: float = 0.2,
+                 token_latency: float = 0.0002):
+        self.max_pixels = max_pixels
+        self.min_side = min_side
+        self.base_latency = base_latency
+        self.token_latency = token_latency
+
+    def __call__(self, messages: list[dict]) -> str:
+        start = time.perf_counter()
+        url = messages[0]["content"][0]["image_url"]["url"]
+        image = Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1])))
+        width, height = image.size
+        if width * height > self.max_pixels:
+            scale = math.sqrt(self.max_pixels / (width * height))
+            image = image.resize((int(width * scale), int(height * scale)),
+                                 Image.Resampling.BICUBIC)
+        array = np.asarray(image.convert("RGB")).astype(np.int16)
+        red, green, blue = array.transpose(2, 0, 1)
+        mask = (red > 160) & (green < 96) & (blue < 96)
+        outputs = []
+        for x1, y1, x2, y2 in self._components(mask):
+            if min(x2 - x1, y2 - y1) < self.min_side:
+                continue
+            box = np.array([x1, y1, x2, y2]) / np.tile(mask.shape[::-1], 2)
+            outputs.append("<bbox>{} {} {} {}</bbox>".format(
+                *(box * 1000).round().astype(int)))
+        tokens = image.size[0] * image.size[1] / (28 * 28)
+        latency = self.base_latency + self.token_latency * tokens
+        time.sleep(max(0.0, latency - (time.perf_counter() - start)))
+        return " ".join(outputs)
+
+    @staticmethod
+    def _components(mask: np.ndarray) -> list[tuple]:
+        """Bounding boxes of the 4-connected components of `mask`."""
+        remaining = set(zip(*np.nonzero(mask)))
+        boxes = []
+        while remaining:
+            stack = [remaining.pop()]
+            ys, xs = [], []
+            while stack:
+                y, x = stack.pop()
+                ys.append(y)
+                xs.append(x)
+                for neighbor in ((y + 1, x), (y - 1, x), (y, x + 1), (y,
+                                                                      x - 1)):
+                    if neighbor in remaining:
+                        remaining.remove(neighbor)
+                        stack.append(neighbor)
+            boxes.append((min(xs), min(ys), max(xs) + 1, max(ys) + 1))
+        return boxes
+
+
+def synthetic_page(path: str,
+                   width: int = 2550,
+                   height: int = 3300,
+                   n_small: int = 120,
+                   n_large: int = 2,
+                   seed: int = 0) -> np.ndarray:
+    """Draws small red squares and red frames wider than a tile's overlap.
+
+    Returns:
+        np.ndarray: (N, 4) boxes of the drawn shapes in pixels.
+    """
+    rng = np.random.default_rng(seed)
+    array = np.full((height, width, 3), 255, dtype=np.uint8)
+    boxes = []
+    for sizes, count in (((1000, 1300), n_large), ((6, 9), n_small)):
+        placed = 0
+        while placed < count:
+            w, h = rng.integers(*sizes, size=2)
+            x, y = rng.integers(0, width - w), rng.integers(0, height - h)
+            box = np.array([[x, y, x + w, y + h]])
+            # keep a gap so that rectangles never merge
+            padded = box + np.array([[-8, -8, 8, 8]])
+            if boxes and box_iou(padded, np.array(boxes))[1].any():
+                continue
+            array[y:y + h, x:x + w] = (220, 30, 30)
+            if w > 100:
+                # outlines only, which keeps the mock's flood fill cheap
+                array[y + 8:y + h - 8, x + 8:x + w - 8] = 255
+            boxes.append(box[0])
+            placed += 1
+    Image.fromarray(array).save(path)
+    return np.array(boxes, dtype=np.float64)
+
+
+def evaluate(boxes: list, truth: np.ndarray) -> tuple[float, int]:
+    """Returns recall at IoU 0.5 and the number of unmatched predictions."""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if not len(boxes):
+        return 0.0, 0
+    iou, _ = box_iou(truth, boxes)
+    return (iou.max(axis=1) >= 0.5).mean(), int((iou.max(axis=0) < 0.5).sum())
+
+
+def benchmark(max_pixels: int = DEFAULT_MAX_PIXELS):
+    import os
+    import tempfile
+    import importlib.util
+
+    # the stand-in server of the GUI grounding evaluation, loaded by path
+    # under its own name: `GradioDemo/mock_server.py` has the same one
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                        "GUI", "mock_server.py")
+    spec = importlib.util.spec_from_file_location("gui_mock_server", path)
+    mock_server = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mock_server)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = f"{tmp}/page.png"
+        truth = synthetic_page(path)
+        width, height = Image.open(path).size
+        prompt = "Detect all red rectangles, output their <bbox>."
+        modes = {
+            "single, downscaled": (max_pixels, max_pixels, False),
+            "single, full resolution": (width * height, width * height, False),
+            "tiled": (max_pixels, max_pixels, True),
+        }
+        print(f"{width}x{height} page, {len(truth)} targets, "
+              f"max_pixels {max_pixels}")
+        for mode, (model_pixels, tile_pixels, tiled) in modes.items():
+            server, base_url = mock_server.start_mock_server(
+                MockDetector(max_pixels=model_pixels))
+            if tiled:
+                result = tiled_grounding(path,
+                                         prompt,
+                                         base_url=base_url,
+                                         max_pixels=tile_pixels)
+            else:
+                start = time.perf_counter()
+                response = request_completion(
+                    build_messages(prompt, encode_tile(Image.open(path))),
+                    base_url, None, DEFAULT_MODEL_ID)
+                boxes, _ = parse_grounding(response)
+                result = {
+                    "boxes": rescale(boxes, width, height).tolist(),
+                    "tiles": [[0, 0, width, height]],
+                    "latencies": [time.perf_counter() - start],
+                    "elapsed": time.perf_counter() - start,
+                }
+            server.shutdown()
+            recall, extra = evaluate(result["boxes"], truth)
+            print(f"{mode:>24}: {len(result['latencies'])} requests, "
+                  f"wall {result['elapsed']:.2f} s, slowest request "
+                  f"{max(result['latencies']):.2f} s, recall {recall:.2f}, "
+                  f"{extra} unmatched boxes")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image")
+    parser.add_argument("--prompt")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--model-id", default=DEFAULT_MODEL_ID)
+    parser.add_argument("--max-pixels", type=int, default=DEFAULT_MAX_PIXELS)
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--no-global", action="store_true")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--vis", default=None, help="path of an overlay image")
+    parser.add_argument("--mock", action="store_true")
+    args = parser.parse_args()
+    if args.mock:
+        benchmark(args.max_pixels)
+        return
+    result = tiled_grounding(args.image,
+                             args.prompt,
+                             base_url=args.base_url,
+                             api_key=args.api_key,
+                             model_id=args.model_id,
+                             max_pixels=args.max_pixels,
+                             overlap=args.overlap,
+                             include_global=not args.no_global,
+                             max_workers=args.max_workers)
+    if args.vis is not None:
+        draw_overlay(Image.open(args.image), np.array(result["boxes"]),
+                     np.array(result["points"])).save(args.vis, quality=90)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: Apache-2.0
+"""In-memory frame extraction for video understanding.
+
+Sampled frames are resized and JPEG-encoded once, straight from the decoder,
+and handed to `construct_messages` as bytes. Nothing is written to
+`video_frames/`, so concurrent jobs do not interfere with each other.
+
+If the video has an index sidecar, written by `GradioDemo/video_index.py`,
+frames are planned from it without probing the video, and the decoder seeks
+to the keyframe before each sampled frame instead of decoding every frame in
+between.
+
+Example:
+    python frame_extraction.py samples/OcZeMOnLpTQ.mp4
+"""
+import os
+import sys
+import time
+import base64
+import shutil
+import tempfile
+import importlib.util
+from enum import Enum
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+class Strategy(Enum):
+    # sampling stragegies
+    # constant interval: sampling at a constant interval, fps sampling
+    CONSTANT_INTERVAL = "constant_interval"
+    # even interval: sampling at an even interval, uniform sampling
+    EVEN_INTERVAL = "even_interval"
+    # content change: more frames where the picture changes, needs an index
+    CONTENT_CHANGE = "content_change"
+
+
+def resize(image):
+    height, width = image.shape[:2]
+    if height < width:
+        target_height, target_width = 480, 640
+    else:
+        target_height, target_width = 640, 480
+    if height <= target_height and width <= target_width:
+        return image
+    if height / target_height < width / target_width:
+        new_width = target_width
+        new_height = int(height * (new_width / width))
+    else:
+        new_height = target_height
+        new_width = int(width * (new_height / height))
+    return cv2.resize(image, (new_width, new_height))
+
+
+def _load_video_sidecar():
+    """`GradioDemo/video_sidecar.py`, loaded by path under its own module name
+    so that it cannot shadow or be shadowed by another `video_sidecar`."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                        "GradioDemo", "video_sidecar.py")
+    spec = importlib.util.spec_from_file_location("seed_vl_video_sidecar",
+                                                  path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+video_sidecar = _load_video_sidecar()
+
+
+def load_index(video_file_path: str,
+               index_dir: Optional[str] = None) -> Optional[dict]:
+    """Opens the sidecar of a video memory-mapped; None if there is none.
+
+    The sidecar is `<video>.index`, or the directory `video_index.py` names
+    after the video in `index_dir`. Returns its `meta.json` fields and arrays.
+    """
+    sidecar = video_sidecar.read_sidecar(video_file_path, index_dir)
+    if sidecar is None:
+        return None
+    _, meta, arrays = sidecar
+    return {**meta, **arrays}
+
+
+def frame_interval_for(extraction_strategy: Strategy, fps: float, length: int,
+                       interval_in_seconds: float, max_frames: int) -> int:
+    if extraction_strategy == Strategy.CONSTANT_INTERVAL:
+        frame_interval = int(fps * interval_in_seconds)
+    elif extraction_strategy == Strategy.EVEN_INTERVAL:
+        frame_interval = int(length / max_frames)
+    else:
+        raise ValueError("Invalid extraction strategy")
+    return max(frame_interval, 1)
+
+
+def plan_frame_indices(index: dict, extraction_strategy: Strategy,
+                       interval_in_seconds: float, max_frames: int) -> list[int]:
+    """Frame indices to sample, planned from an index alone."""
+    length = len(index["timestamps"])
+    if extraction_strategy == Strategy.CONTENT_CHANGE:
+        # equal shares of cumulative change per frame; the mean change added
+        # to every frame keeps static stretches from going unsampled
+        scores = np.asarray(index["change_scores"], dtype=np.float64)
+        cumulative = np.cumsum(scores + scores.mean() + 1e-6)
+        targets = (np.arange(max_frames) + 0.5) / max_frames * cumulative[-1]
+        indices = np.searchsorted(cumulative, targets).clip(0, length - 1)
+        return np.unique(indices).tolist()
+    frame_interval = frame_interval_for(extraction_strategy, index["fps"], length,
+                                        interval_in_seconds, max_frames)
+    return list(range(0, length, frame_interval))[:max_frames]
+
+
+def _decode_indexed(cap, index: dict, frame_indices: list[int]):
+    """Yields the frames at `frame_indices`, seeking past whole GOPs."""
+    keyframes = index["keyframes"]
+    position = 0
+    for target in frame_indices:
+        keyframe = keyframes[max(np.searchsorted(keyframes, target, side="right") - 1, 0)]
+        if keyframe > position:
+            # decoding from that keyframe is cheaper than from `position`
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            position = target
+        while position < target and cap.grab():
+            position += 1
+        ret, frame = cap.read()
+        if not ret:
+            return
+        position += 1
+        yield frame
+
+
+def extract_frames(
+        video_file_path: str,
+        extraction_strategy: Optional[Strategy] = Strategy.EVEN_INTERVAL,
+        interval_in_seconds: Optional[float] = 1,
+        max_frames: Optional[int] = 10,
+        use_timestamp: bool = True,
+        jpeg_quality: int = 95,
+        index_dir: Optional[str] = None,
+        use_index: bool = True,
+) -> tuple[list[bytes], Optional[list[float]]]:
+    """sampling videos and encode keyframes in memory with different strategies.
+    Args:
+        video_file_path (str): video path
+        extraction_strategy (Optional[Strategy], optional): extraction strategy. Defaults to Strategy.EVEN_INTERVAL.
+        interval_in_seconds (Optional[float], optional): the sampling interval
+        max_frames (Optional[int], optional): maximum number of sampled frames. Defaults to 10.
+        use_timestamp (bool): whether to output video timestamps. Defaults to True.
+        jpeg_quality (int): JPEG quality of the encoded frames. Defaults to 95.
+        index_dir (Optional[str]): where `video_index.py` wrote the sidecar, if not next to the video.
+        use_index (bool): whether to use the sidecar if there is one. Defaults to True.
+    Returns:
+        list[bytes]: JPEG-encoded sampled keyframes
+        list[float]: timestamps of sampled keyframes
+    """
+    index = load_index(video_file_path, index_dir) if use_index else None
+    if index is None and extraction_strategy == Strategy.CONTENT_CHANGE:
+        raise ValueError("content_change sampling needs an index sidecar, "
+                         "see GradioDemo/video_index.py")
+    if index is not None:
+        return _extract_indexed_frames(video_file_path, index, extraction_strategy,
+                                       interval_in_seconds, max_frames,
+                                       use_timestamp, jpeg_quality)
+    cap = cv2.VideoCapture(video_file_path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        length = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        frame_interval = frame_interval_for(extraction_strategy, fps, length,
+                                            interval_in_seconds, max_frames)
+        frame_count = 0
+        keyframes = []
+        timestamps = []
+        # grab() advances without decoding; only sampled frames are retrieved
+        while cap.grab():
+            if frame_count % frame_interval == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                _, encoded_image = cv2.imencode(
+                    ".jpg", resize(frame),
+                    [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+                keyframes.append(encoded_image.tobytes())
+                timestamps.append(round(frame_count / fps, 1))
+            frame_count += 1
+            if len(keyframes) >= max_frames:
+                break
+    finally:
+        cap.release()
+    if use_timestamp:
+        return keyframes, timestamps
+    return keyframes, None
+
+
+def _extract_indexed_frames(video_file_path: str, index: dict,
+                            extraction_strategy: Strategy,
+                            interval_in_seconds: float, max_frames: int,
+                            use_timestamp: bool,
+                            jpeg_quality: int) -> tuple[list[bytes], Optional[list[float]]]:
+    frame_indices = plan_frame_indices(index, extraction_strategy,
+                                       interval_in_seconds, max_frames)
+    cap = cv2.VideoCapture(video_file_path)
+    try:
+        keyframes = []
+        for frame in _decode_indexed(cap, index, frame_indices):
+            _, encoded_image = cv2.imencode(
+                ".jpg", resize(frame), [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+            keyframes.append(encoded_image.tobytes())
+    finally:
+        cap.release()
+    if use_timestamp:
+        # the rule of the path without an index, so both give the same
+        # timestamps
+        return keyframes, [round(i / index["fps"], 1)
+                           for i in frame_indices[:len(keyframes)]]
+    return keyframes, None
+
+
+def construct_messages(frames: list[bytes], timestamps: list[float],
+                       prompt: str) -> list[dict]:
+    """
+    construct messages for the video understanding from encoded frames
+    """
+    content = []
+    for idx, frame in enumerate(frames):
+        if timestamps is not None:
+            # add timestamp for each frame
+            content.append({
+                "type": "text",
+                "text": f'[{timestamps[idx]} second]'
+            })
+        content.append(
+            {
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/jpeg;base64,{base64.b64encode(frame).decode('utf-8')}",
+                    "detail":"low"
+                },
+            }
+        )
+    content.append(
+        {
+            "type": "text",
+            "text": prompt,
+    })
+    return [
+        {
+            "role": "user",
+            "content": content,
+        }
+    ]
+
+
+def _disk_based_messages(video_file_path: str, output_dir: str,
+                         extraction_strategy: Strategy,
+                         interval_in_seconds: float, max_frames: int,
+                         prompt: str) -> list[dict]:
+    """The notebook path: write sampled frames as JPEG, read them back, re-encode."""
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+    cap = cv2.VideoCapture(video_file_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    length = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frame_interval = frame_interval_for(extraction_strategy, fps, length,
+                                        interval_in_seconds, max_frames)
+    frame_count, image_paths, timestamps = 0, [], []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_count % frame_interval == 0:
+            image_path = os.path.join(output_dir,
+                                      "frame_{:04d}.jpg".format(len(image_paths)))
+            cv2.imwrite(image_path, frame)
+            image_paths.append(image_path)
+            timestamps.append(round(frame_count / fps, 1))
+        frame_count += 1
+        if len(image_paths) >= max_frames:
+            break
+    cap.release()
+    frames = []
+    for image_path in image_paths:
+        _, encoded_image = cv2.imencode(".jpg", resize(cv2.imread(image_path)))
+        frames.append(encoded_image.tobytes())
+    return construct_messages(frames, timestamps, prompt)
+
+
+def benchmark(video_file_path: str, max_frames: int = 30, repeats: int = 3):
+    indexed = load_index(video_file_path) is not None
+    for strategy in (Strategy.CONSTANT_INTERVAL, Strategy.EVEN_INTERVAL):
+        disk_time, memory_time, indexed_time = 0.0, 0.0, 0.0
+        for _ in range(repeats):
+            with tempfile.TemporaryDirectory() as output_dir:
+                start = time.perf_counter()
+                _disk_based_messages(video_file_path,
+                                     os.path.join(output_dir, "video_frames"),
+                                     strategy, 1.0, max_frames, "")
+                disk_time += time.perf_counter() - start
+            start = time.perf_counter()
+            frames, timestamps = extract_frames(video_file_path,
+                                                extraction_strategy=strategy,
+                                                interval_in_seconds=1.0,
+                                                max_frames=max_frames,
+                                                use_index=False)
+            construct_messages(frames, timestamps, "")
+            memory_time += time.perf_counter() - start
+            if indexed:
+                start = time.perf_counter()
+                frames, timestamps = extract_frames(video_file_path,
+                                                    extraction_strategy=strategy,
+                                                    interval_in_seconds=1.0,
+                                                    max_frames=max_frames)
+                construct_messages(frames, timestamps, "")
+                indexed_time += time.perf_counter() - start
+        message = (f"{strategy.value}: {len(frames)} frames, "
+                   f"disk {disk_time / repeats * 1000:.1f} ms, "
+                   f"in-memory {memory_time / repeats * 1000:.1f} ms "
+                   f"({disk_time / memory_time:.2f}x)")
+        if indexed:
+            message += (f", indexed {indexed_time / repeats * 1000:.1f} ms "
+                        f"({disk_time / indexed_time:.2f}x)")
+        print(message)
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1])